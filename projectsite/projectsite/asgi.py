@@ -3,6 +3,10 @@ ASGI config for projectsite project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with any ASGI server, e.g. ``uvicorn projectsite.asgi:application``.
+Async views such as the concurrent dashboard (``/dashboard``) then run on
+the server's event loop instead of a per-request loop.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
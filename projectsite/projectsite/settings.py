@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,17 +43,23 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'studentorg.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'studentorg.querybudget.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'studentorg.profiling.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'projectsite.urls'
 
+# Without 'loaders' in OPTIONS Django wraps the filesystem and app loaders
+# in the cached loader, so each template is compiled once per process
+# (with DEBUG on, the autoreloader drops the cache when a template changes).
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -75,13 +82,129 @@ WSGI_APPLICATION = 'projectsite.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
+# SQLite by default. Set DATABASE_ENGINE=postgresql (and the DATABASE_*
+# variables below) to use PostgreSQL, which needs psycopg installed;
+# DATABASE_POOL_MAX_SIZE additionally needs psycopg[pool].
+# Connections are kept open for DATABASE_CONN_MAX_AGE seconds and checked
+# before reuse, instead of being opened for every request.
+
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', 60))
+
+if os.environ.get('DATABASE_ENGINE') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DATABASE_NAME', 'psusphere'),
+            'USER': os.environ.get('DATABASE_USER', ''),
+            'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
+            'HOST': os.environ.get('DATABASE_HOST', ''),
+            'PORT': os.environ.get('DATABASE_PORT', ''),
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if int(os.environ.get('DATABASE_POOL_MAX_SIZE', 0)):
+        # A pool replaces persistent connections; Django refuses both at once.
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DATABASE_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ['DATABASE_POOL_MAX_SIZE']),
+            'timeout': int(os.environ.get('DATABASE_POOL_TIMEOUT', 10)),
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # Take the write lock when a transaction starts, so
+                # concurrent writers queue up (for up to `timeout` seconds)
+                # instead of failing with "database is locked".
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
+        }
+    }
+
+# Applied to every new SQLite connection by studentorg.dbtuning.
+SQLITE_PRAGMAS = {
+    'cache_size': -64000,        # 64 MB page cache per connection (negative means KiB)
+    'mmap_size': 268435456,      # Read up to 256 MB of the file through memory mapping
+}
+# WAL journaling (studentorg.dbtuning.WAL_PRAGMAS) lets readers and the writer
+# stop blocking each other. SQLite records it in the database file itself, so
+# it is opt-in: set SQLITE_WAL=1 for a deployment's own database, not for the
+# db.sqlite3 in the repository.
+SQLITE_WAL = os.environ.get('SQLITE_WAL', '0') == '1'
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# The dashboard caches each chart separately. Point CACHE_BACKEND at a
+# shared backend (Redis, Memcached, database) when running several workers.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
     }
 }
 
+DASHBOARD_CACHE_MAX_AGE = 300     # Seconds before a chart is recomputed even without writes
+DASHBOARD_CACHE_LOCK_TIMEOUT = 30  # Seconds one worker may hold a chart's recompute lock
+DASHBOARD_CHART_WORKERS = 4        # Threads computing charts concurrently for the async dashboard
+TEMPLATE_ROW_CACHE_TIMEOUT = 3600  # Seconds a rendered list row is kept ({% cacherow %}); 0 turns it off
+# Recompute stale charts in the job queue. Needs a shared cache: the worker
+# fills its own otherwise.
+DASHBOARD_WARM_CHARTS = os.environ.get('DASHBOARD_WARM_CHARTS', '0') == '1'
+
+# Query budgets and N+1 detection (studentorg.querybudget). Problems are
+# logged while developing and raised under `manage.py test`; set
+# QUERY_INSPECTOR_RAISE to override either.
+TESTING = sys.argv[1:2] == ['test']
+QUERY_INSPECTOR_ENABLED = DEBUG or TESTING
+QUERY_INSPECTOR_RAISE = os.environ.get('QUERY_INSPECTOR_RAISE', '1' if TESTING else '0') == '1'
+QUERY_INSPECTOR_REPEAT_THRESHOLD = 3  # Identical query shapes per request before it counts as N+1
+
+# Per-request profiling (studentorg.profiling), off unless PROFILER_ENABLED=1
+# is set. Staff users then send the header or the query parameter to get
+# cProfile, SQL and template timings and a flamegraph of that request written
+# to PROFILER_DIRECTORY.
+PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', '0') == '1'
+PROFILER_HEADER = 'X-Profile'
+PROFILER_QUERY_PARAM = '_profile'
+PROFILER_DIRECTORY = os.environ.get('PROFILER_DIRECTORY', BASE_DIR / 'profiles')
+PROFILER_SAMPLE_INTERVAL = 0.001  # Seconds between the flamegraph's stack samples
+
+# Background jobs (studentorg.jobs), queued in the database and run by
+# `manage.py run_worker`; no broker needed.
+JOBS_WORKER_CONCURRENCY = 4  # Jobs a worker runs at once
+JOBS_WORKER_POOL = 'thread'  # 'thread' or 'process'
+JOBS_POLL_INTERVAL = 1.0     # Seconds between looks for new jobs when idle
+JOBS_RETRY_DELAY = 10        # Seconds before a failed job is retried, doubled on every attempt
+JOBS_RETENTION = 7 * 24 * 3600  # Seconds finished jobs are kept
+
+# Batched cascade deletes of colleges, programs and organizations
+# (studentorg.deletion). Large ones are queued as jobs and report their
+# progress on a status page; `manage.py run_deletions` runs them without
+# a worker.
+DELETION_BATCH_SIZE = 500     # Rows of a table deleted per transaction
+DELETION_INLINE_LIMIT = 1000  # Deletes of up to this many rows in all run within the request
+DELETION_JOB_TIMEOUT = 300    # Seconds without progress before a running job counts as abandoned
+
+# Request and SQL metrics (studentorg.metrics), served at /metrics in the
+# Prometheus format. Each worker process writes its totals to a file in
+# METRICS_DIRECTORY; the endpoint adds them up.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_DIRECTORY = os.environ.get('METRICS_DIRECTORY', BASE_DIR / 'metrics')
+METRICS_FLUSH_INTERVAL = 1.0  # Seconds between writes of a worker's totals
+# Bearer token scrapers send to /metrics. Without one, only staff users can
+# read it.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -123,6 +246,18 @@ STATICFILES_DIRS = (
     BASE_DIR / 'static',
 )
 
+# collectstatic hashes file names, writes a manifest and precompresses the
+# text assets; studentorg.assets.StaticAssetHandler (wsgi.py) serves them
+# when DEBUG is off.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'studentorg.assets.CompressedManifestStaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -17,32 +17,51 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, re_path
 from studentorg.views import HomePageView,Organizationlist,OrganizationCreateView,OrganizationUpdateView,OrganizationDeleteView, OrgMemberlist,OrgMemberCreateView,OrgMemberUpdateView,OrgMemberDeleteView,StudentList, StudentCreateView,StudentUpdateView,StudentDeleteView,ProgramList,ProgramCreateView,ProgramUpdateView,ProgramDeleteView,CollegeList,CollegeCreateView,CollegeUpdateView,CollegeDeleteView
+from studentorg.views import OrganizationExport, OrgMemberExport, StudentExport, ProgramExport, CollegeExport
+from studentorg.views import AsyncHomePageView, ChartDataView, MetricsView
+from studentorg.views import StudentLookup, OrganizationLookup, ProgramLookup
+from studentorg.views import OrganizationBulkAction, OrgMemberBulkAction, StudentBulkAction, DeletionJobView
 from studentorg import views
 from django.contrib.auth import views as auth_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', views.HomePageView.as_view(), name='home'),
+    path('dashboard', AsyncHomePageView.as_view(), name='home-async'),
+    path('charts/<str:name>', ChartDataView.as_view(), name='chart-data'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
     path('organization_list', Organizationlist.as_view(), name='organization-list'),
+    path('organization_list/export', OrganizationExport.as_view(), name='organization-export'),
+    path('organization_list/lookup', OrganizationLookup.as_view(), name='organization-lookup'),
+    path('organization_list/bulk', OrganizationBulkAction.as_view(), name='organization-bulk'),
     path('organization_list/add', OrganizationCreateView.as_view(), name='organization-add'),
     path('organization_list/<pk>', OrganizationUpdateView.as_view(), name='organization-update'),
     path('organization_list/<pk>/delete', OrganizationDeleteView.as_view(), name='organization-delete'),
     path('orgmember_list', OrgMemberlist.as_view(), name='orgmember-list'),
+    path('orgmember_list/export', OrgMemberExport.as_view(), name='orgmember-export'),
+    path('orgmember_list/bulk', OrgMemberBulkAction.as_view(), name='orgmember-bulk'),
     path('orgmember_list/add', OrgMemberCreateView.as_view(), name='orgmember-add'),
     path('orgmember_list/<pk>', OrgMemberUpdateView.as_view(), name='orgmember-update'),
     path('orgmember_list/<pk>/delete', OrgMemberDeleteView.as_view(), name='orgmember-delete'),
     path('student_list', StudentList.as_view(), name='student-list'),
+    path('student_list/export', StudentExport.as_view(), name='student-export'),
+    path('student_list/lookup', StudentLookup.as_view(), name='student-lookup'),
+    path('student_list/bulk', StudentBulkAction.as_view(), name='student-bulk'),
     path('student_list/add', StudentCreateView.as_view(), name='student-add'),
     path('student_list/<pk>', StudentUpdateView.as_view(), name='student-update'),
     path('student_list/<pk>/delete', StudentDeleteView.as_view(), name='student-delete'),
     path('program_list', ProgramList.as_view(), name='program-list'),
+    path('program_list/export', ProgramExport.as_view(), name='program-export'),
+    path('program_list/lookup', ProgramLookup.as_view(), name='program-lookup'),
     path('program_list/add', ProgramCreateView.as_view(), name='program-add'),
     path('program_list/<pk>', ProgramUpdateView.as_view(), name='program-update'),
     path('program_list/<pk>/delete', ProgramDeleteView.as_view(), name='program-delete'),
     path('college_list', CollegeList.as_view(), name='college-list'),
+    path('college_list/export', CollegeExport.as_view(), name='college-export'),
     path('college_list/add', CollegeCreateView.as_view(), name='college-add'),
     path('college_list/<pk>', CollegeUpdateView.as_view(), name='college-update'),
     path('college_list/<pk>/delete', CollegeDeleteView.as_view(), name='college-delete'),
+    path('deletions/<int:pk>', DeletionJobView.as_view(), name='deletion-job'),
     re_path(r'^login/$', auth_views.LoginView.as_view(template_name='login.html'), name='login'),
     re_path(r'^logout/$', auth_views.LogoutView.as_view(), name='logout'),
 ]
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'projectsite.settings')
 
 application = get_wsgi_application()
+
+# Imported once settings are configured. Serves collected static files
+# (precompressed, with far-future caching) when DEBUG is off.
+from studentorg.assets import StaticAssetHandler  # noqa: E402
+
+application = StaticAssetHandler(application)
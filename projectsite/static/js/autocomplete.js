@@ -0,0 +1,122 @@
+/*
+ * Turns every <select data-autocomplete-url> into a search box.
+ *
+ * The select stays in the form (hidden) and holds the chosen value; the
+ * box shows matches from the lookup URL twenty at a time, with a
+ * "Load more" entry when there are further pages.
+ */
+(function () {
+    function initAutocomplete(select) {
+        const url = select.dataset.autocompleteUrl;
+        const wrapper = document.createElement('div');
+        const input = document.createElement('input');
+        const menu = document.createElement('div');
+        let term = '';
+        let page = 1;
+        let timer = null;
+        let latest = 0;
+
+        wrapper.style.position = 'relative';
+        input.type = 'text';
+        input.className = select.className;
+        input.autocomplete = 'off';
+        input.placeholder = 'Type to search...';
+        menu.className = 'dropdown-menu';
+        menu.style.width = '100%';
+        menu.style.maxHeight = '300px';
+        menu.style.overflowY = 'auto';
+        wrapper.append(input, menu);
+        select.style.display = 'none';
+        select.parentNode.insertBefore(wrapper, select.nextSibling);
+
+        function selectedText() {
+            const option = select.options[select.selectedIndex];
+            return option && option.value ? option.text : '';
+        }
+
+        function choose(id, text) {
+            let option = Array.from(select.options).find(option => option.value === String(id));
+            if (!option) {
+                option = new Option(text, id);
+                select.add(option);
+            }
+            select.value = String(id);
+            input.value = text;
+            menu.classList.remove('show');
+            select.dispatchEvent(new Event('change', { bubbles: true }));
+        }
+
+        function entry(text, onChoose) {
+            const link = document.createElement('a');
+            link.href = '#';
+            link.className = 'dropdown-item';
+            link.textContent = text;
+            // mousedown fires before the input's blur closes the menu.
+            link.addEventListener('mousedown', event => {
+                event.preventDefault();
+                onChoose();
+            });
+            return link;
+        }
+
+        function load(append) {
+            const request = ++latest;
+            const params = new URLSearchParams({ q: term, page: page });
+            fetch(`${url}?${params}`, { credentials: 'same-origin', headers: { 'Accept': 'application/json' } })
+                .then(response => response.json())
+                .then(data => {
+                    // A newer search has been sent since this one.
+                    if (request !== latest) return;
+                    if (!append) menu.innerHTML = '';
+                    const more = menu.querySelector('.autocomplete-more');
+                    if (more) more.remove();
+
+                    data.results.forEach(item => menu.appendChild(entry(item.text, () => choose(item.id, item.text))));
+                    if (data.pagination.more) {
+                        const link = entry('Load more...', () => {
+                            page += 1;
+                            load(true);
+                        });
+                        link.classList.add('autocomplete-more', 'text-muted');
+                        menu.appendChild(link);
+                    }
+                    if (!menu.children.length) {
+                        const empty = document.createElement('span');
+                        empty.className = 'dropdown-item-text text-muted';
+                        empty.textContent = 'No matches';
+                        menu.appendChild(empty);
+                    }
+                    menu.classList.add('show');
+                });
+        }
+
+        function search() {
+            term = input.value;
+            page = 1;
+            load(false);
+        }
+
+        input.value = selectedText();
+        input.addEventListener('focus', () => {
+            input.select();
+            term = '';
+            page = 1;
+            load(false);
+        });
+        input.addEventListener('input', () => {
+            if (!input.value) select.value = '';
+            clearTimeout(timer);
+            timer = setTimeout(search, 250);
+        });
+        input.addEventListener('blur', () => {
+            clearTimeout(timer);
+            latest += 1;
+            menu.classList.remove('show');
+            input.value = selectedText();
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('select[data-autocomplete-url]').forEach(initAutocomplete);
+    });
+})();
@@ -1,25 +1,54 @@
 from django.contrib import admin
-from .models import College, Program, Organization, Student, OrgMember
+from .models import College, Program, Organization, Student, OrgMember, DeletionJob, Job
+from .search import search
+
+
+class SearchIndexAdminMixin:
+    """Answer changelist searches and autocomplete lookups from the search index, best match first."""
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return search(queryset, search_term, ranked=True), False
+
 
 admin.site.register(College)
-admin.site.register(Program)
-admin.site.register(Organization)
+
+@admin.register(Program)
+class ProgramAdmin(admin.ModelAdmin):
+    search_fields = ("prog_name",)
+
+@admin.register(Organization)
+class OrganizationAdmin(SearchIndexAdminMixin, admin.ModelAdmin):
+    search_fields = ("name", "description",)
 
 @admin.register(Student)  # Keep this line
-class StudentAdmin(admin.ModelAdmin):
+class StudentAdmin(SearchIndexAdminMixin, admin.ModelAdmin):
     list_display = ("student_id", "lastname", "firstname", "middlename", "program")
     search_fields = ("lastname", "firstname",)
+    list_select_related = ("program",)
+    autocomplete_fields = ("program",)
 
 @admin.register(OrgMember)
 class OrgMemberAdmin(admin.ModelAdmin):
     list_display = ("student", "get_member_program", "organization", "date_joined",)
     search_fields = ("student__lastname", "student__firstname",)
+    list_select_related = ("student__program", "organization")
+    autocomplete_fields = ("student", "organization",)
 
     def get_member_program(self, obj):
-        try:
-            member = Student.objects.get(id=obj.student_id)
-            return member.program
-        except Student.DoesNotExist:
-            return None
+        return obj.student.program
 
     get_member_program.short_description = 'Program'
+
+@admin.register(DeletionJob)
+class DeletionJobAdmin(admin.ModelAdmin):
+    list_display = ("object_repr", "model_label", "status", "created_at", "finished_at",)
+    list_filter = ("status", "model_label",)
+    readonly_fields = ("total", "deleted", "error",)
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "status", "priority", "attempts", "run_after", "finished_at",)
+    list_filter = ("status", "task",)
+    readonly_fields = ("error",)
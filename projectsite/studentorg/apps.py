@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class StudentorgConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'studentorg'
+
+    def ready(self):
+        from studentorg import dbtuning, signals
+        post_migrate.connect(signals.install_search_index, sender=self)
+        connection_created.connect(dbtuning.apply_sqlite_pragmas, dispatch_uid='studentorg-sqlite-pragmas')
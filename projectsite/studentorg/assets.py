@@ -0,0 +1,238 @@
+"""Static asset pipeline: hashed, precompressed files served straight from WSGI.
+
+``collectstatic`` with ``CompressedManifestStaticFilesStorage`` (the
+``staticfiles`` storage in settings.py) copies ``STATICFILES_DIRS`` into
+``STATIC_ROOT``, adds a content-hashed copy of every file with a
+``staticfiles.json`` manifest, and writes ``.gz`` and, when the ``brotli``
+package is installed, ``.br`` variants next to each text asset.
+
+``StaticAssetHandler`` wraps the WSGI application (see wsgi.py) and answers
+requests under ``STATIC_URL`` before Django sees them: it picks the
+smallest variant the client's ``Accept-Encoding`` allows and marks hashed
+files immutable for a year, so browsers stop revalidating them. Other
+files get an ETag and are revalidated. With ``DEBUG`` on, the handler
+steps aside and ``runserver`` serves ``STATICFILES_DIRS`` as usual.
+"""
+import gzip
+import mimetypes
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Text formats worth compressing; images and web fonts are compressed already.
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ttf', '.otf', '.eot', '.ico')
+# Smaller files fit in a packet either way.
+MIN_COMPRESS_SIZE = 256
+# Keep a variant only if it saves at least this much.
+MIN_RATIO = 0.95
+
+# Content-Encoding, file suffix, in order of preference.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, no-cache'
+CHUNK_SIZE = 64 * 1024
+
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    # mtime=0 makes the output depend on the content only.
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def compress_file(path):
+    """Write the ``.br`` and ``.gz`` variants of ``path``; return their suffixes."""
+    if not path.endswith(COMPRESSIBLE):
+        return []
+    modified = os.path.getmtime(path)
+    data, written = None, []
+    for encoding, suffix in ENCODINGS:
+        if encoding == 'br' and brotli is None:
+            continue
+        if os.path.exists(path + suffix) and os.path.getmtime(path + suffix) >= modified:
+            # Unchanged since the last collectstatic.
+            written.append(suffix)
+            continue
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        compressed = _compress(data, encoding) if len(data) >= MIN_COMPRESS_SIZE else None
+        if compressed is not None and len(compressed) < len(data) * MIN_RATIO:
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            written.append(suffix)
+        elif os.path.exists(path + suffix):
+            # Left over from an earlier collectstatic, when the file compressed better.
+            os.remove(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """``ManifestStaticFilesStorage`` that also precompresses what it collects.
+
+    The vendored plugins reference source maps and fonts that are not
+    shipped; those references are left as they are instead of failing
+    ``collectstatic``. Until ``collectstatic`` has written a manifest (a
+    fresh checkout, the test runner) URLs use the unhashed names, as with
+    ``StaticFilesStorage``.
+    """
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def url_converter(self, name, hashed_files, template=None):
+        converter = super().url_converter(name, hashed_files, template)
+
+        def tolerant_converter(matchobj):
+            try:
+                return converter(matchobj)
+            except ValueError:
+                return matchobj['matched']
+        return tolerant_converter
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        # zlib and brotli release the GIL, so the files compress in parallel.
+        with ThreadPoolExecutor() as executor:
+            names = set(paths) | set(self.hashed_files.values())
+            list(executor.map(compress_file, (self.path(name) for name in names)))
+
+
+class Asset:
+    """A file under ``STATIC_ROOT`` and its precompressed variants."""
+
+    def __init__(self, path, immutable):
+        stat = os.stat(path)
+        self.path = path
+        self.size = stat.st_size
+        self.last_modified = http_date(stat.st_mtime)
+        self.etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+        content_type, _ = mimetypes.guess_type(path)
+        self.content_type = content_type or 'application/octet-stream'
+        self.cache_control = IMMUTABLE if immutable else REVALIDATE
+        self.variants = {encoding: (path + suffix, os.path.getsize(path + suffix))
+                         for encoding, suffix in ENCODINGS if os.path.exists(path + suffix)}
+
+    def negotiate(self, accept_encoding):
+        """``(path, size, Content-Encoding or None)`` of the variant to send."""
+        qualities = _qualities(accept_encoding)
+        for encoding, _ in ENCODINGS:
+            if encoding in self.variants and qualities.get(encoding, qualities.get('*', 0)) > 0:
+                return (*self.variants[encoding], encoding)
+        return self.path, self.size, None
+
+
+def _qualities(accept_encoding):
+    """``{coding: q}`` from an Accept-Encoding header."""
+    qualities = {}
+    for item in accept_encoding.split(','):
+        coding, *params = (part.strip() for part in item.split(';'))
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        if coding:
+            qualities[coding.lower()] = quality
+    return qualities
+
+
+def _not_modified(environ, asset, etag):
+    if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        # Weak comparison, as If-None-Match uses.
+        etags = [tag.removeprefix('W/') for tag in parse_etags(if_none_match)]
+        return '*' in etags or etag in etags
+    since = parse_http_date_safe(environ.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return since is not None and since >= parse_http_date_safe(asset.last_modified)
+
+
+def _read(f):
+    with f:
+        while chunk := f.read(CHUNK_SIZE):
+            yield chunk
+
+
+class StaticAssetHandler:
+    """WSGI middleware that serves ``STATIC_ROOT`` when ``DEBUG`` is off."""
+
+    def __init__(self, application):
+        self.application = application
+        prefix = urlparse(settings.STATIC_URL or '')
+        # Nothing to serve when the assets live on another host (a CDN).
+        self.enabled = bool(not settings.DEBUG and settings.STATIC_ROOT and prefix.path and not prefix.netloc)
+        self.prefix = prefix.path
+        self.assets = self.index() if self.enabled else {}
+
+    def index(self):
+        """Map URL paths to the ``Asset`` of every file collected into ``STATIC_ROOT``."""
+        root = str(settings.STATIC_ROOT)
+        hashed = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+        suffixes = tuple(suffix for _, suffix in ENCODINGS)
+        assets = {}
+        for directory, _, files in os.walk(root):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                if filename.endswith(suffixes) and os.path.exists(os.path.splitext(path)[0]):
+                    continue
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                assets[self.prefix + name] = Asset(path, immutable=name in hashed)
+        return assets
+
+    def __call__(self, environ, start_response):
+        if not self.enabled:
+            return self.application(environ, start_response)
+        asset = self.assets.get(environ.get('SCRIPT_NAME', '') + environ.get('PATH_INFO', ''))
+        if asset is None:
+            return self.application(environ, start_response)
+        return self.serve(asset, environ, start_response)
+
+    def serve(self, asset, environ, start_response):
+        method = environ['REQUEST_METHOD']
+        if method not in ('GET', 'HEAD'):
+            start_response('405 Method Not Allowed', [('Allow', 'GET, HEAD'), ('Content-Length', '0')])
+            return []
+
+        path, size, encoding = asset.negotiate(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        etag = asset.etag if encoding is None else f'{asset.etag[:-1]}-{encoding}"'
+        headers = [
+            ('Cache-Control', asset.cache_control),
+            ('ETag', etag),
+            ('Last-Modified', asset.last_modified),
+        ]
+        if asset.variants:
+            headers.append(('Vary', 'Accept-Encoding'))
+        if _not_modified(environ, asset, etag):
+            start_response('304 Not Modified', headers)
+            return []
+
+        headers += [
+            ('Content-Type', asset.content_type),
+            ('Content-Length', str(size)),
+            ('X-Content-Type-Options', 'nosniff'),
+        ]
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+        start_response('200 OK', headers)
+        if method == 'HEAD':
+            return []
+        f = open(path, 'rb')
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        return file_wrapper(f, CHUNK_SIZE) if file_wrapper else _read(f)
@@ -0,0 +1,95 @@
+"""Autocomplete for foreign-key form fields.
+
+``AutocompleteSelect`` renders a ``<select>`` holding only the current
+value instead of one ``<option>`` per row of the related table;
+``static/js/autocomplete.js`` turns it into a search box that fetches
+matches from an ``AutocompleteView`` one page at a time. A form therefore
+costs the same to render however many students or organizations exist.
+"""
+from functools import reduce
+from operator import or_
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import JsonResponse
+from django.urls import reverse
+from django.views.generic import View
+
+from .search import SEARCH_INDEXES, search
+
+
+class AutocompleteSelect(forms.Select):
+    """A ``<select>`` for a ModelChoiceField that lists only the selected row.
+
+    ``url_name`` names the ``AutocompleteView`` the widget searches.
+    """
+
+    class Media:
+        js = ['js/autocomplete.js']
+
+    def __init__(self, url_name, attrs=None):
+        super().__init__(attrs)
+        self.url_name = url_name
+
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super().build_attrs(base_attrs, extra_attrs)
+        attrs['data-autocomplete-url'] = reverse(self.url_name)
+        return attrs
+
+    def selected_objects(self, value):
+        values = [v for v in value if v not in self.choices.field.empty_values]
+        if not values:
+            return []
+        try:
+            return list(self.choices.queryset.filter(pk__in=values))
+        except (ValueError, ValidationError):
+            # A submitted value that is not a primary key; the field reports it.
+            return []
+
+    def optgroups(self, name, value, attrs=None):
+        field = self.choices.field
+        choices = [] if field.empty_label is None else [('', field.empty_label)]
+        choices += [(field.prepare_value(obj), field.label_from_instance(obj))
+                    for obj in self.selected_objects(value)]
+        return [
+            (None, [self.create_option(name, option_value, label, str(option_value) in value, index,
+                                       attrs=attrs)], index)
+            for index, (option_value, label) in enumerate(choices)
+        ]
+
+
+class AutocompleteView(View):
+    """One page of the rows of ``model`` matching the ``q`` parameter.
+
+    Responds with ``{"results": [{"id": ..., "text": ...}], "pagination":
+    {"more": ...}}``, the format of the admin's autocomplete. Models with a
+    search index are searched through it, best match first; others filter
+    ``search_fields`` with ``icontains``.
+    """
+    model = None
+    search_fields = ()
+    ordering = ('id',)
+    paginate_by = 20
+    query_budget = 4
+
+    def get_queryset(self, query):
+        queryset = self.model.objects.all()
+        if not query:
+            return queryset.order_by(*self.ordering)
+        if self.model in SEARCH_INDEXES:
+            return search(queryset, query, ranked=True)
+        condition = reduce(or_, (Q(**{f'{field}__icontains': query}) for field in self.search_fields))
+        return queryset.filter(condition).order_by(*self.ordering)
+
+    def get(self, request, *args, **kwargs):
+        query = request.GET.get('q', '').strip()
+        page = request.GET.get('page', '')
+        page = int(page) if page.isdigit() and int(page) > 0 else 1
+
+        start = (page - 1) * self.paginate_by
+        rows = list(self.get_queryset(query)[start:start + self.paginate_by + 1])
+        return JsonResponse({
+            'results': [{'id': obj.pk, 'text': str(obj)} for obj in rows[:self.paginate_by]],
+            'pagination': {'more': len(rows) > self.paginate_by},
+        })
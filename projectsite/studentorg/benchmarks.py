@@ -0,0 +1,209 @@
+"""Request scenarios and measurements shared by the benchmark commands.
+
+``view_scenarios`` lists one request per page and action of the site
+(every URL in ``projectsite/urls.py`` except the admin and login pages).
+``measure`` runs a scenario repeatedly through the test client and
+reports latency percentiles, SQL query counts and peak Python memory, or
+why the scenario failed: an error status or a redirect to the login page.
+"""
+import statistics
+import time
+import tracemalloc
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.shortcuts import resolve_url
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import quote_etag
+
+from studentorg.dashboard import CHARTS, chart_etag
+from studentorg.models import College, Organization, OrgMember, Program, Student
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _first(model):
+    return model.objects.order_by('id').values_list('id', flat=True).first()
+
+
+def _sample(model, field):
+    """A short prefix of a real value, used as the search term."""
+    value = model.objects.order_by('id').values_list(field, flat=True).first() or 'a'
+    return str(value)[:3]
+
+
+def _form_data(model):
+    college, program = _first(College), _first(Program)
+    student, organization = _first(Student), _first(Organization)
+    return {
+        Organization: {'name': 'Benchmark Society', 'college': college, 'description': 'Benchmark'},
+        OrgMember: {'student': student, 'organization': organization, 'date_joined': date.today().isoformat()},
+        Student: {'student_id': '0000-0-0000', 'lastname': 'Bench', 'firstname': 'Mark',
+                  'middlename': '', 'program': program},
+        Program: {'prog_name': 'Benchmark Program', 'college': college},
+        College: {'college_name': 'Benchmark College'},
+    }[model]
+
+
+def _victim(model):
+    """A throwaway row for a delete scenario to remove."""
+    college = College.objects.create(college_name='Benchmark College')
+    if model is College:
+        return college
+    program = Program.objects.create(prog_name='Benchmark Program', college=college)
+    if model is Program:
+        return program
+    if model is Organization:
+        return Organization.objects.create(name='Benchmark Society', college=college, description='Benchmark')
+    student = Student.objects.create(student_id='0000-0-0000', lastname='Bench', firstname='Mark',
+                                     program_id=_first(Program))
+    if model is Student:
+        return student
+    return OrgMember.objects.create(student=student, organization_id=_first(Organization),
+                                    date_joined=date.today())
+
+
+def _consume(response):
+    """Read a streaming response to the end, as a browser would."""
+    for _ in response:
+        pass
+    return response
+
+
+LIST_PAGES = [
+    # (url name prefix, model, field sampled for the q filter)
+    ('organization', Organization, 'name'),
+    ('orgmember', OrgMember, 'student__firstname'),
+    ('student', Student, 'lastname'),
+    ('program', Program, 'prog_name'),
+    ('college', College, 'college_name'),
+]
+
+# List pages whose model has an autocomplete lookup.
+LOOKUPS = ('organization', 'student', 'program')
+
+
+def view_scenarios():
+    """Return ``[(label, setup, request)]``.
+
+    ``setup()`` runs untimed before each request and returns the value
+    passed to ``request(client, value)``.
+    """
+    def nothing():
+        return None
+
+    def cold_cache():
+        cache.clear()
+
+    scenarios = [
+        ('home (cold cache)', cold_cache, lambda client, _: client.get(reverse('home'))),
+        ('home (warm cache)', nothing, lambda client, _: client.get(reverse('home'))),
+        ('home-async (cold cache)', cold_cache, lambda client, _: client.get(reverse('home-async'))),
+        ('home-async (warm cache)', nothing, lambda client, _: client.get(reverse('home-async'))),
+    ]
+    for name in CHARTS:
+        url = reverse('chart-data', args=[name])
+
+        def etag(name=name):
+            return quote_etag(chart_etag(name))
+
+        scenarios += [
+            (f'chart {name} (cold cache)', cold_cache, lambda client, _, url=url: client.get(url)),
+            (f'chart {name} (warm cache)', nothing, lambda client, _, url=url: client.get(url)),
+            (f'chart {name} (304)', etag,
+             lambda client, etag, url=url: client.get(url, HTTP_IF_NONE_MATCH=etag)),
+        ]
+
+    for prefix, model, field in LIST_PAGES:
+        list_url, export_url = reverse(f'{prefix}-list'), reverse(f'{prefix}-export')
+        add_url = reverse(f'{prefix}-add')
+
+        def search(model=model, field=field):
+            return _sample(model, field)
+
+        def existing(model=model):
+            return _first(model)
+
+        def victim(model=model):
+            return _victim(model).pk
+
+        def form(model=model):
+            return _form_data(model)
+
+        scenarios += [
+            (f'{prefix}-list', nothing, lambda client, _, url=list_url: client.get(url)),
+            (f'{prefix}-list?q', search, lambda client, q, url=list_url: client.get(url, {'q': q})),
+            (f'{prefix}-export', nothing, lambda client, _, url=export_url: _consume(client.get(url))),
+            (f'{prefix}-add GET', nothing, lambda client, _, url=add_url: client.get(url)),
+            (f'{prefix}-add POST', form, lambda client, data, url=add_url: client.post(url, data)),
+            (f'{prefix}-update GET', existing,
+             lambda client, pk, prefix=prefix: client.get(reverse(f'{prefix}-update', args=[pk]))),
+            (f'{prefix}-update POST', lambda existing=existing, form=form: (existing(), form()),
+             lambda client, args, prefix=prefix: client.post(reverse(f'{prefix}-update', args=[args[0]]), args[1])),
+            (f'{prefix}-delete GET', existing,
+             lambda client, pk, prefix=prefix: client.get(reverse(f'{prefix}-delete', args=[pk]))),
+            (f'{prefix}-delete POST', victim,
+             lambda client, pk, prefix=prefix: client.post(reverse(f'{prefix}-delete', args=[pk]))),
+        ]
+        if prefix in LOOKUPS:
+            lookup_url = reverse(f'{prefix}-lookup')
+            scenarios += [
+                (f'{prefix}-lookup', nothing, lambda client, _, url=lookup_url: client.get(url)),
+                (f'{prefix}-lookup?q', search, lambda client, q, url=lookup_url: client.get(url, {'q': q})),
+            ]
+    return scenarios
+
+
+def failure(response):
+    """Why ``response`` shows the scenario did not run as intended, or ``None``."""
+    if response.status_code >= 400:
+        return f'status {response.status_code}'
+    url = getattr(response, 'url', None)
+    if url is not None and url.partition('?')[0] == resolve_url(settings.LOGIN_URL):
+        return 'redirected to the login page'
+    return None
+
+
+def measure(client, setup, request, repeat):
+    """Run one scenario ``repeat`` times and summarize it.
+
+    Stops at the first response that ``failure`` rejects and returns its
+    ``status`` and ``error`` instead of timings.
+    """
+    timings, queries = [], []
+    for _ in range(repeat):
+        value = setup()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = request(client, value)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured.captured_queries))
+        error = failure(response)
+        if error:
+            return {'status': response.status_code, 'error': error}
+
+    # Memory is sampled on a separate run so tracing does not skew the timings.
+    value = setup()
+    tracemalloc.start()
+    try:
+        request(client, value)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'status': response.status_code,
+        'p50_ms': round(percentile(timings, 0.50), 2),
+        'p90_ms': round(percentile(timings, 0.90), 2),
+        'p99_ms': round(percentile(timings, 0.99), 2),
+        'mean_ms': round(statistics.fmean(timings), 2),
+        'queries': max(queries),
+        'peak_kb': round(peak / 1024, 1),
+    }
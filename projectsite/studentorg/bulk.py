@@ -0,0 +1,159 @@
+"""Set-based bulk actions for the list pages.
+
+Each action runs in one transaction with a few statements per table,
+however many rows it touches: one grouped read per kind of row for the
+rollup deltas (``studentorg.rollups.Deltas``), batched writes of those
+deltas, then one UPDATE or DELETE per table. Rows are selected by
+subquery, so thousands of them cost about as many round trips as one.
+
+UPDATE and DELETE on querysets send no model signals, so each action
+brings the counters, rollup tables and time series up to date itself and
+invalidates the dashboard charts that read the tables it changed. Updates
+set ``updated_at``, which the list row cache and the chart ETags key on;
+the search index follows through its triggers.
+"""
+import operator
+from functools import partial, reduce
+
+from django.db import models, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from studentorg import dashboard
+from studentorg.models import Organization, OrgMember, Student
+from studentorg.rollups import Deltas
+
+
+def _invalidate(*changed_models):
+    if not changed_models:
+        return
+    names = {name for model in changed_models for name in dashboard.CHART_DEPENDENCIES[model]}
+    # Wait for the commit so a recompute never caches uncommitted data.
+    transaction.on_commit(partial(dashboard.invalidate_charts, sorted(names)))
+
+
+def cascade(model, lookup='pk'):
+    """``[(model, lookups)]`` for ``model`` and every model its deletes cascade to.
+
+    ``lookups`` go from each model to the pk of ``model``, one per path
+    (memberships reach a college through their student and through their
+    organization). Dependents come before the models they depend on, the
+    order to delete them in.
+    """
+    steps = {}
+    for relation in model._meta.related_objects:
+        # The search indexes: their triggers delete their rows.
+        if relation.on_delete is models.DO_NOTHING:
+            continue
+        field = relation.field.name
+        for dependent, lookups in cascade(relation.related_model, field if lookup == 'pk' else f'{field}__{lookup}'):
+            steps.setdefault(dependent, []).extend(lookups)
+    steps.setdefault(model, []).append(lookup)
+    return list(steps.items())
+
+
+def matching(model, lookups, values):
+    """Rows of ``model`` whose ``lookups`` match any of ``values`` (a list or a subquery)."""
+    return model._base_manager.filter(reduce(operator.or_, (Q(**{f'{lookup}__in': values}) for lookup in lookups)))
+
+
+def cascade_delete(queryset):
+    """Delete ``queryset`` and the rows that cascade from it, one DELETE per table.
+
+    Returns ``{model: rows deleted}``. Sends no signals, so the caller
+    accounts for the deleted rows in the rollups. ``queryset`` is re-read
+    by every DELETE, so it must not filter on the rows that cascade from it.
+    """
+    model = queryset.model
+    selected = model._base_manager.filter(pk__in=queryset.values('pk'))
+    deleted = {}
+    for relation in model._meta.related_objects:
+        if relation.on_delete is models.DO_NOTHING:
+            continue
+        if relation.on_delete is not models.CASCADE:
+            raise ValueError(f'{relation.related_model.__name__}.{relation.field.name} does not cascade.')
+        dependents = relation.related_model._base_manager.filter(**{f'{relation.field.name}__in': selected})
+        for dependent, count in cascade_delete(dependents).items():
+            deleted[dependent] = deleted.get(dependent, 0) + count
+    # QuerySet.delete() would collect every row to send its signals.
+    deleted[model] = selected._raw_delete(selected.db)
+    return deleted
+
+
+@transaction.atomic
+def delete_rows(queryset):
+    """Delete ``queryset`` with its cascade, counting the students and memberships out first.
+
+    Returns ``{model: rows deleted}``.
+    """
+    deltas = Deltas()
+    selected = queryset.values('pk')
+    for model, lookups in cascade(queryset.model):
+        if model is Student:
+            deltas.add_students(matching(model, lookups, selected), sign=-1)
+        elif model is OrgMember:
+            deltas.add_members(matching(model, lookups, selected), sign=-1)
+    deltas.apply()
+    deleted = cascade_delete(queryset)
+    _invalidate(*(model for model, count in deleted.items() if count and model in dashboard.CHART_DEPENDENCIES))
+    return deleted
+
+
+def delete_students(students):
+    """Delete ``students`` and their memberships; returns the numbers deleted."""
+    deleted = delete_rows(students)
+    return {'students': deleted[Student], 'memberships': deleted.get(OrgMember, 0)}
+
+
+@transaction.atomic
+def reassign_program(students, program):
+    """Move ``students`` to ``program``; returns the number moved."""
+    moving = Student.objects.filter(pk__in=students.values('pk')).exclude(program=program)
+    memberships = OrgMember.objects.filter(student__in=moving.values('pk'))
+    deltas = Deltas()
+    deltas.add_students(moving, sign=-1)
+    deltas.add_students(moving, program_id=program.pk)
+    deltas.add_members(memberships, sign=-1)
+    deltas.add_members(memberships, program_id=program.pk)
+    deltas.apply()
+    moved = moving.update(program=program, updated_at=timezone.now())
+    _invalidate(Student, OrgMember)
+    return {'students': moved}
+
+
+def delete_members(members):
+    """Delete the ``members`` memberships; returns the number deleted."""
+    deleted = delete_rows(members)
+    return {'memberships': deleted[OrgMember]}
+
+
+@transaction.atomic
+def move_members(members, organization):
+    """Move the ``members`` memberships to ``organization``; returns the number moved."""
+    moving = OrgMember.objects.filter(pk__in=members.values('pk')).exclude(organization=organization)
+    deltas = Deltas()
+    deltas.add_members(moving, sign=-1)
+    deltas.add_members(moving, organization_id=organization.pk)
+    deltas.apply()
+    moved = moving.update(organization=organization, updated_at=timezone.now())
+    _invalidate(OrgMember)
+    return {'memberships': moved}
+
+
+@transaction.atomic
+def delete_organizations(organizations):
+    """Delete ``organizations`` with their memberships; returns the numbers deleted.
+
+    The organizations' rollup rows and series go with them, and no other
+    counter counts memberships, so there is nothing to adjust.
+    """
+    deleted = cascade_delete(organizations)
+    _invalidate(Organization, OrgMember)
+    return {'organizations': deleted[Organization], 'memberships': deleted.get(OrgMember, 0)}
+
+
+@transaction.atomic
+def merge_organizations(organizations, organization):
+    """Move every member of ``organizations`` to ``organization``; returns the number moved."""
+    members = OrgMember.objects.filter(organization__in=organizations.values('pk'))
+    return move_members(members, organization)
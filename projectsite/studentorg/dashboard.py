@@ -0,0 +1,319 @@
+"""Dashboard chart aggregations for HomePageView.
+
+Every chart is computed with a fixed number of grouped queries. Most
+read the counter columns, rollup tables and time series maintained by
+``studentorg.rollups``; the radar and bubble charts score every
+organization at once from a grouped membership fact matrix with NumPy
+(``studentorg.scoring``).
+
+Each chart is cached under its own key. Writes mark only the charts that
+depend on the written model as stale, and stale charts keep being served
+while a single worker recomputes them. With ``DASHBOARD_WARM_CHARTS`` the
+stale charts are recomputed by the job queue (``studentorg.jobs``) right
+away instead of by the next page view.
+
+``get_charts_async`` computes several charts at once in a bounded thread
+pool, so a cold dashboard costs about as much as its slowest chart.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from studentorg import jobs, metrics
+from studentorg.models import College, MembershipSeries, Organization, OrgMember, Program, Student, StudentSeries
+from studentorg.scoring import organization_scores, palette_color
+from studentorg.timeseries import YEAR, series
+
+
+RADAR_LABELS = ['Member Count', 'College Diversity', 'Program Diversity',
+                'Member Retention', 'Growth Rate']
+
+
+def college_chart():
+    """Students per college, through their program."""
+    college_data = College.objects.filter(student_count__gt=0)\
+                                  .values('college_name')\
+                                  .annotate(count=Sum('student_count'))
+    return {
+        'college_labels': [item['college_name'] for item in college_data],
+        'college_counts': [item['count'] for item in college_data],
+    }
+
+
+def org_chart():
+    """Members per organization, largest first."""
+    org_data = Organization.objects.filter(member_count__gt=0)\
+                                   .values('name')\
+                                   .annotate(total=Sum('member_count'))\
+                                   .order_by('-total')
+    return {
+        'org_labels': [item['name'] for item in org_data],
+        'org_counts': [item['total'] for item in org_data],
+    }
+
+
+def timeline_chart():
+    """New members per month."""
+    monthly_data = series(MembershipSeries)
+    return {
+        'timeline_labels': [month.strftime('%B %Y') for month, _ in monthly_data],
+        'timeline_counts': [count for _, count in monthly_data],
+    }
+
+
+def program_chart():
+    """Students per program, including programs without students."""
+    programs = Program.objects.order_by('id').values_list('prog_name', 'student_count')
+    return {
+        'program_labels': [name for name, count in programs],
+        'program_counts': [count for name, count in programs],
+    }
+
+
+def yearly_chart():
+    """Students created per year over the past four years."""
+    current_year = timezone.now().year
+    years = list(range(current_year - 3, current_year + 1))
+
+    per_year = dict(series(StudentSeries, date(years[0], 1, 1), date(years[-1], 12, 31), period=YEAR))
+    yearly_students = [per_year.get(date(year, 1, 1), 0) for year in years]
+
+    # There is no graduation tracking yet, so every student created in a
+    # year counts as graduated and the rate is 100% whenever there are any.
+    graduation_rates = [round(100.0, 1) if count > 0 else 0 for count in yearly_students]
+
+    return {
+        'yearly_students': yearly_students,
+        'graduation_rates': graduation_rates,
+        'years': [str(year) for year in years],
+    }
+
+
+def bubble_chart():
+    """Member count against average membership age, sized by college size."""
+    organizations, scores = organization_scores()
+    # Scale bubble size between 5 and 50.
+    radius = np.clip(scores['college_students'] / 5, 5, 50)
+
+    bubble_data = []
+    for (_, name, _), members, avg_days, r in zip(organizations, scores['members'], scores['avg_days'], radius):
+        bubble_data.append({
+            'label': name,
+            'data': [{
+                'x': int(members),
+                'y': round(float(avg_days), 1),
+                'r': float(r),
+                'org': name
+            }]
+        })
+    return {'bubble_data': bubble_data}
+
+
+def radar_chart():
+    """Five relative scores per organization with members."""
+    organizations, scores = organization_scores()
+    columns = np.column_stack([scores['member_score'], scores['college_score'], scores['program_score'],
+                               scores['retention_score'], scores['growth_score']])
+
+    radar_datasets = []
+    for (pk, name, _), row in zip(organizations, columns.tolist()):
+        color = palette_color(pk)
+        radar_datasets.append({
+            'label': name,
+            'data': [round(score, 1) for score in row],
+            'fill': True,
+            'backgroundColor': f'rgba({color}, 0.2)',
+            'borderColor': f'rgb({color})',
+            'pointBackgroundColor': f'rgb({color})',
+            'pointBorderColor': '#fff',
+            'pointHoverBackgroundColor': '#fff',
+            'pointHoverBorderColor': f'rgb({color})'
+        })
+    return {'radar_labels': RADAR_LABELS, 'radar_datasets': radar_datasets}
+
+
+CHARTS = {
+    'college': college_chart,
+    'org': org_chart,
+    'timeline': timeline_chart,
+    'program': program_chart,
+    'yearly': yearly_chart,
+    'bubble': bubble_chart,
+    'radar': radar_chart,
+}
+
+
+# Charts whose output depends on each model. Writes to a model only
+# invalidate the charts listed for it.
+CHART_DEPENDENCIES = {
+    College: ('college', 'bubble', 'radar'),
+    Program: ('college', 'program', 'bubble', 'radar'),
+    Organization: ('org', 'bubble', 'radar'),
+    Student: ('college', 'program', 'yearly', 'bubble', 'radar'),
+    OrgMember: ('org', 'timeline', 'bubble', 'radar'),
+}
+
+CACHE_PREFIX = 'dashboard'
+
+
+def _chart_key(name):
+    return f'{CACHE_PREFIX}:chart:{name}'
+
+
+def _generation_key(name):
+    return f'{CACHE_PREFIX}:generation:{name}'
+
+
+def _lock_key(name):
+    return f'{CACHE_PREFIX}:lock:{name}'
+
+
+def _etag_key(name):
+    return f'{CACHE_PREFIX}:etag:{name}'
+
+
+def invalidate_charts(names):
+    """Mark the cached charts as stale.
+
+    Stale entries stay in the cache and keep being served until one worker
+    has recomputed them, so an invalidation never turns into a stampede.
+    """
+    generation = time.time_ns()
+    cache.set_many({_generation_key(name): generation for name in names}, None)
+    if names and getattr(settings, 'DASHBOARD_WARM_CHARTS', False):
+        jobs.enqueue(warm_charts, names=sorted(names), unique=True)
+
+
+@jobs.task(priority=-10, max_attempts=1, timeout=60)
+def warm_charts(names):
+    """Recompute the stale charts among ``names``."""
+    for name in names:
+        get_chart(name)
+
+
+def get_chart_state(name):
+    """Return ``(data, fresh)`` for one chart, from the cache when it is fresh.
+
+    ``fresh`` is False when a stale value is served because another worker
+    is recomputing the chart.
+    """
+    max_age = getattr(settings, 'DASHBOARD_CACHE_MAX_AGE', 300)
+    lock_timeout = getattr(settings, 'DASHBOARD_CACHE_LOCK_TIMEOUT', 30)
+
+    cached = cache.get_many([_chart_key(name), _generation_key(name)])
+    entry = cached.get(_chart_key(name))
+    generation = cached.get(_generation_key(name))
+    if generation is None:
+        cache.add(_generation_key(name), time.time_ns(), None)
+        generation = cache.get(_generation_key(name))
+
+    if entry and entry['generation'] == generation and time.time() - entry['computed_at'] < max_age:
+        return entry['value'], True
+
+    if cache.add(_lock_key(name), 1, lock_timeout):
+        try:
+            value = CHARTS[name]()
+            cache.set(_chart_key(name), {
+                'value': value,
+                'generation': generation,
+                'computed_at': time.time(),
+            }, None)
+        finally:
+            cache.delete(_lock_key(name))
+        return value, True
+
+    # Another worker is recomputing this chart: serve what we have.
+    if entry:
+        return entry['value'], False
+
+    # Nothing cached yet. Give the other worker a moment before
+    # computing the chart ourselves.
+    deadline = time.monotonic() + getattr(settings, 'DASHBOARD_CACHE_WAIT', 2)
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(_chart_key(name))
+        if entry:
+            return entry['value'], True
+    return CHARTS[name](), True
+
+
+def get_chart(name):
+    """Return the data for one chart, from the cache when it is fresh."""
+    return get_chart_state(name)[0]
+
+
+def chart_etag(name):
+    """Return a validator for one chart's data.
+
+    It combines the latest ``updated_at`` and the row count of every model
+    the chart reads (counts catch deletions) with today's date, which the
+    membership-age figures depend on. The value is cached until the next
+    write to one of those models bumps the chart's generation.
+    """
+    generation = cache.get(_generation_key(name))
+    cached = cache.get(_etag_key(name))
+    if cached and generation is not None and cached[0] == generation:
+        return cached[1]
+
+    parts = [name, timezone.now().date().isoformat()]
+    for model, charts in CHART_DEPENDENCIES.items():
+        if name in charts:
+            state = model.objects.aggregate(latest=Max('updated_at'), count=Count('id'))
+            latest = state['latest'].isoformat() if state['latest'] else ''
+            parts.append(f"{model._meta.model_name}:{latest}:{state['count']}")
+    etag = hashlib.md5('|'.join(parts).encode()).hexdigest()
+    cache.set(_etag_key(name), (generation, etag), getattr(settings, 'DASHBOARD_CACHE_MAX_AGE', 300))
+    return etag
+
+
+def get_dashboard_context():
+    """Return the JSON-encoded context for every chart on the home page."""
+    context = {}
+    for name in CHARTS:
+        for key, value in get_chart(name).items():
+            context[key] = json.dumps(value)
+    return context
+
+
+_executor = None
+
+
+def _chart_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'DASHBOARD_CHART_WORKERS', 4),
+            thread_name_prefix='dashboard-chart',
+        )
+    return _executor
+
+
+def _get_chart_in_thread(name):
+    # Pool threads outlive requests, so they manage their own connections
+    # the way the request cycle does for the request thread.
+    close_old_connections()
+    try:
+        # Counted towards the request that asked for the chart.
+        with metrics.count_queries():
+            return get_chart(name)
+    finally:
+        close_old_connections()
+
+
+async def get_charts_async(names=None):
+    """Return ``{name: data}`` for the given charts, computed concurrently."""
+    names = list(names or CHARTS)
+    compute = sync_to_async(_get_chart_in_thread, thread_sensitive=False, executor=_chart_executor())
+    results = await asyncio.gather(*(compute(name) for name in names))
+    return dict(zip(names, results))
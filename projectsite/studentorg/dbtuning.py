@@ -0,0 +1,34 @@
+"""Per-connection database tuning.
+
+Every new SQLite connection runs the PRAGMAs in ``settings.SQLITE_PRAGMAS``
+(a larger page cache and memory-mapped reads), preceded by ``WAL_PRAGMAS``
+when ``settings.SQLITE_WAL`` is on; WAL is written into the database file,
+so it is never switched on implicitly. Connection reuse is configured in
+``DATABASES``: ``CONN_MAX_AGE`` and ``CONN_HEALTH_CHECKS`` on either
+backend, the psycopg pool on PostgreSQL; see settings.py.
+``manage.py benchmark_database`` measures what each of these buys under
+concurrent load.
+"""
+from django.conf import settings
+
+
+WAL_PRAGMAS = {
+    'journal_mode': 'wal',    # Readers and the writer no longer block each other
+    'synchronous': 'normal',  # Sync at checkpoints only; does not risk corruption in WAL mode
+}
+
+
+def sqlite_pragmas(wal=None):
+    """The PRAGMAs for a new connection; ``wal`` defaults to ``settings.SQLITE_WAL``."""
+    if wal is None:
+        wal = getattr(settings, 'SQLITE_WAL', False)
+    return {**(WAL_PRAGMAS if wal else {}), **getattr(settings, 'SQLITE_PRAGMAS', {})}
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """``connection_created`` receiver that tunes new SQLite connections."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in sqlite_pragmas().items():
+            cursor.execute(f'PRAGMA {name} = {value}')
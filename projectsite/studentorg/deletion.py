@@ -0,0 +1,140 @@
+"""Cascade deletes of colleges, programs and organizations, in batches.
+
+Deleting a college through the ORM loads every program, student and
+membership under it, sends a signal for each, and deletes them all in one
+transaction that holds the database's write lock until it is done.
+``start_deletion`` records a ``DeletionJob`` instead, and ``run_job``
+deletes bottom-up, memberships first and the object itself last, at most
+``DELETION_BATCH_SIZE`` rows of a table per transaction. Every batch goes
+through ``studentorg.bulk.delete_rows``, so the counters and rollups are
+right between batches, and commits with the job's progress. Each step
+selects what is left of it, so a job that stopped half-way carries on
+from there when it runs again.
+
+Jobs of up to ``DELETION_INLINE_LIMIT`` rows run in the request, larger
+ones are queued for ``manage.py run_worker`` (``studentorg.jobs``). A job
+whose progress has not moved for ``DELETION_JOB_TIMEOUT`` seconds was
+abandoned: the queue runs it again once its worker's lease runs out, and
+``manage.py run_deletions`` runs those and any still pending without a
+worker.
+"""
+import logging
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from studentorg import bulk, jobs, rollups
+from studentorg.models import DeletionJob
+
+logger = logging.getLogger(__name__)
+
+
+def plan(model, pk):
+    """``[(model, rows)]`` to delete for the ``model`` row ``pk``, in order.
+
+    The rollup tables are left out: ``bulk.delete_rows`` keeps them up to
+    date, and their rows go with the row they belong to.
+    """
+    return [(dependent, bulk.matching(dependent, lookups, [pk])) for dependent, lookups in bulk.cascade(model)
+            if dependent not in rollups.ROLLUP_KEYS]
+
+
+def count_rows(model, pk):
+    return {dependent._meta.label_lower: rows.count() for dependent, rows in plan(model, pk)}
+
+
+def start_deletion(obj, requested_by=None):
+    """Record the deletion of ``obj`` and start it; returns the job.
+
+    An unfinished job for the same object is reused, and a failed one
+    resumed.
+    """
+    label = obj._meta.label_lower
+    unfinished = DeletionJob.objects.filter(model_label=label, object_id=obj.pk,
+                                            status__in=DeletionJob.UNFINISHED)
+    job = unfinished.first()
+    if job is None:
+        try:
+            with transaction.atomic():
+                job = DeletionJob.objects.create(model_label=label, object_id=obj.pk, object_repr=str(obj)[:250],
+                                                 total=count_rows(type(obj), obj.pk), requested_by=requested_by)
+        except IntegrityError:
+            # Someone else asked for it at the same time.
+            job = unfinished.get()
+    elif job.status == DeletionJob.FAILED:
+        unfinished.filter(status=DeletionJob.FAILED).update(status=DeletionJob.PENDING, error='',
+                                                           updated_at=timezone.now())
+
+    if sum(job.total.values()) - sum(job.deleted.values()) <= settings.DELETION_INLINE_LIMIT:
+        # Nobody watches its progress, so it is saved once at the end.
+        return run_job(job.pk, track_progress=False)
+    jobs.enqueue(run_deletion, job_id=job.pk, unique=True)
+    return job
+
+
+def claim(job_id):
+    """Mark the job running if it is pending or abandoned; returns whether the caller got it."""
+    now = timezone.now()
+    abandoned = Q(status=DeletionJob.RUNNING, updated_at__lt=now - timedelta(seconds=settings.DELETION_JOB_TIMEOUT))
+    return bool(DeletionJob.objects.filter(Q(status=DeletionJob.PENDING) | abandoned, pk=job_id)
+                .update(status=DeletionJob.RUNNING, started_at=Coalesce('started_at', Value(now)), updated_at=now))
+
+
+def run_job(job_id, track_progress=True):
+    """Delete what is left of the job's object, unless someone else is; returns the job.
+
+    With ``track_progress`` the job's progress is saved with every batch.
+    """
+    if not claim(job_id):
+        return DeletionJob.objects.get(pk=job_id)
+    job = DeletionJob.objects.get(pk=job_id)
+    try:
+        for model, rows in plan(apps.get_model(job.model_label), job.object_id):
+            while True:
+                # Read outside the transaction: SQLite cannot upgrade a reading
+                # transaction to a writing one after another write committed.
+                pks = list(rows.order_by('pk').values_list('pk', flat=True)[:settings.DELETION_BATCH_SIZE])
+                if not pks:
+                    break
+                with transaction.atomic():
+                    for deleted, count in bulk.delete_rows(model._base_manager.filter(pk__in=pks)).items():
+                        label = deleted._meta.label_lower
+                        if label in job.total:
+                            job.deleted[label] = job.deleted.get(label, 0) + count
+                    if track_progress:
+                        job.save(update_fields=['deleted', 'updated_at'])
+                jobs.heartbeat()
+    except Exception as exc:
+        logger.exception('Deletion job %s failed', job.pk)
+        job.status, job.error = DeletionJob.FAILED, f'{type(exc).__name__}: {exc}'
+        job.save(update_fields=['status', 'error', 'deleted', 'updated_at'])
+        return job
+    job.status, job.finished_at = DeletionJob.DONE, timezone.now()
+    job.save(update_fields=['status', 'finished_at', 'deleted', 'updated_at'])
+    return job
+
+
+def resume(failed=False):
+    """Run the pending and abandoned jobs (and the failed ones with ``failed``); returns them."""
+    if failed:
+        DeletionJob.objects.filter(status=DeletionJob.FAILED).update(status=DeletionJob.PENDING, error='',
+                                                                    updated_at=timezone.now())
+    stale = timezone.now() - timedelta(seconds=settings.DELETION_JOB_TIMEOUT)
+    waiting = DeletionJob.objects.filter(Q(status=DeletionJob.PENDING) |
+                                         Q(status=DeletionJob.RUNNING, updated_at__lt=stale))
+    return [run_job(pk) for pk in waiting.order_by('pk').values_list('pk', flat=True)]
+
+
+@jobs.task(priority=10, timeout=settings.DELETION_JOB_TIMEOUT)
+def run_deletion(job_id):
+    """``run_job`` for the queue, which retries it when it fails."""
+    DeletionJob.objects.filter(pk=job_id, status=DeletionJob.FAILED).update(status=DeletionJob.PENDING,
+                                                                          updated_at=timezone.now())
+    job = run_job(job_id)
+    if job.status == DeletionJob.FAILED:
+        raise RuntimeError(job.error)
@@ -1,6 +1,8 @@
 from django.forms import ModelForm
 from django import forms
 from .models import Organization,OrgMember,Student,Program,College
+from .autocomplete import AutocompleteSelect
+from .search import search
 
 class OrganizationForm(ModelForm):
     class Meta:
@@ -12,13 +14,18 @@ class OrgMemberForm(ModelForm):
         model = OrgMember
         fields = "__all__"
         widgets = {
-            'date_joined': forms.DateInput(attrs={'type':'date'})
+            'date_joined': forms.DateInput(attrs={'type':'date'}),
+            'student': AutocompleteSelect('student-lookup'),
+            'organization': AutocompleteSelect('organization-lookup'),
         }
 
 class StudentForm(ModelForm):
     class Meta:
         model = Student
         fields = "__all__"
+        widgets = {
+            'program': AutocompleteSelect('program-lookup'),
+        }
     
 class ProgramForm(ModelForm):
     class Meta:
@@ -28,4 +35,74 @@ class ProgramForm(ModelForm):
 class CollegeForm(ModelForm):
     class Meta:
         model = College
-        fields = "__all__"
\ No newline at end of file
+        fields = "__all__"
+
+class SelectionField(forms.Field):
+    """The ids of the rows ticked on a list page."""
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        try:
+            return [int(pk) for pk in value or []]
+        except (TypeError, ValueError):
+            raise forms.ValidationError('Invalid selection.', code='invalid')
+
+
+class BulkActionForm(forms.Form):
+    """An action on the ticked rows of a list, or on every row its search matches."""
+    model = None
+    operations = {}             # operation -> label
+    target_operations = ()      # operations that need the target field
+
+    operation = forms.ChoiceField()
+    selected = SelectionField(required=False)
+    select_all = forms.BooleanField(required=False, label='All rows matching the search')
+    q = forms.CharField(required=False, widget=forms.HiddenInput)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['operation'].choices = [('', 'Bulk action...'), *self.operations.items()]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('select_all') and not cleaned_data.get('selected'):
+            raise forms.ValidationError('Select at least one row.', code='empty')
+        if cleaned_data.get('operation') in self.target_operations and not cleaned_data.get('target'):
+            self.add_error('target', 'Choose where to move the selected rows.')
+        return cleaned_data
+
+    def selection(self):
+        """The rows to act on, as a queryset."""
+        queryset = self.model.objects.all()
+        if not self.cleaned_data['select_all']:
+            return queryset.filter(pk__in=self.cleaned_data['selected'])
+        if self.cleaned_data['q']:
+            return search(queryset, self.cleaned_data['q'])
+        return queryset
+
+
+class StudentBulkForm(BulkActionForm):
+    model = Student
+    operations = {'delete': 'Delete', 'reassign': 'Move to program'}
+    target_operations = ('reassign',)
+
+    target = forms.ModelChoiceField(Program.objects.all(), required=False, label='Program',
+                                    widget=AutocompleteSelect('program-lookup'))
+
+
+class OrgMemberBulkForm(BulkActionForm):
+    model = OrgMember
+    operations = {'delete': 'Delete', 'move': 'Move to organization'}
+    target_operations = ('move',)
+
+    target = forms.ModelChoiceField(Organization.objects.all(), required=False, label='Organization',
+                                    widget=AutocompleteSelect('organization-lookup'))
+
+
+class OrganizationBulkForm(BulkActionForm):
+    model = Organization
+    operations = {'delete': 'Delete', 'merge': 'Move members to organization'}
+    target_operations = ('merge',)
+
+    target = forms.ModelChoiceField(Organization.objects.all(), required=False, label='Organization',
+                                    widget=AutocompleteSelect('organization-lookup'))
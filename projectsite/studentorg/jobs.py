@@ -0,0 +1,190 @@
+"""A job queue kept in the database, run by ``manage.py run_worker``.
+
+Functions decorated with ``@task`` can be queued with ``enqueue(func,
+**kwargs)``; the arguments must be JSON. A job is only seen by workers
+once the transaction that queued it commits, so it never runs against
+rows its caller rolled back.
+
+Workers claim the ready jobs with the highest ``priority`` with a
+conditional UPDATE, so two workers never take the same job and no broker
+or row lock is needed. A claim is a lease of the task's ``timeout``
+seconds: a job whose worker died becomes visible again when it runs
+out, and long tasks call ``heartbeat()`` to keep it. A task that raises
+is retried after ``JOBS_RETRY_DELAY`` seconds, doubled on every attempt,
+until it has run ``max_attempts`` times, and then marked failed.
+"""
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import timedelta
+from multiprocessing import get_context
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from studentorg.models import Job
+
+logger = logging.getLogger(__name__)
+
+_current = threading.local()
+
+
+def task(func=None, *, priority=0, max_attempts=3, timeout=300):
+    """Make ``func`` a task; the options are the defaults of the jobs that run it."""
+    def decorate(func):
+        func.task_name = f'{func.__module__}.{func.__qualname__}'
+        func.task_options = {'priority': priority, 'max_attempts': max_attempts, 'timeout': timeout}
+        return func
+    return decorate(func) if func else decorate
+
+
+def enqueue(func, *, priority=None, delay=0, unique=False, **kwargs):
+    """Queue ``func(**kwargs)``; returns the job.
+
+    With ``unique``, a job already queued (and not yet running) for the
+    same call is returned instead of a second one.
+    """
+    if not hasattr(func, 'task_name'):
+        raise TypeError(f'{func!r} is not a task.')
+    if unique:
+        queued = Job.objects.filter(task=func.task_name, kwargs=kwargs, status=Job.QUEUED).first()
+        if queued:
+            return queued
+    options = {**func.task_options, **({'priority': priority} if priority is not None else {})}
+    return Job.objects.create(task=func.task_name, kwargs=kwargs, run_after=timezone.now() + timedelta(seconds=delay),
+                              **options)
+
+
+@task(max_attempts=1, timeout=3600)
+def run_command(name, args=(), options=None):
+    """Run a management command in the worker."""
+    call_command(name, *args, **(options or {}))
+
+
+def _ready(now):
+    return Q(status=Job.QUEUED, run_after__lte=now) | Q(status=Job.RUNNING, locked_until__lt=now)
+
+
+def claim(worker, limit):
+    """Lease up to ``limit`` ready jobs to ``worker``; returns their ids."""
+    now = timezone.now()
+    # A job that used up its last attempt without finishing is not retried.
+    Job.objects.filter(status=Job.RUNNING, locked_until__lt=now, attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, error='Timed out: the lease ran out.', locked_until=None, finished_at=now, updated_at=now,
+    )
+    claimed = []
+    candidates = Job.objects.filter(_ready(now)).order_by('-priority', 'run_after', 'pk')
+    for pk, timeout in candidates.values_list('pk', 'timeout')[:limit]:
+        # The same conditions again: another worker may have taken it since.
+        taken = Job.objects.filter(_ready(now), pk=pk).update(
+            status=Job.RUNNING, attempts=F('attempts') + 1, locked_by=worker,
+            locked_until=now + timedelta(seconds=timeout), updated_at=now,
+        )
+        if taken:
+            claimed.append(pk)
+    return claimed
+
+
+def heartbeat():
+    """Extend the lease of the job running in this thread; does nothing outside a job."""
+    job = getattr(_current, 'job', None)
+    if job is not None:
+        now = timezone.now()
+        Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+            locked_until=now + timedelta(seconds=job.timeout), updated_at=now,
+        )
+
+
+def execute(job_id):
+    """Run one claimed job and record how it went."""
+    close_old_connections()
+    job = Job.objects.get(pk=job_id)
+    # Only record the outcome while the lease is still ours.
+    mine = Job.objects.filter(pk=job.pk, locked_by=job.locked_by, attempts=job.attempts, status=Job.RUNNING)
+    _current.job = job
+    try:
+        func = import_string(job.task)
+        if not hasattr(func, 'task_options'):
+            raise TypeError(f'{job.task} is not a task.')
+        func(**job.kwargs)
+    except Exception as exc:
+        now = timezone.now()
+        error = f'{type(exc).__name__}: {exc}'
+        if job.attempts < job.max_attempts:
+            logger.warning('Job %s failed (attempt %s of %s), retrying: %s', job, job.attempts, job.max_attempts, error)
+            delay = settings.JOBS_RETRY_DELAY * 2 ** (job.attempts - 1)
+            mine.update(status=Job.QUEUED, error=error, locked_by='', locked_until=None,
+                        run_after=now + timedelta(seconds=delay), updated_at=now)
+        else:
+            logger.exception('Job %s failed', job)
+            mine.update(status=Job.FAILED, error=error, locked_until=None, finished_at=now, updated_at=now)
+    else:
+        now = timezone.now()
+        mine.update(status=Job.DONE, error='', locked_until=None, finished_at=now, updated_at=now)
+    finally:
+        _current.job = None
+        close_old_connections()
+
+
+def purge():
+    """Delete the jobs that finished more than ``JOBS_RETENTION`` seconds ago; returns how many."""
+    cutoff = timezone.now() - timedelta(seconds=settings.JOBS_RETENTION)
+    return Job.objects.filter(status__in=[Job.DONE, Job.FAILED], finished_at__lt=cutoff).delete()[0]
+
+
+class Worker:
+    """Claims jobs and runs them in a pool of threads or processes.
+
+    ``stop()`` (SIGINT, SIGTERM) stops claiming and lets the running jobs
+    finish. With ``burst`` the worker also stops once no job is ready.
+    """
+
+    def __init__(self, concurrency, pool='thread', poll_interval=1.0, burst=False):
+        self.concurrency = concurrency
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self.burst = burst
+        self.name = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
+        self.stopping = threading.Event()
+        self.completed = 0
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def executor(self):
+        if self.pool == 'process':
+            # Forked children would share the parent's database connections.
+            return ProcessPoolExecutor(self.concurrency, mp_context=get_context('spawn'), initializer=django.setup)
+        return ThreadPoolExecutor(self.concurrency, thread_name_prefix='job')
+
+    def run(self):
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, self.stop)
+        running = set()
+        purged = None
+        with self.executor() as executor:
+            while not self.stopping.is_set():
+                if purged is None or time.monotonic() - purged > 3600:
+                    purge()
+                    purged = time.monotonic()
+                free = self.concurrency - len(running)
+                claimed = claim(self.name, free) if free else []
+                running |= {executor.submit(execute, pk) for pk in claimed}
+                if not claimed and not running and self.burst:
+                    break
+                done, running = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                self.completed += len(done)
+                if not done and not running:
+                    self.stopping.wait(self.poll_interval)
+            done, _ = wait(running)
+            self.completed += len(done)
@@ -0,0 +1,182 @@
+import importlib.util
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connections, transaction
+from django.test.utils import override_settings
+from studentorg.benchmarks import percentile
+from studentorg.dbtuning import sqlite_pragmas
+from studentorg.models import Organization, OrgMember, Student
+
+# DATABASES options that the profiles set; any others in settings are kept.
+TUNING_OPTIONS = ('transaction_mode', 'timeout', 'pool')
+
+
+def profiles(vendor, workers):
+    """Connection settings to compare: ``[(name, DATABASES overrides, SQLite PRAGMAs)]``.
+
+    On SQLite, "tuned" is what settings.py configures with ``SQLITE_WAL`` on.
+    """
+    if vendor == 'sqlite':
+        return [
+            ('untuned', {'CONN_MAX_AGE': 0, 'OPTIONS': {}},
+             {'journal_mode': 'delete', 'synchronous': 'full'}),
+            ('tuned', {'CONN_MAX_AGE': 600, 'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20}},
+             sqlite_pragmas(wal=True)),
+        ]
+    if vendor == 'postgresql':
+        compared = [
+            ('connect per request', {'CONN_MAX_AGE': 0, 'OPTIONS': {}}, {}),
+            ('persistent', {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True, 'OPTIONS': {}}, {}),
+        ]
+        if importlib.util.find_spec('psycopg_pool') is None:
+            # The pool is optional (psycopg[pool]); compare what is installed.
+            return compared
+        return compared + [
+            ('pooled', {'CONN_MAX_AGE': 0, 'OPTIONS': {'pool': {'min_size': workers, 'max_size': workers}}}, {}),
+        ]
+    raise CommandError(f'benchmark_database does not support {vendor}.')
+
+
+class Command(BaseCommand):
+    help = ('Run concurrent reads and writes against a scratch database under each connection '
+            'profile (SQLite PRAGMAs, persistent and pooled connections) and compare throughput')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Concurrent threads, each with its own connection (default 8)')
+        parser.add_argument('--duration', type=float, default=5.0,
+                            help='Seconds to run each profile (default 5)')
+        parser.add_argument('--write-ratio', type=float, default=0.2,
+                            help='Fraction of operations that write (default 0.2)')
+        parser.add_argument('--scale', type=int, default=2000,
+                            help='Students in the scratch database (default 2000)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--only', help='Only run profiles whose name contains this text')
+
+    def handle(self, *args, **options):
+        connection = connections['default']
+        selected = [profile for profile in profiles(connection.vendor, options['workers'])
+                    if not options['only'] or options['only'] in profile[0]]
+        if not selected:
+            raise CommandError('No profile matches --only.')
+
+        # An in-memory SQLite test database would not show locking at all.
+        scratch = tempfile.mkdtemp() if connection.vendor == 'sqlite' else None
+        if scratch:
+            connection.settings_dict['TEST']['NAME'] = os.path.join(scratch, 'benchmark.sqlite3')
+        original = {key: connection.settings_dict[key] for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS', 'OPTIONS')}
+        self.base_options = {key: value for key, value in original['OPTIONS'].items() if key not in TUNING_OPTIONS}
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(DEBUG=False):
+                call_command('create_initial_data', scale=options['scale'], seed=options['seed'],
+                             stdout=StringIO())
+                student_ids = list(Student.objects.values_list('id', flat=True))
+                organization_ids = list(Organization.objects.values_list('id', flat=True))
+
+                results = []
+                for name, overrides, pragmas in selected:
+                    self.stdout.write(f'Running {name}...')
+                    results.append((name, self.run_profile(overrides, pragmas, options,
+                                                           student_ids, organization_ids)))
+        finally:
+            connections.close_all()
+            connection.settings_dict.update(original)
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            if scratch:
+                shutil.rmtree(scratch, ignore_errors=True)
+
+        self.report(results, options)
+
+    def run_profile(self, overrides, pragmas, options, student_ids, organization_ids):
+        connection = connections['default']
+        connections.close_all()
+        if hasattr(connection, 'close_pool'):
+            connection.close_pool()
+        connection.settings_dict.update(overrides, OPTIONS={**self.base_options, **overrides['OPTIONS']})
+
+        with override_settings(SQLITE_PRAGMAS=pragmas):
+            # Open and close one connection first so a journal_mode change
+            # takes effect before the workers connect.
+            connection.ensure_connection()
+            connection.close()
+
+            deadline = time.monotonic() + options['duration']
+            results = []
+            threads = [
+                threading.Thread(target=self.worker, args=(
+                    deadline, options['write_ratio'], f"{options['seed']}-{number}",
+                    student_ids, organization_ids, results,
+                ))
+                for number in range(options['workers'])
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        timings = [timing for worker_timings, _ in results for timing in worker_timings]
+        return {
+            'ops_per_s': round(len(timings) / options['duration'], 1),
+            'p50_ms': round(percentile(timings, 0.50), 2) if timings else None,
+            'p99_ms': round(percentile(timings, 0.99), 2) if timings else None,
+            'errors': sum(errors for _, errors in results),
+        }
+
+    def worker(self, deadline, write_ratio, seed, student_ids, organization_ids, results):
+        rng = random.Random(seed)
+        timings, errors = [], 0
+        try:
+            while time.monotonic() < deadline:
+                # What the request_started and request_finished signals do:
+                # drop connections past CONN_MAX_AGE or found unusable.
+                close_old_connections()
+                started = time.perf_counter()
+                try:
+                    if rng.random() < write_ratio:
+                        self.write(rng, student_ids, organization_ids)
+                    else:
+                        self.read(rng, student_ids, organization_ids)
+                except OperationalError:
+                    # "database is locked" and similar.
+                    errors += 1
+                else:
+                    timings.append((time.perf_counter() - started) * 1000)
+                close_old_connections()
+        finally:
+            connections.close_all()
+        results.append((timings, errors))
+
+    def read(self, rng, student_ids, organization_ids):
+        """A page of the student list and an organization, as the list and edit views read them."""
+        list(Student.objects.select_related('program').filter(id__gte=rng.choice(student_ids)).order_by('id')[:20])
+        Organization.objects.filter(pk=rng.choice(organization_ids)).values_list('name', 'member_count').first()
+
+    def write(self, rng, student_ids, organization_ids):
+        """Add a membership and remove it again, with the usual counter and rollup updates."""
+        with transaction.atomic():
+            member = OrgMember.objects.create(student_id=rng.choice(student_ids),
+                                              organization_id=rng.choice(organization_ids),
+                                              date_joined=date.today())
+        with transaction.atomic():
+            member.delete()
+
+    def report(self, results, options):
+        self.stdout.write('')
+        self.stdout.write(f"{options['workers']} workers, {options['duration']:g}s per profile, "
+                          f"{options['write_ratio']:.0%} writes")
+        self.stdout.write(f"{'profile':<22}{'ops/s':>10}{'p50':>9}{'p99':>9}{'errors':>8}{'speedup':>9}")
+        baseline = results[0][1]['ops_per_s'] or None
+        for name, result in results:
+            speedup = f"x{result['ops_per_s'] / baseline:.2f}" if baseline else '-'
+            self.stdout.write(f"{name:<22}{result['ops_per_s']:>10}{result['p50_ms'] or '-':>9}"
+                              f"{result['p99_ms'] or '-':>9}{result['errors']:>8}{speedup:>9}")
@@ -0,0 +1,106 @@
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve, reverse
+from studentorg.benchmarks import LIST_PAGES, percentile
+
+
+def _uncached_templates():
+    """settings.TEMPLATES with the plain filesystem and app loaders, compiling on every render."""
+    engine = {**settings.TEMPLATES[0], 'APP_DIRS': False}
+    engine['OPTIONS'] = {**engine['OPTIONS'], 'loaders': [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]}
+    return [engine, *settings.TEMPLATES[1:]]
+
+
+def profiles():
+    """``[(name, settings overrides, clear the cache before each render)]``."""
+    row_timeout = settings.TEMPLATE_ROW_CACHE_TIMEOUT or 3600
+    return [
+        ('uncached loader', {'TEMPLATES': _uncached_templates(), 'TEMPLATE_ROW_CACHE_TIMEOUT': 0}, False),
+        ('cached loader', {'TEMPLATE_ROW_CACHE_TIMEOUT': 0}, False),
+        ('+ row cache (cold)', {'TEMPLATE_ROW_CACHE_TIMEOUT': row_timeout}, True),
+        ('+ row cache (warm)', {'TEMPLATE_ROW_CACHE_TIMEOUT': row_timeout}, False),
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway test database and time the template rendering of each list page '
+            'with and without the cached template loader and the row fragment cache')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1000,
+                            help='Students to seed (default 1000)')
+        parser.add_argument('--per-page', type=int,
+                            help="Rows per page (default: each view's paginate_by)")
+        parser.add_argument('--repeat', type=int, default=50,
+                            help='Renders per page and profile (default 50)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--only', help='Only run pages whose name contains this text')
+
+    def handle(self, *args, **options):
+        pages = [prefix for prefix, _, _ in LIST_PAGES if not options['only'] or options['only'] in prefix]
+        if not pages:
+            raise CommandError('No page matches --only.')
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                call_command('create_initial_data', scale=options['scale'], seed=options['seed'],
+                             stdout=StringIO())
+                user = User.objects.create_superuser('benchmark', password='benchmark')
+                results = {prefix: self.run_page(prefix, user, options) for prefix in pages}
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.report(results)
+
+    def run_page(self, prefix, user, options):
+        url = reverse(f'{prefix}-list')
+        view_class = resolve(url).func.view_class
+        initkwargs = {'paginate_by': options['per_page']} if options['per_page'] else {}
+        view = view_class.as_view(**initkwargs)
+        factory = RequestFactory()
+
+        results = {}
+        for name, overrides, cold in profiles():
+            with override_settings(**overrides):
+                cache.clear()
+                timings, queries = [], 0
+                # The first render compiles the templates and fills the row cache.
+                for _ in range(options['repeat'] + 1):
+                    if cold:
+                        cache.clear()
+                    request = factory.get(url)
+                    request.user = user
+                    response = view(request)
+                    with CaptureQueriesContext(connection) as captured:
+                        started = time.perf_counter()
+                        response.render()
+                        timings.append((time.perf_counter() - started) * 1000)
+                    queries = len(captured.captured_queries)
+                results[name] = {
+                    'p50_ms': round(percentile(timings[1:], 0.50), 3),
+                    'p90_ms': round(percentile(timings[1:], 0.90), 3),
+                    'queries': queries,
+                }
+        return results
+
+    def report(self, results):
+        self.stdout.write(f"{'page':<14}{'profile':<22}{'p50':>9}{'p90':>9}{'queries':>9}{'speedup':>9}")
+        for prefix, page in results.items():
+            baseline = next(iter(page.values()))['p50_ms']
+            for name, result in page.items():
+                speedup = f"x{baseline / result['p50_ms']:.2f}" if result['p50_ms'] else '-'
+                self.stdout.write(f"{prefix:<14}{name:<22}{result['p50_ms']:>9.3f}{result['p90_ms']:>9.3f}"
+                                  f"{result['queries']:>9}{speedup:>9}")
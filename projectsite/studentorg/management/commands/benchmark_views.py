@@ -0,0 +1,114 @@
+import json
+import platform
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+from studentorg.benchmarks import measure, view_scenarios
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway test database at several scales and record latency, '
+            'query counts and memory for every view')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='1000,10000',
+                            help='Comma-separated numbers of students to seed (default 1000,10000)')
+        parser.add_argument('--repeat', type=int, default=10,
+                            help='Requests per view and scale (default 10)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--only', help='Only run views whose label contains this text')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--compare', help='Baseline JSON file from an earlier run')
+        parser.add_argument('--threshold', type=float, default=1.25,
+                            help='Fail when a p50 grows beyond baseline * threshold (default 1.25)')
+        parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                            help='Ignore p50 regressions smaller than this many milliseconds (default 2)')
+
+    def handle(self, *args, **options):
+        scales = sorted(int(scale) for scale in options['scales'].split(','))
+        results = {
+            'meta': {
+                'started': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'database': connection.vendor,
+                'repeat': options['repeat'],
+                'seed': options['seed'],
+            },
+            'scales': {},
+        }
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                for scale in scales:
+                    results['scales'][str(scale)] = self.run_scale(scale, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        failures = [f"{scale} students, {label}: {result['error']}"
+                    for scale, views in results['scales'].items()
+                    for label, result in views.items() if 'error' in result]
+        if failures:
+            raise CommandError(f'{len(failures)} scenarios failed: ' + '; '.join(failures))
+
+        if options['compare']:
+            self.compare(results, options)
+
+    def run_scale(self, scale, options):
+        call_command('flush', interactive=False, verbosity=0)
+        call_command('create_initial_data', scale=scale, seed=options['seed'], stdout=StringIO())
+        user = User.objects.create_superuser('benchmark', password='benchmark')
+        # A view that raises is reported as a failed scenario, not a crash.
+        client = Client(raise_request_exception=False)
+        client.force_login(user)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{scale} students'))
+        self.stdout.write(f"{'view':<28}{'p50':>9}{'p90':>9}{'p99':>9}{'queries':>9}{'peak kB':>10}")
+        results = {}
+        for label, setup, request in view_scenarios():
+            if options['only'] and options['only'] not in label:
+                continue
+            result = measure(client, setup, request, options['repeat'])
+            results[label] = result
+            if 'error' in result:
+                self.stdout.write(self.style.ERROR(f"{label:<28}failed: {result['error']}"))
+                continue
+            self.stdout.write(
+                f"{label:<28}{result['p50_ms']:>9.1f}{result['p90_ms']:>9.1f}{result['p99_ms']:>9.1f}"
+                f"{result['queries']:>9}{result['peak_kb']:>10.0f}"
+            )
+        return results
+
+    def compare(self, results, options):
+        with open(options['compare']) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        regressions = []
+        for scale, views in results['scales'].items():
+            for label, current in views.items():
+                before = baseline.get('scales', {}).get(scale, {}).get(label)
+                if not before or 'error' in before:
+                    continue
+                limit = before['p50_ms'] * options['threshold']
+                if current['p50_ms'] > limit and current['p50_ms'] - before['p50_ms'] > options['min_delta_ms']:
+                    regressions.append(f"{scale} students, {label}: p50 {before['p50_ms']}ms -> {current['p50_ms']}ms")
+                if current['queries'] > before['queries']:
+                    regressions.append(f"{scale} students, {label}: {before['queries']} -> {current['queries']} queries")
+
+        for regression in regressions:
+            self.stderr.write(regression)
+        if regressions:
+            raise CommandError(f'{len(regressions)} regressions against {options["compare"]}.')
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {options["compare"]}.'))
@@ -1,53 +1,240 @@
+import random
+import time
+from array import array
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from multiprocessing import get_all_start_methods, get_context
+
 from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.utils import timezone
 from faker import Faker
+from studentorg.dashboard import CHARTS, invalidate_charts
 from studentorg.models import College, Program, Organization, Student, OrgMember
+from studentorg.rollups import rebuild_rollups
+
+# Rows are generated in fixed-size blocks, each with its own random
+# generator seeded from (--seed, table, block number). The output therefore
+# depends only on the seed and the scale, not on the number of workers.
+BLOCK_SIZE = 10000
+
+# Used when the database has no programs yet.
+CATALOGUE = {
+    'College of Sciences': ['Bachelor of Science in Computer Science', 'Bachelor of Science in Biology'],
+    'College of Engineering': ['Bachelor of Science in Civil Engineering',
+                               'Bachelor of Science in Mechanical Engineering'],
+    'College of Arts and Communication': ['Bachelor of Arts in Communication'],
+    'College of Business and Management': ['Bachelor of Science in Business Administration'],
+    'College of Education': ['Bachelor of Elementary Education', 'Bachelor of Secondary Education'],
+    'College of Hospitality Management': ['Bachelor of Science in Hospitality Management'],
+}
+
+# Relative number of enrollments per month: most students arrive in
+# August, a smaller wave in January.
+MONTH_WEIGHTS = [6, 2, 1, 1, 1, 2, 4, 12, 5, 2, 1, 1]
+
+_pools = {}
+
+
+def _init_worker(pools):
+    _pools.update(pools)
+
+
+def _months(start, end):
+    """First days of the months from start to end, with their MONTH_WEIGHTS."""
+    months = []
+    cursor = start.replace(day=1)
+    while cursor <= end:
+        months.append(cursor)
+        cursor = (cursor + timedelta(days=32)).replace(day=1)
+    return months, [MONTH_WEIGHTS[month.month - 1] for month in months]
+
+
+def _student_block(task):
+    seed, block, start, stop, now = task
+    rng = random.Random(f'{seed}-students-{block}')
+    today = now.date()
+    months, weights = _months(date(today.year - 3, 1, 1), today)
+    rows = []
+    for number, month in zip(range(start, stop), rng.choices(months, weights=weights, k=stop - start)):
+        last_day = (month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        created = month + timedelta(days=rng.randint(0, (min(last_day, today) - month).days))
+        created_at = datetime(created.year, created.month, created.day, rng.randint(7, 18),
+                              rng.randint(0, 59), rng.randint(0, 59), tzinfo=dt_timezone.utc)
+        rows.append((
+            f"{created.year}-{number % 8 + 1}-{number:04d}",
+            rng.choice(_pools['last_names']),
+            rng.choice(_pools['first_names']),
+            rng.choice(_pools['last_names']),
+            rng.choice(_pools['program_ids']),
+            min(created_at, now),
+        ))
+    return rows
+
+
+def _membership_block(task):
+    seed, block, count, today_ordinal = task
+    rng = random.Random(f'{seed}-memberships-{block}')
+    student_ids, created = _pools['student_ids'], _pools['student_created']
+    organization_ids = _pools['organization_ids']
+    rows = []
+    for _ in range(count):
+        index = rng.randrange(len(student_ids))
+        # Students usually join within their first months, rarely later.
+        joined = created[index] + int(rng.expovariate(1 / 90))
+        if joined > today_ordinal:
+            joined = rng.randint(created[index], today_ordinal)
+        rows.append((student_ids[index], rng.choice(organization_ids), date.fromordinal(joined)))
+    return rows
+
 
 class Command(BaseCommand):
     help = 'Create initial data for the application'
 
-    def handle(self, *args, **kwargs):
-        self.create_organization(10)
-        self.create_students(50)
-        self.create_membership(10)
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=50,
+                            help='Number of students to create (default 50)')
+        parser.add_argument('--organizations', type=int,
+                            help='Number of organizations (default: 10, or one per 1000 students)')
+        parser.add_argument('--memberships', type=int,
+                            help='Number of memberships (default: a fifth of the students)')
+        parser.add_argument('--seed', type=int, default=42,
+                            help='Random seed; the same seed and scale always produce the same data')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes used to generate rows (rows are written by the main process)')
+        parser.add_argument('--batch-size', type=int, default=BLOCK_SIZE,
+                            help='Rows per bulk_create (default %d)' % BLOCK_SIZE)
+
+    def handle(self, *args, **options):
+        self.seed = options['seed']
+        self.workers = options['workers']
+        if self.workers > 1 and 'fork' not in get_all_start_methods():
+            # The rows do not depend on the number of workers.
+            self.stderr.write('--workers needs the fork start method; generating rows in this process.')
+            self.workers = 1
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.today = self.now.date()
+        scale = options['scale']
+        organizations = options['organizations'] or max(10, scale // 1000)
+        memberships = options['memberships'] if options['memberships'] is not None else scale // 5
+
+        self.create_programs()
+        self.create_organization(organizations)
+        self.create_students(scale)
+        self.create_membership(memberships)
+
+        # bulk_create does not send signals, so bring the dashboard up to date in one go.
+        rebuild_rollups()
+        invalidate_charts(CHARTS)
+
+    def run_blocks(self, function, tasks, pools):
+        """Yield the rows of each block, in block order."""
+        if self.workers > 1:
+            # Forked workers must not share the parent's database connection.
+            connections.close_all()
+            # Forked explicitly: a spawned worker would import this module,
+            # and the models with it, before Django is set up.
+            with get_context('fork').Pool(self.workers, initializer=_init_worker, initargs=(pools,)) as pool:
+                yield from pool.imap(function, tasks)
+        else:
+            _init_worker(pools)
+            for task in tasks:
+                yield function(task)
+
+    def name_pools(self):
+        fake = Faker('en_PH')
+        fake.seed_instance(self.seed)
+        return {
+            'first_names': [fake.first_name() for _ in range(1000)],
+            'last_names': [fake.last_name() for _ in range(1000)],
+        }
+
+    def create_programs(self):
+        if Program.objects.exists():
+            return
+        for college_name, programs in CATALOGUE.items():
+            college, _ = College.objects.get_or_create(college_name=college_name)
+            for prog_name in programs:
+                Program.objects.create(prog_name=prog_name, college=college)
+
+        self.stdout.write(self.style.SUCCESS(
+            'Initial data for colleges and programs created successfully.'))
 
     def create_organization(self, count):
         fake = Faker()
-        
+        fake.seed_instance(self.seed)
+        rng = random.Random(f'{self.seed}-organizations')
+        college_ids = list(College.objects.order_by('id').values_list('id', flat=True))
+
+        organizations = []
         for _ in range(count):
             words = [fake.word() for _ in range(2)]  # two words
             organization_name = ' '.join(words)
-            Organization.objects.create(
+            organizations.append(Organization(
                 name=organization_name.title(),
-                college=College.objects.order_by('?').first(),
+                college_id=rng.choice(college_ids) if college_ids else None,
                 description=fake.sentence()
-            )
+            ))
+        Organization.objects.bulk_create(organizations, batch_size=self.batch_size)
 
         self.stdout.write(self.style.SUCCESS(
             'Initial data for organization created successfully.'))
 
     def create_students(self, count):
-        fake = Faker('en_PH')
-        for _ in range(count):
-            Student.objects.create(
-                student_id=f"{fake.random_int(2020, 2024)}-{fake.random_int(1, 8)}-{fake.random_number(digits=4)}",
-                lastname=fake.last_name(),
-                firstname=fake.first_name(),
-                middlename=fake.last_name(),
-                program=Program.objects.order_by('?').first()
-            )
-        
+        pools = self.name_pools()
+        pools['program_ids'] = list(Program.objects.order_by('id').values_list('id', flat=True))
+        tasks = [
+            (self.seed, block, start, min(start + BLOCK_SIZE, count), self.now)
+            for block, start in enumerate(range(0, count, BLOCK_SIZE))
+        ]
+
+        started = time.monotonic()
+        created = 0
+        for rows in self.run_blocks(_student_block, tasks, pools):
+            with transaction.atomic():
+                Student.objects.bulk_create((
+                    Student(student_id=student_id, lastname=lastname, firstname=firstname,
+                            middlename=middlename, program_id=program_id,
+                            created_at=created_at, updated_at=created_at)
+                    for student_id, lastname, firstname, middlename, program_id, created_at in rows
+                ), batch_size=self.batch_size)
+            created += len(rows)
+            self.progress('students', created, count, started)
+
         self.stdout.write(self.style.SUCCESS(
             'Initial data for students created successfully.'))
 
     def create_membership(self, count):
-        fake = Faker()
-        for _ in range(count):
-            OrgMember.objects.create(
-                student=Student.objects.order_by('?').first(),
-                organization=Organization.objects.order_by('?').first(),
-                date_joined=fake.date_between(
-                    start_date="-2y", end_date="today")
-            )
-        
+        student_ids, student_created = array('q'), array('l')
+        for pk, created_at in Student.objects.order_by('id').values_list('id', 'created_at')\
+                                             .iterator(chunk_size=self.batch_size):
+            student_ids.append(pk)
+            student_created.append(created_at.date().toordinal())
+        organization_ids = list(Organization.objects.order_by('id').values_list('id', flat=True))
+        if not student_ids or not organization_ids:
+            return
+
+        pools = {'student_ids': student_ids, 'student_created': student_created,
+                 'organization_ids': organization_ids}
+        tasks = [
+            (self.seed, block, min(BLOCK_SIZE, count - start), self.today.toordinal())
+            for block, start in enumerate(range(0, count, BLOCK_SIZE))
+        ]
+
+        started = time.monotonic()
+        created = 0
+        for rows in self.run_blocks(_membership_block, tasks, pools):
+            with transaction.atomic():
+                OrgMember.objects.bulk_create((
+                    OrgMember(student_id=student_id, organization_id=organization_id, date_joined=date_joined)
+                    for student_id, organization_id, date_joined in rows
+                ), batch_size=self.batch_size)
+            created += len(rows)
+            self.progress('memberships', created, count, started)
+
         self.stdout.write(self.style.SUCCESS(
             'Initial data for student organization created successfully.'))
+
+    def progress(self, label, done, total, started):
+        elapsed = time.monotonic() - started
+        self.stdout.write(f'{label}: {done}/{total} ({done / elapsed if elapsed else 0:.0f} rows/s)')
@@ -0,0 +1,162 @@
+import re
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from studentorg.benchmarks import view_scenarios
+
+# "SCAN studentorg_student" is a full table scan; "SCAN ... USING INDEX",
+# "SEARCH ..." and virtual (FTS5) tables are not. CTEs and subqueries are
+# scanned by name too, and are skipped as they are not tables.
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?$')
+
+ADVISOR_INDEX = 'index_advisor_candidate'
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Request every page, run EXPLAIN QUERY PLAN on the queries they issue and '
+            'report full table scans with an index that removes them')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-rows', type=int, default=1000,
+                            help='Ignore scans of tables with fewer rows than this (default 1000)')
+        parser.add_argument('--only', help='Only request views whose label contains this text')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('index_advisor reads SQLite query plans; run it against a SQLite database.')
+
+        queries = self.capture(options['only'])
+        self.stdout.write(f'Captured {sum(len(labels) for labels in queries.values())} queries '
+                          f'({len(queries)} distinct).')
+
+        tables = set(connection.introspection.table_names())
+        row_counts = {}
+        findings = 0
+        for (sql, params), labels in queries.items():
+            for table, alias in self.full_scans(sql, params):
+                if table not in tables:
+                    continue
+                if table not in row_counts:
+                    with connection.cursor() as cursor:
+                        cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+                        row_counts[table] = cursor.fetchone()[0]
+                if row_counts[table] < options['min_rows']:
+                    continue
+                findings += 1
+                self.report(sql, params, table, alias or table, row_counts[table], labels)
+
+        if findings:
+            self.stdout.write(self.style.WARNING(f'{findings} full scans found.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('No full scans of large tables.'))
+
+    def capture(self, only):
+        """Run each scenario once and return ``{(sql, params): [labels]}`` of its SELECTs.
+
+        Everything runs in a transaction that is rolled back, against a
+        private cache, so scenarios that write leave no trace.
+        """
+        queries = defaultdict(list)
+        current = {}
+
+        def record(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith('SELECT') and not many:
+                queries[(sql, tuple(params or ()))].append(current['label'])
+            return execute(sql, params, many, context)
+
+        private_cache = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                     'LOCATION': 'index-advisor'}}
+        try:
+            with override_settings(CACHES=private_cache, DEBUG=False,
+                                   ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), \
+                    transaction.atomic():
+                client = Client()
+                client.force_login(User.objects.create_superuser('index_advisor'))
+                for label, setup, request in view_scenarios():
+                    # The async dashboard computes its charts on other
+                    # connections; the chart scenarios cover the same queries.
+                    if 'async' in label or (only and only not in label):
+                        continue
+                    value = setup()
+                    current['label'] = label
+                    with connection.execute_wrapper(record):
+                        request(client, value)
+                raise Rollback
+        except Rollback:
+            pass
+        return queries
+
+    def explain(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def full_scans(self, sql, params):
+        scans = []
+        for detail in self.explain(sql, params):
+            match = FULL_SCAN.match(detail)
+            if match:
+                scans.append((match.group(1), match.group(2)))
+        return scans
+
+    def candidate_columns(self, sql, table, alias):
+        """Columns of ``table`` the query filters on (equalities first) and sorts by."""
+        name = re.escape(connection.ops.quote_name(alias))
+        column = rf'{name}\.("?)(\w+)\1'
+        equal = re.findall(rf'{column} (?:= |IN \(|IS )', sql)
+        ranged = re.findall(rf'{column} (?:<|>|<=|>=|BETWEEN|LIKE) ', sql)
+        order_by = sql.rsplit(' ORDER BY ', 1)[1] if ' ORDER BY ' in sql else ''
+        ordered = re.findall(column, order_by)
+
+        columns = []
+        for _, col in equal + ranged[:1] + ordered:
+            if col not in columns:
+                columns.append(col)
+        return columns
+
+    def try_index(self, sql, params, table, columns):
+        """Whether an index on ``columns`` removes the scan of ``table``."""
+        quote = connection.ops.quote_name
+        removed = False
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(f'CREATE INDEX {ADVISOR_INDEX} ON {quote(table)} '
+                                   f'({", ".join(quote(col) for col in columns)})')
+                removed = table not in [scanned for scanned, _ in self.full_scans(sql, params)]
+                raise Rollback
+        except Rollback:
+            pass
+        return removed
+
+    def model_index(self, table, columns):
+        for model in apps.get_models():
+            if model._meta.db_table == table:
+                fields = {field.column: field.name for field in model._meta.concrete_fields}
+                names = ', '.join(repr(fields.get(col, col)) for col in columns)
+                return f'{model.__name__}: models.Index(fields=[{names}])'
+        return f'CREATE INDEX ON {table} ({", ".join(columns)})'
+
+    def report(self, sql, params, table, alias, rows, labels):
+        self.stdout.write('')
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Full scan of {table} ({rows} rows)'))
+        self.stdout.write(f'  views: {", ".join(sorted(set(labels)))}')
+        self.stdout.write(f'  query: {sql[:300]}{"..." if len(sql) > 300 else ""}')
+        columns = self.candidate_columns(sql, table, alias)
+        if columns and self.try_index(sql, params, table, columns):
+            self.stdout.write(self.style.SUCCESS(f'  add: {self.model_index(table, columns)}'))
+        elif columns:
+            self.stdout.write(f'  an index on ({", ".join(columns)}) would not be used; '
+                              'the filter cannot use an index (e.g. LIKE with a leading wildcard)')
+        else:
+            self.stdout.write('  the query reads the whole table; no index applies')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from studentorg.rollups import compare_rollups, rebuild_rollups
+
+class Command(BaseCommand):
+    help = 'Rebuild the dashboard rollup tables from scratch and check them against the live data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only compare the rollups with the live data, without rebuilding them')
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            rebuilt = rebuild_rollups()
+            for model, rows in rebuilt.items():
+                self.stdout.write(f'{model.__name__}: {len(rows)} rows')
+
+        mismatches = compare_rollups()
+        for model, key, stored, live in mismatches:
+            self.stderr.write(f'{model.__name__} {key}: stored {stored}, live {live}')
+        if mismatches:
+            raise CommandError(f'{len(mismatches)} rollup rows do not match the live data.')
+
+        self.stdout.write(self.style.SUCCESS('Rollups match the live data.'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from studentorg.dashboard import CHARTS, invalidate_charts
+from studentorg.rollups import COUNTERS, counter_drift, reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Recount the member and student counter columns that have drifted from the base tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report the drifted counters')
+
+    def handle(self, *args, **options):
+        drift = counter_drift()
+        for model, pk, stored, live in drift[:20]:
+            self.stdout.write(f'{model.__name__} {pk}: {COUNTERS[model][0]} is {stored}, should be {live}')
+        if len(drift) > 20:
+            self.stdout.write(f'... and {len(drift) - 20} more')
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('All counters match.'))
+            return
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{len(drift)} counters have drifted.'))
+            return
+
+        reconcile_counters(drift)
+        invalidate_charts(CHARTS)
+        self.stdout.write(self.style.SUCCESS(f'Repaired {len(drift)} counters.'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from studentorg.deletion import resume
+from studentorg.models import DeletionJob
+
+
+class Command(BaseCommand):
+    help = 'Run the cascade deletes that are pending or were interrupted (a restart, a crash)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--failed', action='store_true',
+                            help='Also retry the jobs that failed')
+
+    def handle(self, *args, **options):
+        jobs = resume(failed=options['failed'])
+        for job in jobs:
+            deleted = sum(job.deleted.values())
+            if job.status == DeletionJob.FAILED:
+                self.stdout.write(self.style.ERROR(f'{job}: failed after {deleted} rows: {job.error}'))
+            else:
+                self.stdout.write(f'{job}: {job.get_status_display().lower()}, {deleted} rows deleted')
+        if not jobs:
+            self.stdout.write(self.style.SUCCESS('No deletions waiting.'))
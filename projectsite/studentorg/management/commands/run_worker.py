@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from studentorg.jobs import Worker
+
+
+class Command(BaseCommand):
+    help = 'Run the queued background jobs (cascade deletes, imports, chart recomputes) until stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.JOBS_WORKER_CONCURRENCY,
+                            help=f'Jobs run at once (default {settings.JOBS_WORKER_CONCURRENCY})')
+        parser.add_argument('--pool', choices=['thread', 'process'], default=settings.JOBS_WORKER_POOL,
+                            help=f'Run jobs in threads or in processes (default {settings.JOBS_WORKER_POOL})')
+        parser.add_argument('--poll-interval', type=float, default=settings.JOBS_POLL_INTERVAL,
+                            help=f'Seconds between looks for new jobs when idle (default {settings.JOBS_POLL_INTERVAL})')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once no job is ready instead of waiting for more')
+
+    def handle(self, *args, **options):
+        worker = Worker(options['concurrency'], pool=options['pool'], poll_interval=options['poll_interval'],
+                        burst=options['burst'])
+        self.stdout.write(f"Worker {worker.name}: {options['concurrency']} at a time in a {options['pool']} pool")
+        worker.run()
+        self.stdout.write(self.style.SUCCESS(f'Stopped after {worker.completed} jobs.'))
@@ -0,0 +1,329 @@
+"""Request and SQL metrics in the Prometheus text format.
+
+``MetricsMiddleware`` records, per resolved URL name (``home``,
+``student-list``, ``orgmember-add``...; ``unresolved`` for 404s):
+
+* ``psusphere_http_requests_total`` by method and status;
+* ``psusphere_http_request_duration_seconds``, a latency histogram;
+* ``psusphere_db_queries_total`` and ``psusphere_db_query_duration_seconds_total``.
+
+Queries the dashboard runs in its chart threads count towards the request
+(``count_queries``), and a streamed response is measured until its last
+chunk has been sent.
+
+Each process adds to its own in-memory totals under a lock and writes them
+to ``<METRICS_DIRECTORY>/<pid>-<random>.json`` at most every
+``METRICS_FLUSH_INTERVAL`` seconds (and on exit), replacing the file
+atomically. ``/metrics`` sums the files of every process, so any worker
+can answer the scrape. On a scrape, the files of processes that have
+exited are folded into ``exited.json``, so the totals never go backwards
+and the directory does not grow with every restart; empty the directory
+before starting the server to begin from zero.
+"""
+import atexit
+import bisect
+import contextvars
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Other methods are counted as "other", so clients cannot add label values.
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+# Holds the totals of the processes that have exited.
+EXITED = 'exited.json'
+
+# Upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    # name: (type, help)
+    'psusphere_http_requests_total': ('counter', 'HTTP requests by view, method and status.'),
+    'psusphere_http_request_duration_seconds': ('histogram', 'HTTP request latency by view.'),
+    'psusphere_db_queries_total': ('counter', 'SQL statements run by requests, by view.'),
+    'psusphere_db_query_duration_seconds_total': ('counter', 'Time spent in SQL by requests, by view.'),
+}
+
+
+class MetricsStore:
+    """The counters and histograms of one process, flushed to its own file."""
+
+    def __init__(self, directory, flush_interval):
+        self.pid = os.getpid()
+        self.path = os.path.join(directory, f'{self.pid}-{uuid.uuid4().hex[:8]}.json')
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        # (name, labels) -> value; labels is a tuple of (label, value) pairs.
+        self.counters = {}
+        # (name, labels) -> [count per bucket..., count above the last bucket, sum]
+        self.histograms = {}
+        self.flushed = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+            histogram[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+            histogram[-1] += value
+
+    def maybe_flush(self):
+        if time.monotonic() - self.flushed >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            self.flushed = time.monotonic()
+            snapshot = _snapshot(self.counters, self.histograms)
+        _write(self.path, snapshot)
+
+
+def _snapshot(counters, histograms):
+    return {
+        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+        'histograms': [[name, labels, values] for (name, labels), values in histograms.items()],
+    }
+
+
+def _write(path, snapshot):
+    """Replace ``path`` with ``snapshot`` atomically."""
+    with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(path), suffix='.tmp', delete=False) as f:
+        json.dump(snapshot, f)
+    os.replace(f.name, path)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """This process's store, created on first use (and again after a fork)."""
+    global _store
+    if _store is None or _store.pid != os.getpid():
+        with _store_lock:
+            if _store is None or _store.pid != os.getpid():
+                _store = MetricsStore(str(settings.METRICS_DIRECTORY), settings.METRICS_FLUSH_INTERVAL)
+                atexit.register(_store.flush)
+    return _store
+
+
+def _add_files(paths, counters, histograms):
+    for path in paths:
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            # Removed while we were listing the directory.
+            continue
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            totals = histograms.setdefault(key, [0] * len(values))
+            for index, value in enumerate(values):
+                totals[index] += value
+
+
+@contextmanager
+def _locked(directory, operation):
+    """Hold the directory's lock; collecting shares it, pruning takes it alone."""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, '.lock'), 'a') as lock:
+        fcntl.flock(lock, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _exited(path):
+    """Whether the process that wrote ``path`` is gone."""
+    pid = os.path.basename(path).partition('-')[0]
+    if not pid.isdigit() or int(pid) == os.getpid():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def prune(directory):
+    """Fold the files of exited processes into ``EXITED``; returns how many were folded."""
+    # Probing a process with signal 0 only works on POSIX.
+    if fcntl is None:
+        return 0
+    with _locked(directory, fcntl.LOCK_EX):
+        exited = [path for path in glob.glob(os.path.join(directory, '*.json')) if _exited(path)]
+        if not exited:
+            return 0
+        archive = os.path.join(directory, EXITED)
+        counters, histograms = {}, {}
+        _add_files([archive, *exited], counters, histograms)
+        _write(archive, _snapshot(counters, histograms))
+        for path in exited:
+            os.remove(path)
+    return len(exited)
+
+
+def collect(directory):
+    """Sum the files of every process: ``(counters, histograms)`` keyed like ``MetricsStore``."""
+    counters, histograms = {}, {}
+    with _locked(directory, fcntl and fcntl.LOCK_SH):
+        _add_files(glob.glob(os.path.join(directory, '*.json')), counters, histograms)
+    return counters, histograms
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{label}="{_escape(value)}"' for label, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """Every process's metrics in the Prometheus text exposition format."""
+    get_store().flush()
+    prune(str(settings.METRICS_DIRECTORY))
+    counters, histograms = collect(str(settings.METRICS_DIRECTORY))
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        if kind == 'counter':
+            for (_, labels), value in sorted(item for item in counters.items() if item[0][0] == name):
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+            continue
+        for (_, labels), values in sorted(item for item in histograms.items() if item[0][0] == name):
+            cumulative = 0
+            for bound, count in zip((*LATENCY_BUCKETS, '+Inf'), values[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels((*labels, ("le", bound)))} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(values[-1])}')
+            lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+_counter = contextvars.ContextVar('studentorg_metrics_counter', default=None)
+
+
+class QueryCounter:
+    """Context manager that counts and times the statements run on this thread's connections.
+
+    Other threads working for the same request add theirs with ``count_queries``.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with self.lock:
+                self.count += 1
+                self.seconds += time.perf_counter() - started
+
+    def wrap(self):
+        """Count the statements of this thread's connections until the returned stack is closed."""
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+    def __enter__(self):
+        self._token = _counter.set(self)
+        self._stack = self.wrap()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+        _counter.reset(self._token)
+
+
+@contextmanager
+def count_queries():
+    """Count this thread's statements towards the request being measured, if any.
+
+    For threads a request hands work to, such as the dashboard's chart
+    pool: their connections are not the request thread's, and
+    ``sync_to_async`` carries the request's context over to them.
+    """
+    counter = _counter.get()
+    if counter is None:
+        yield
+        return
+    with counter.wrap():
+        yield
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with QueryCounter() as queries:
+            response = self.get_response(request)
+
+        def record():
+            match = getattr(request, 'resolver_match', None)
+            view = {'view': match.view_name if match else 'unresolved'}
+            method = request.method if request.method in METHODS else 'other'
+            store = get_store()
+            store.inc('psusphere_http_requests_total', {**view, 'method': method, 'status': str(response.status_code)})
+            store.observe('psusphere_http_request_duration_seconds', view, time.perf_counter() - started)
+            store.inc('psusphere_db_queries_total', view, queries.count)
+            store.inc('psusphere_db_query_duration_seconds_total', view, queries.seconds)
+            store.maybe_flush()
+
+        if response.streaming and not response.is_async:
+            # Streamed exports run their queries while the body is sent.
+            response.streaming_content = self.stream(response.streaming_content, queries, record)
+        else:
+            record()
+        return response
+
+    def stream(self, content, queries, record):
+        try:
+            with queries.wrap():
+                yield from content
+        finally:
+            record()
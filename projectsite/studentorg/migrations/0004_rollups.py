@@ -0,0 +1,119 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+
+def populate_rollups(apps, schema_editor):
+    College = apps.get_model('studentorg', 'College')
+    Program = apps.get_model('studentorg', 'Program')
+    Organization = apps.get_model('studentorg', 'Organization')
+    Student = apps.get_model('studentorg', 'Student')
+    OrgMember = apps.get_model('studentorg', 'OrgMember')
+    CollegeRollup = apps.get_model('studentorg', 'CollegeRollup')
+    ProgramRollup = apps.get_model('studentorg', 'ProgramRollup')
+    OrganizationRollup = apps.get_model('studentorg', 'OrganizationRollup')
+    OrganizationProgramRollup = apps.get_model('studentorg', 'OrganizationProgramRollup')
+    MonthlyRollup = apps.get_model('studentorg', 'MonthlyRollup')
+
+    per_program = dict(Student.objects.values('program').annotate(n=Count('id')).values_list('program', 'n'))
+    per_college = dict(Student.objects.values('program__college').annotate(n=Count('id'))
+                       .values_list('program__college', 'n'))
+    CollegeRollup.objects.bulk_create(
+        CollegeRollup(college_id=pk, student_count=per_college.get(pk, 0))
+        for pk in College.objects.values_list('id', flat=True)
+    )
+    ProgramRollup.objects.bulk_create(
+        ProgramRollup(program_id=pk, student_count=per_program.get(pk, 0))
+        for pk in Program.objects.values_list('id', flat=True)
+    )
+
+    per_org = {pk: [0, 0] for pk in Organization.objects.values_list('id', flat=True)}
+    per_org_program = {}
+    members_per_month = {}
+    joined = OrgMember.objects.values('organization', 'student__program', 'date_joined').annotate(n=Count('id'))
+    for item in joined:
+        stats = per_org[item['organization']]
+        stats[0] += item['n']
+        stats[1] += item['date_joined'].toordinal() * item['n']
+        key = (item['organization'], item['student__program'])
+        per_org_program[key] = per_org_program.get(key, 0) + item['n']
+        month = item['date_joined'].replace(day=1)
+        members_per_month[month] = members_per_month.get(month, 0) + item['n']
+    OrganizationRollup.objects.bulk_create(
+        OrganizationRollup(organization_id=pk, member_count=count, date_joined_total=total)
+        for pk, (count, total) in per_org.items()
+    )
+    OrganizationProgramRollup.objects.bulk_create(
+        OrganizationProgramRollup(organization_id=org, program_id=program, member_count=count)
+        for (org, program), count in per_org_program.items()
+    )
+
+    students_per_month = dict(
+        Student.objects.annotate(month=TruncMonth('created_at', tzinfo=timezone.get_current_timezone()))
+                       .values('month').annotate(n=Count('id')).values_list('month', 'n')
+    )
+    months = {month.date() for month in students_per_month} | set(members_per_month)
+    students_per_month = {month.date(): n for month, n in students_per_month.items()}
+    MonthlyRollup.objects.bulk_create(
+        MonthlyRollup(month=month, new_members=members_per_month.get(month, 0),
+                      new_students=students_per_month.get(month, 0))
+        for month in sorted(months)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studentorg', '0003_boat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollegeRollup',
+            fields=[
+                ('college', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rollup', serialize=False, to='studentorg.college')),
+                ('student_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True)),
+                ('new_members', models.IntegerField(default=0)),
+                ('new_students', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OrganizationRollup',
+            fields=[
+                ('organization', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rollup', serialize=False, to='studentorg.organization')),
+                ('member_count', models.IntegerField(default=0)),
+                ('date_joined_total', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProgramRollup',
+            fields=[
+                ('program', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rollup', serialize=False, to='studentorg.program')),
+                ('student_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OrganizationProgramRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('member_count', models.IntegerField(default=0)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='studentorg.organization')),
+                ('program', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='studentorg.program')),
+            ],
+            options={
+                'unique_together': {('organization', 'program')},
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studentorg', '0004_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['student_id'], name='student_student_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['program', 'created_at'], name='student_program_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orgmember',
+            index=models.Index(fields=['organization', 'date_joined'], name='orgmember_org_joined_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orgmember',
+            index=models.Index(fields=['date_joined'], name='orgmember_date_joined_idx'),
+        ),
+    ]
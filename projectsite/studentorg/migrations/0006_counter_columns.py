@@ -0,0 +1,84 @@
+# Generated by Django 5.1.2 on 2026-10-18 19:30
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, group_by):
+    return Coalesce(Subquery(
+        queryset.filter(**{group_by: OuterRef('pk')}).order_by().values(group_by)
+                .annotate(count=Count('id')).values('count')
+    ), 0)
+
+
+def populate_counters(apps, schema_editor):
+    College = apps.get_model('studentorg', 'College')
+    Program = apps.get_model('studentorg', 'Program')
+    Organization = apps.get_model('studentorg', 'Organization')
+    Student = apps.get_model('studentorg', 'Student')
+    OrgMember = apps.get_model('studentorg', 'OrgMember')
+
+    College.objects.update(student_count=_count(Student.objects.all(), 'program__college'))
+    Program.objects.update(student_count=_count(Student.objects.all(), 'program'))
+    Organization.objects.update(member_count=_count(OrgMember.objects.all(), 'organization'))
+
+
+def populate_rollups(apps, schema_editor):
+    College = apps.get_model('studentorg', 'College')
+    Program = apps.get_model('studentorg', 'Program')
+    Organization = apps.get_model('studentorg', 'Organization')
+    CollegeRollup = apps.get_model('studentorg', 'CollegeRollup')
+    ProgramRollup = apps.get_model('studentorg', 'ProgramRollup')
+    OrganizationRollup = apps.get_model('studentorg', 'OrganizationRollup')
+
+    CollegeRollup.objects.bulk_create(
+        CollegeRollup(college_id=pk, student_count=count)
+        for pk, count in College.objects.values_list('id', 'student_count')
+    )
+    ProgramRollup.objects.bulk_create(
+        ProgramRollup(program_id=pk, student_count=count)
+        for pk, count in Program.objects.values_list('id', 'student_count')
+    )
+    for pk, count in Organization.objects.values_list('id', 'member_count'):
+        OrganizationRollup.objects.filter(organization_id=pk).update(member_count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studentorg', '0005_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='college',
+            name='student_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='program',
+            name='student_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='member_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='organization',
+            index=models.Index(fields=['member_count', 'id'], name='organization_members_idx'),
+        ),
+        migrations.RunPython(populate_counters, populate_rollups),
+        migrations.RemoveField(
+            model_name='organizationrollup',
+            name='member_count',
+        ),
+        migrations.DeleteModel(
+            name='CollegeRollup',
+        ),
+        migrations.DeleteModel(
+            name='ProgramRollup',
+        ),
+    ]
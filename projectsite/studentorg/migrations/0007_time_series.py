@@ -0,0 +1,95 @@
+# Generated by Django 5.1.2 on 2026-10-18 21:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def _buckets(day):
+    return [('day', day), ('month', day.replace(day=1))]
+
+
+def populate_series(apps, schema_editor):
+    Student = apps.get_model('studentorg', 'Student')
+    OrgMember = apps.get_model('studentorg', 'OrgMember')
+    MembershipSeries = apps.get_model('studentorg', 'MembershipSeries')
+    StudentSeries = apps.get_model('studentorg', 'StudentSeries')
+
+    members = {}
+    joined = OrgMember.objects.values('organization', 'student__program', 'date_joined')\
+                              .annotate(n=Count('id')).order_by()
+    for item in joined:
+        for period, start in _buckets(item['date_joined']):
+            key = (period, start, item['organization'], item['student__program'])
+            members[key] = members.get(key, 0) + item['n']
+    MembershipSeries.objects.bulk_create((
+        MembershipSeries(period=period, start=start, organization_id=org, program_id=program, count=count)
+        for (period, start, org, program), count in members.items()
+    ), batch_size=1000)
+
+    students = {}
+    created = Student.objects.annotate(day=TruncDate('created_at'))\
+                             .values('program', 'day').annotate(n=Count('id')).order_by()
+    for item in created:
+        for period, start in _buckets(item['day']):
+            key = (period, start, item['program'])
+            students[key] = students.get(key, 0) + item['n']
+    StudentSeries.objects.bulk_create((
+        StudentSeries(period=period, start=start, program_id=program, count=count)
+        for (period, start, program), count in students.items()
+    ), batch_size=1000)
+
+
+def populate_monthly_rollups(apps, schema_editor):
+    MembershipSeries = apps.get_model('studentorg', 'MembershipSeries')
+    StudentSeries = apps.get_model('studentorg', 'StudentSeries')
+    MonthlyRollup = apps.get_model('studentorg', 'MonthlyRollup')
+
+    months = {}
+    for model, field in ((MembershipSeries, 'new_members'), (StudentSeries, 'new_students')):
+        totals = model.objects.filter(period='month').values('start').annotate(n=Sum('count')).order_by()
+        for item in totals:
+            months.setdefault(item['start'], {'new_members': 0, 'new_students': 0})[field] = item['n']
+    MonthlyRollup.objects.bulk_create(MonthlyRollup(month=month, **counts) for month, counts in sorted(months.items()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studentorg', '0006_counter_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MembershipSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('month', 'Month')], max_length=5)),
+                ('start', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='studentorg.organization')),
+                ('program', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='studentorg.program')),
+            ],
+            options={
+                'unique_together': {('period', 'start', 'organization', 'program')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StudentSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('month', 'Month')], max_length=5)),
+                ('start', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('program', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='studentorg.program')),
+            ],
+            options={
+                'unique_together': {('period', 'start', 'program')},
+            },
+        ),
+        migrations.RunPython(populate_series, populate_monthly_rollups),
+        migrations.DeleteModel(
+            name='MonthlyRollup',
+        ),
+    ]
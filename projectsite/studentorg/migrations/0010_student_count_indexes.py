@@ -0,0 +1,21 @@
+# Generated by Django 5.1.2 on 2026-10-18 16:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studentorg', '0009_job'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='college',
+            index=models.Index(fields=['student_count', 'id'], name='college_students_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='program',
+            index=models.Index(fields=['student_count', 'id'], name='program_students_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.2 on 2026-10-18 16:32
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studentorg', '0010_student_count_indexes'),
+    ]
+
+    # Neither auto_now_add nor a callable default exists in the database, so
+    # only the migration state changes; AlterField would rebuild every table
+    # on SQLite for nothing.
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='college',
+                    name='created_at',
+                    field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+                ),
+                migrations.AlterField(
+                    model_name='deletionjob',
+                    name='created_at',
+                    field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+                ),
+                migrations.AlterField(
+                    model_name='job',
+                    name='created_at',
+                    field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+                ),
+                migrations.AlterField(
+                    model_name='organization',
+                    name='created_at',
+                    field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+                ),
+                migrations.AlterField(
+                    model_name='orgmember',
+                    name='created_at',
+                    field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+                ),
+                migrations.AlterField(
+                    model_name='program',
+                    name='created_at',
+                    field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+                ),
+                migrations.AlterField(
+                    model_name='student',
+                    name='created_at',
+                    field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:02
+
+import django.db.models.deletion
+import studentorg.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studentorg', '0011_created_at_default'),
+    ]
+
+    # The FTS5 tables exist only where SQLite has FTS5, and
+    # install_search_index creates them after every migrate.
+    operations = [
+        migrations.CreateModel(
+            name='OrganizationSearchIndex',
+            fields=[
+                ('rank', models.FloatField()),
+                ('organization', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='studentorg.organization')),
+                ('document', studentorg.models.SearchField(db_column='studentorg_organization_fts')),
+            ],
+            options={
+                'db_table': 'studentorg_organization_fts',
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='OrgMemberSearchIndex',
+            fields=[
+                ('rank', models.FloatField()),
+                ('orgmember', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='studentorg.orgmember')),
+                ('document', studentorg.models.SearchField(db_column='studentorg_orgmember_fts')),
+            ],
+            options={
+                'db_table': 'studentorg_orgmember_fts',
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='StudentSearchIndex',
+            fields=[
+                ('rank', models.FloatField()),
+                ('student', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='studentorg.student')),
+                ('document', studentorg.models.SearchField(db_column='studentorg_student_fts')),
+            ],
+            options={
+                'db_table': 'studentorg_student_fts',
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+    ]
@@ -1,36 +1,82 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 class BaseModel(models.Model):
     """Abstract base model with created and updated timestamps."""
-    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # A default rather than auto_now_add, so bulk loads can store their own.
+    created_at = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         abstract = True
 
 
-class College(BaseModel):
+class CounterFieldsMixin:
+    """Keep ``save()`` from writing back stale counters.
+
+    Counter columns are adjusted in the database with F() expressions by
+    ``studentorg.rollups``, so the copy loaded with an instance may be out
+    of date by the time it is saved.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.counter_fields]
+        super().save(*args, **kwargs)
+
+
+class College(CounterFieldsMixin, BaseModel):
     """Model representing a college."""
     college_name = models.CharField(max_length=150)
+    student_count = models.IntegerField(default=0, editable=False)
+
+    counter_fields = ('student_count',)
+
+    class Meta:
+        indexes = [
+            # The college list sorted by size.
+            models.Index(fields=['student_count', 'id'], name='college_students_idx'),
+        ]
 
     def __str__(self):
         return self.college_name
 
 
-class Program(BaseModel):
+class Program(CounterFieldsMixin, BaseModel):
     """Model representing a program."""
     prog_name = models.CharField(max_length=150)
     college = models.ForeignKey(College, on_delete=models.CASCADE)
+    student_count = models.IntegerField(default=0, editable=False)
+
+    counter_fields = ('student_count',)
+
+    class Meta:
+        indexes = [
+            # The program list sorted by size.
+            models.Index(fields=['student_count', 'id'], name='program_students_idx'),
+        ]
 
     def __str__(self):
         return self.prog_name
 
 
-class Organization(BaseModel):
+class Organization(CounterFieldsMixin, BaseModel):
     """Model representing an organization."""
     name = models.CharField(max_length=250)
     college = models.ForeignKey(College, null=True, blank=True, on_delete=models.CASCADE)
     description = models.CharField(max_length=500)
+    member_count = models.IntegerField(default=0, editable=False)
+
+    counter_fields = ('member_count',)
+
+    class Meta:
+        indexes = [
+            # The organization list sorted by size.
+            models.Index(fields=['member_count', 'id'], name='organization_members_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -44,6 +90,13 @@ class Student(BaseModel):
     middlename = models.CharField(max_length=25, blank=True, null=True)
     program = models.ForeignKey(Program, on_delete=models.CASCADE ,default=1)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['student_id'], name='student_student_id_idx'),
+            # Students of a program, in list order.
+            models.Index(fields=['program', 'created_at'], name='student_program_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.lastname}, {self.firstname}"
 
@@ -54,10 +107,204 @@ class OrgMember(BaseModel):
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
     date_joined = models.DateField()
 
+    class Meta:
+        indexes = [
+            # Members of an organization who joined in a date range.
+            models.Index(fields=['organization', 'date_joined'], name='orgmember_org_joined_idx'),
+            # Memberships by join date across all organizations.
+            models.Index(fields=['date_joined'], name='orgmember_date_joined_idx'),
+        ]
+
     def __str__(self):
         return f"{self.student.firstname}, {self.student.lastname} - {self.organization.name}"
 
 
+class SearchField(models.TextField):
+    """The hidden column an FTS5 table names after itself; it is only used with ``match``."""
+
+
+@SearchField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+class SearchIndex(models.Model):
+    """A row of one of the FTS5 indexes of ``studentorg.search``.
+
+    The tables and the triggers that fill them are created by
+    ``install_search_index``, not by migrations; the models only let
+    searches join an index and read its ``rank``.
+    """
+    rank = models.FloatField()
+
+    class Meta:
+        abstract = True
+        managed = False
+
+
+class StudentSearchIndex(SearchIndex):
+    student = models.OneToOneField(Student, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid',
+                                   related_name='search_index')
+    document = SearchField(db_column='studentorg_student_fts')
+
+    class Meta(SearchIndex.Meta):
+        db_table = 'studentorg_student_fts'
+
+
+class OrganizationSearchIndex(SearchIndex):
+    organization = models.OneToOneField(Organization, on_delete=models.DO_NOTHING, primary_key=True,
+                                        db_column='rowid', related_name='search_index')
+    document = SearchField(db_column='studentorg_organization_fts')
+
+    class Meta(SearchIndex.Meta):
+        db_table = 'studentorg_organization_fts'
+
+
+class OrgMemberSearchIndex(SearchIndex):
+    orgmember = models.OneToOneField(OrgMember, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid',
+                                     related_name='search_index')
+    document = SearchField(db_column='studentorg_orgmember_fts')
+
+    class Meta(SearchIndex.Meta):
+        db_table = 'studentorg_orgmember_fts'
+
+
+class OrganizationRollup(models.Model):
+    """Sum of an organization's members' join dates as ordinals, kept current by signals."""
+    organization = models.OneToOneField(Organization, on_delete=models.CASCADE, primary_key=True, related_name='rollup')
+    date_joined_total = models.BigIntegerField(default=0)
+
+
+class OrganizationProgramRollup(models.Model):
+    """Number of members of an organization enrolled in a given program."""
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
+    program = models.ForeignKey(Program, on_delete=models.CASCADE)
+    member_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('organization', 'program')
+
+
+class SeriesBucket(models.Model):
+    """The number of rows added during one day or one month."""
+    DAY = 'day'
+    MONTH = 'month'
+    PERIODS = [(DAY, 'Day'), (MONTH, 'Month')]
+
+    period = models.CharField(max_length=5, choices=PERIODS)
+    start = models.DateField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class MembershipSeries(SeriesBucket):
+    """New memberships by date joined, per organization and member's program."""
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
+    program = models.ForeignKey(Program, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ('period', 'start', 'organization', 'program')
+
+
+class StudentSeries(SeriesBucket):
+    """New students by creation date, per program."""
+    program = models.ForeignKey(Program, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ('period', 'start', 'program')
+
+
+class DeletionJob(BaseModel):
+    """A cascade delete run in batches by ``studentorg.deletion``.
+
+    ``updated_at`` moves with every batch, so a running job that has not
+    saved for a while was abandoned and can be picked up again.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+    UNFINISHED = (PENDING, RUNNING, FAILED)
+
+    model_label = models.CharField(max_length=100)
+    object_id = models.BigIntegerField()
+    object_repr = models.CharField(max_length=250)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    # Rows per model label: counted when the job was created, and deleted so far.
+    total = models.JSONField(default=dict)
+    deleted = models.JSONField(default=dict)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # One job at a time per object.
+            models.UniqueConstraint(fields=['model_label', 'object_id'], name='deletionjob_unfinished_uniq',
+                                    condition=models.Q(status__in=['pending', 'running', 'failed'])),
+        ]
+
+    def __str__(self):
+        return f"Deletion of {self.object_repr}"
+
+    @property
+    def finished(self):
+        return self.status == self.DONE
+
+    @property
+    def percent(self):
+        if self.finished:
+            # Rows someone else deleted meanwhile were never counted.
+            return 100
+        total = sum(self.total.values())
+        return min(100, round(100 * sum(self.deleted.values()) / total)) if total else 100
+
+
+class Job(BaseModel):
+    """A task waiting for, or run by, ``manage.py run_worker`` (see ``studentorg.jobs``).
+
+    A claimed job is hidden from other workers until ``locked_until``; if
+    its worker has neither finished it nor extended the lease by then, it
+    is run again.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    task = models.CharField(max_length=200)
+    kwargs = models.JSONField(default=dict)
+    priority = models.SmallIntegerField(default=0)  # Higher runs first
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    timeout = models.PositiveIntegerField(default=300)  # Seconds a claim lasts without a heartbeat
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The next jobs to run.
+            models.Index(fields=['status', '-priority', 'run_after'], name='job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk}"
+
+
 class Boat(models.Model):
     boat_name = models.CharField(max_length=150)
     length = models.DecimalField(max_digits=10, decimal_places=2)
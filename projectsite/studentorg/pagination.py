@@ -0,0 +1,182 @@
+"""Keyset (cursor) pagination for list views.
+
+Pages are fetched with ``WHERE (created_at, id) > (last row)`` on the
+indexed ordering instead of ``OFFSET``, so deep pages cost the same as the
+first one and no ``COUNT(*)`` is needed.
+"""
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from django.http import Http404
+
+
+def encode_cursor(values, direction):
+    raw = json.dumps([direction, values], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, values = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        raise Http404('Invalid page cursor.')
+    if direction not in ('next', 'prev') or not isinstance(values, list):
+        raise Http404('Invalid page cursor.')
+    return direction, values
+
+
+class KeysetPage:
+    """The slice of a list shown on one page, with links to its neighbours.
+
+    Exposes the same ``has_next``/``has_previous``/``has_other_pages`` API as
+    Django's ``Page``, but no page numbers or totals.
+    """
+    is_keyset = True
+
+    def __init__(self, object_list, has_next, has_previous, next_cursor, previous_cursor, params):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self._params = params
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def _query(self, **params):
+        query = self._params.copy()
+        for key in ('cursor', 'last', 'page'):
+            query.pop(key, None)
+        for key, value in params.items():
+            query[key] = value
+        return query.urlencode()
+
+    @property
+    def first_query(self):
+        return self._query()
+
+    @property
+    def last_query(self):
+        return self._query(last='1')
+
+    @property
+    def next_query(self):
+        return self._query(cursor=self.next_cursor)
+
+    @property
+    def previous_query(self):
+        return self._query(cursor=self.previous_cursor)
+
+
+class KeysetPaginationMixin:
+    """Replace ListView's OFFSET pagination with keyset pagination.
+
+    The page size comes from ``paginate_by`` and can be overridden with the
+    ``page_size`` query parameter, up to ``max_page_size``. The ``sort``
+    query parameter picks another ordering from ``sort_options``; each
+    should end with a unique field and be backed by an index. Ranked search
+    results (``studentorg.search.search(..., ranked=True)``) are listed
+    best match first unless another ordering is picked.
+    """
+    keyset_ordering = ('created_at', 'id')
+    ranked_ordering = ('search_rank', 'id')
+    sort_options = {}
+    page_size_kwarg = 'page_size'
+    sort_kwarg = 'sort'
+    max_page_size = 100
+
+    def get_paginate_by(self, queryset):
+        page_size = self.request.GET.get(self.page_size_kwarg)
+        if page_size and page_size.isdigit() and int(page_size) > 0:
+            return min(int(page_size), self.max_page_size)
+        return self.paginate_by
+
+    def get_keyset_ordering(self, queryset):
+        sort = self.request.GET.get(self.sort_kwarg)
+        if sort in self.sort_options:
+            return self.sort_options[sort]
+        if 'search_rank' in queryset.query.annotations:
+            return self.ranked_ordering
+        return self.keyset_ordering
+
+    def _keyset_filter(self, ordering, values, forward):
+        """Rows strictly after (or before) ``values`` in ``ordering``."""
+        condition = Q()
+        for position, field in enumerate(ordering):
+            name = field.lstrip('-')
+            ascending = not field.startswith('-')
+            lookup = 'gt' if ascending == forward else 'lt'
+            step = Q(**{f'{name}__{lookup}': values[position]})
+            for previous, value in zip(ordering[:position], values):
+                step &= Q(**{previous.lstrip('-'): value})
+            condition |= step
+        return condition
+
+    def _cursor_values(self, obj, ordering):
+        values = []
+        for field in ordering:
+            value = getattr(obj, field.lstrip('-'))
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return values
+
+    def _parse_values(self, queryset, ordering, values):
+        if len(values) != len(ordering):
+            raise Http404('Invalid page cursor.')
+        annotations = queryset.query.annotations
+        try:
+            return [
+                (annotations[name].output_field if name in annotations else queryset.model._meta.get_field(name))
+                .to_python(value)
+                for name, value in zip((field.lstrip('-') for field in ordering), values)
+            ]
+        except Exception:
+            raise Http404('Invalid page cursor.')
+
+    def paginate_queryset(self, queryset, page_size):
+        ordering = list(self.get_keyset_ordering(queryset))
+        reversed_ordering = [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+        params = self.request.GET
+        cursor = params.get('cursor')
+
+        if cursor:
+            direction, values = decode_cursor(cursor)
+            values = self._parse_values(queryset, ordering, values)
+            forward = direction == 'next'
+            queryset = queryset.filter(self._keyset_filter(ordering, values, forward))
+        else:
+            forward = not params.get('last')
+
+        rows = list(queryset.order_by(*(ordering if forward else reversed_ordering))[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if not forward:
+            rows.reverse()
+
+        if forward:
+            has_next, has_previous = has_more, bool(cursor)
+        else:
+            has_next, has_previous = bool(cursor), has_more
+
+        next_cursor = previous_cursor = None
+        if rows:
+            next_cursor = encode_cursor(self._cursor_values(rows[-1], ordering), 'next')
+            previous_cursor = encode_cursor(self._cursor_values(rows[0], ordering), 'prev')
+
+        page = KeysetPage(rows, has_next, has_previous, next_cursor, previous_cursor, params)
+        return (None, page, rows, page.has_other_pages())
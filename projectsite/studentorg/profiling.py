@@ -0,0 +1,212 @@
+"""Opt-in profiling of single requests.
+
+With ``PROFILER_ENABLED`` on (``PROFILER_ENABLED=1`` in the environment),
+a staff user asks for a profile with the ``X-Profile: 1`` header or the
+``?_profile=1`` query parameter. ``ProfilerMiddleware`` then runs the
+rest of the request under cProfile, times every SQL statement, and writes
+three files to ``PROFILER_DIRECTORY``, named by the ``X-Profile-Id``
+response header:
+
+* ``<id>.json``, a summary: total, SQL and template time, the statements
+  with their durations, repeated query shapes, and the slowest functions;
+* ``<id>.folded``, collapsed stacks for flamegraph.pl or speedscope,
+  sampled every ``PROFILER_SAMPLE_INTERVAL`` seconds;
+* ``<id>.prof``, the raw cProfile data for pstats or snakeviz.
+
+Other requests only pay for one header lookup, and with
+``PROFILER_ENABLED`` off the middleware is not installed at all. Work
+done in other threads (the async dashboard's charts) and the body of
+streaming responses fall outside the profile.
+"""
+import cProfile
+import json
+import os
+import pstats
+import re
+import sys
+import sysconfig
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+from django.utils import timezone
+
+from studentorg.querybudget import fingerprint
+
+_TEMPLATE_RENDER = (Template.render.__code__.co_filename, Template.render.__code__.co_firstlineno,
+                    Template.render.__code__.co_name)
+
+_PATH_PREFIXES = sorted({sysconfig.get_paths()['purelib'], sysconfig.get_paths()['stdlib'],
+                         str(settings.BASE_DIR)}, key=len, reverse=True)
+
+TOP_FUNCTIONS = 25
+
+
+class SQLTimer:
+    """Context manager that times every statement run on any connection."""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.statements.append({
+                'sql': sql,
+                'ms': round((time.perf_counter() - started) * 1000, 3),
+                'many': many,
+                'connection': context['connection'].alias,
+            })
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+
+def _label(func):
+    """``path/to/module.py:line(function)`` with the install prefixes removed."""
+    filename, lineno, name = func
+    for prefix in _PATH_PREFIXES:
+        if filename.startswith(prefix):
+            filename = filename[len(prefix):].lstrip(os.sep)
+            break
+    label = f'{filename}:{lineno}({name})' if lineno else name
+    # ';' separates frames in the collapsed format.
+    return label.replace(';', ':')
+
+
+class StackSampler(threading.Thread):
+    """Samples the stack of one thread every ``interval`` seconds.
+
+    ``stacks`` counts the collapsed stacks (``a;b;c``) seen, from the
+    ``root`` code object down; frames above it are left out.
+    """
+
+    def __init__(self, thread_id, interval, root):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.root = root
+        self.stacks = Counter()
+        self.finished = threading.Event()
+
+    def run(self):
+        while not self.finished.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and frame.f_code is not self.root:
+                code = frame.f_code
+                stack.append(_label((code.co_filename, code.co_firstlineno, code.co_name)))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def __enter__(self):
+        # Other threads only get the GIL every switch interval (5 ms by
+        # default), which would cap the sampling rate.
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._switch_interval, self.interval / 2))
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.finished.set()
+        self.join()
+        sys.setswitchinterval(self._switch_interval)
+
+
+def summarize(request, response, elapsed, stats, statements, samples):
+    sql_ms = sum(statement['ms'] for statement in statements)
+    template = stats.get(_TEMPLATE_RENDER)
+    shapes = Counter(fingerprint(statement['sql']) for statement in statements)
+
+    def top(column):
+        ordered = sorted(stats.items(), key=lambda item: item[1][column], reverse=True)[:TOP_FUNCTIONS]
+        return [{'function': _label(func), 'calls': calls, 'self_ms': round(self_time * 1000, 3),
+                 'cumulative_ms': round(total_time * 1000, 3)}
+                for func, (_, calls, self_time, total_time, _) in ordered]
+
+    return {
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'user': request.user.get_username(),
+        'started': timezone.now().isoformat(),
+        'total_ms': round(elapsed * 1000, 3),
+        'sql_ms': round(sql_ms, 3),
+        # Inclusive: includes the SQL that lazy querysets run while rendering.
+        'template_ms': round(template[3] * 1000, 3) if template else 0,
+        'sql': {
+            'count': len(statements),
+            'repeated_shapes': [{'sql': shape, 'count': count}
+                                for shape, count in shapes.most_common() if count > 1],
+            'statements': statements,
+        },
+        'flamegraph': {'samples': sum(samples.values()), 'interval_ms': settings.PROFILER_SAMPLE_INTERVAL * 1000},
+        'functions_by_cumulative_time': top(3),
+        'functions_by_self_time': top(2),
+    }
+
+
+class ProfilerMiddleware:
+    """Profile the request when a staff user asks for it (see the module docstring)."""
+
+    def __init__(self, get_response):
+        if not settings.PROFILER_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.header = 'HTTP_' + settings.PROFILER_HEADER.upper().replace('-', '_')
+
+    def __call__(self, request):
+        if not (request.META.get(self.header) or request.GET.get(settings.PROFILER_QUERY_PARAM)):
+            return self.get_response(request)
+        if not (request.user.is_active and request.user.is_staff):
+            return self.get_response(request)
+        return self.profile(request)
+
+    def profile(self, request):
+        profiler = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident(), settings.PROFILER_SAMPLE_INTERVAL,
+                               root=ProfilerMiddleware.profile.__code__)
+        with SQLTimer() as timer, sampler:
+            started = time.perf_counter()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is already running in this thread.
+                return self.get_response(request)
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            elapsed = time.perf_counter() - started
+
+        stats = pstats.Stats(profiler).stats
+        profile_id = self.profile_id(request)
+        directory = str(settings.PROFILER_DIRECTORY)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, profile_id)
+        with open(f'{path}.json', 'w') as f:
+            json.dump(summarize(request, response, elapsed, stats, timer.statements, sampler.stacks), f, indent=2)
+        with open(f'{path}.folded', 'w') as f:
+            f.writelines(f'{stack} {count}\n' for stack, count in sampler.stacks.items())
+        profiler.dump_stats(f'{path}.prof')
+        response['X-Profile-Id'] = profile_id
+        return response
+
+    def profile_id(self, request):
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', request.path).strip('-')[:60] or 'root'
+        return f"{timezone.now():%Y%m%dT%H%M%S}-{request.method.lower()}-{slug}-{uuid.uuid4().hex[:6]}"
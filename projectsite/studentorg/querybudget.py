@@ -0,0 +1,148 @@
+"""Per-request query budgets and N+1 detection.
+
+``QueryBudgetMiddleware`` records every SQL statement a request runs and
+reports two problems:
+
+* the same query shape running ``QUERY_INSPECTOR_REPEAT_THRESHOLD`` or more
+  times, the signature of an N+1 loop;
+* more queries than the view's ``query_budget`` class attribute allows.
+
+Each report names the code that issued the query: the first frame outside
+Django, installed packages and execute wrappers, or the template tag being
+rendered. Transaction control (``BEGIN``, savepoints, ``COMMIT``) is not
+counted. Reports are logged as warnings, or raised as
+``QueryBudgetExceeded`` when ``QUERY_INSPECTOR_RAISE`` is set. Tests can
+use the ``query_budget`` context manager for the same checks.
+"""
+import logging
+import os
+import re
+import sys
+import sysconfig
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+import django
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Node
+
+logger = logging.getLogger(__name__)
+
+_IGNORED_PATHS = tuple({
+    os.path.dirname(django.__file__),
+    sysconfig.get_paths()['purelib'],
+    sysconfig.get_paths()['stdlib'],
+    __file__,
+})
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_TRANSACTION_CONTROL = re.compile(r'\s*(BEGIN|COMMIT|END|ROLLBACK|SAVEPOINT|RELEASE)\b', re.IGNORECASE)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def fingerprint(sql):
+    """The shape of a statement: its SQL with IN lists of any length folded."""
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+# The arguments Django calls execute wrappers with.
+_WRAPPER_ARGUMENTS = ('execute', 'sql', 'params', 'many', 'context')
+
+
+def _is_execute_wrapper(code):
+    return code.co_varnames[code.co_argcount - len(_WRAPPER_ARGUMENTS):code.co_argcount] == _WRAPPER_ARGUMENTS
+
+
+def _origin():
+    frame = sys._getframe(2)
+    while frame is not None:
+        # type() rather than isinstance(), which would evaluate lazy objects.
+        node = frame.f_locals.get('self')
+        if issubclass(type(node), Node) and getattr(node, 'token', None) and node.origin:
+            return f'{node.origin.template_name}, line {node.token.lineno}: {node.token.contents}'
+        filename = frame.f_code.co_filename
+        # Other execute wrappers (metrics, profiling) sit between Django and the caller.
+        if not filename.startswith(_IGNORED_PATHS) and not _is_execute_wrapper(frame.f_code):
+            return f'{filename}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return 'unknown'
+
+
+class QueryInspector:
+    """Context manager that records the shape and origin of every query."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not _TRANSACTION_CONTROL.match(sql):
+            self.queries.append((fingerprint(sql), _origin()))
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def problems(self, budget=None, repeat_threshold=None):
+        if repeat_threshold is None:
+            repeat_threshold = settings.QUERY_INSPECTOR_REPEAT_THRESHOLD
+        found = []
+        counts = Counter(shape for shape, _ in self.queries)
+        for shape, count in counts.items():
+            if count >= repeat_threshold:
+                origin = next(origin for query, origin in self.queries if query == shape)
+                found.append(f'Possible N+1: {count} queries shaped like "{shape}" from {origin}')
+        if budget is not None and len(self.queries) > budget:
+            found.append(f'{len(self.queries)} queries, over the budget of {budget}')
+        return found
+
+
+def report(problems, label):
+    if not problems:
+        return
+    if settings.QUERY_INSPECTOR_RAISE:
+        raise QueryBudgetExceeded(f'{label}: ' + '; '.join(problems))
+    for problem in problems:
+        logger.warning('%s: %s', label, problem)
+
+
+@contextmanager
+def query_budget(budget=None, repeat_threshold=None):
+    """Fail the block if it repeats a query shape or runs over ``budget`` queries.
+
+        with query_budget(8):
+            self.client.get(reverse('orgmember-list'))
+    """
+    with QueryInspector() as inspector:
+        yield inspector
+    problems = inspector.problems(budget, repeat_threshold)
+    if problems:
+        raise QueryBudgetExceeded('; '.join(problems))
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        if not settings.QUERY_INSPECTOR_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryInspector() as inspector:
+            response = self.get_response(request)
+        report(inspector.problems(getattr(request, 'query_budget', None)),
+               f'{request.method} {request.path}')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'view_class', view_func)
+        request.query_budget = getattr(view, 'query_budget', None)
@@ -0,0 +1,351 @@
+"""Counter columns and dashboard rollup tables.
+
+The counters (``College.student_count``, ``Program.student_count`` and
+``Organization.member_count``), the rollup tables and the time series read
+by ``studentorg.timeseries`` hold the counts the dashboard and the list
+views need. Every write adjusts them through ``Deltas``: the signal
+handlers in ``studentorg.signals`` for single rows, and the set-based
+writes in ``studentorg.bulk`` for whole querysets. Drift in the
+counters is repaired with ``manage.py reconcile_counters``, and everything
+can be rebuilt from the base tables with ``manage.py rebuild_rollups``.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, TruncDate
+
+from studentorg.models import (
+    College, MembershipSeries, Organization, OrganizationProgramRollup,
+    OrganizationRollup, OrgMember, Program, Student, StudentSeries,
+)
+from studentorg.timeseries import buckets_of
+
+# Counter column of each model, and the rows it counts: (field, source
+# model, lookup from the source model to the counted row).
+COUNTERS = {
+    College: ('student_count', Student, 'program__college'),
+    Program: ('student_count', Student, 'program'),
+    Organization: ('member_count', OrgMember, 'organization'),
+}
+
+
+def _bump(model, key, **deltas):
+    """Add ``deltas`` to the rollup row identified by ``key``.
+
+    Missing rows are only created for positive deltas: a negative delta
+    for a missing row means its parent is being deleted in the same
+    cascade, and recreating the row would point at a deleted parent.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    if model.objects.filter(**key).update(**updates):
+        return
+    if any(delta < 0 for delta in deltas.values()):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **deltas)
+    except IntegrityError:
+        model.objects.filter(**key).update(**updates)
+
+
+class Deltas:
+    """Changes to the counters and rollup tables, summed before they are written.
+
+    ``student`` and ``member`` record one row, ``add_students`` and
+    ``add_members`` read what a whole queryset contributes with one grouped
+    query; ``apply`` then writes the sums with a few batched statements per
+    table, however many rows or buckets moved.
+    """
+
+    def __init__(self):
+        # (model, pk) -> delta
+        self.counters = Counter()
+        # (model, key as (field, value) pairs, field) -> delta
+        self.rollups = Counter()
+
+    def student(self, program_id, created_at, count=1):
+        """Count ``count`` students of ``program_id`` created at ``created_at`` in (or out)."""
+        self.counters[Program, program_id] += count
+        if created_at:
+            for period, start in buckets_of(created_at):
+                key = (('period', period), ('start', start), ('program_id', program_id))
+                self.rollups[StudentSeries, key, 'count'] += count
+
+    def member(self, organization_id, program_id, date_joined, count=1):
+        """Count ``count`` members of ``organization_id`` joined on ``date_joined`` in (or out)."""
+        self.counters[Organization, organization_id] += count
+        self.rollups[OrganizationRollup, (('organization_id', organization_id),), 'date_joined_total'] += \
+            count * date_joined.toordinal()
+        if not program_id:
+            return
+        key = (('organization_id', organization_id), ('program_id', program_id))
+        self.rollups[OrganizationProgramRollup, key, 'member_count'] += count
+        for period, start in buckets_of(date_joined):
+            self.rollups[MembershipSeries, (('period', period), ('start', start), *key), 'count'] += count
+
+    def move_student(self, student_id, created_at, old_program_id, new_program_id):
+        """Move a student, and the program side of their memberships, to another program."""
+        self.student(old_program_id, created_at, -1)
+        self.student(new_program_id, created_at)
+        memberships = OrgMember.objects.filter(student_id=student_id)\
+                                       .values('organization', 'date_joined')\
+                                       .annotate(count=Count('id'))\
+                                       .values_list('organization', 'date_joined', 'count')
+        for organization_id, date_joined, count in memberships:
+            self.member(organization_id, old_program_id, date_joined, -count)
+            self.member(organization_id, new_program_id, date_joined, count)
+
+    def move_program(self, program_id, old_college_id, new_college_id):
+        """Move a program's students from one college to another."""
+        count = Program.objects.filter(pk=program_id).values_list('student_count', flat=True).first() or 0
+        if old_college_id:
+            self.counters[College, old_college_id] -= count
+        if new_college_id:
+            self.counters[College, new_college_id] += count
+
+    def add_students(self, students, sign=1, program_id=None):
+        """Count ``students`` in (or out, with ``sign=-1``), in ``program_id`` if given."""
+        groups = students.annotate(day=TruncDate('created_at'))\
+                         .values('program', 'day')\
+                         .annotate(count=Count('id'))\
+                         .order_by()\
+                         .values_list('program', 'day', 'count')
+        for program, day, count in groups:
+            self.student(program_id or program, day, sign * count)
+
+    def add_members(self, members, sign=1, organization_id=None, program_id=None):
+        """Count ``members`` in (or out), in ``organization_id`` and ``program_id`` if given."""
+        groups = members.values('organization', 'student__program', 'date_joined')\
+                        .annotate(count=Count('id'))\
+                        .order_by()\
+                        .values_list('organization', 'student__program', 'date_joined', 'count')
+        for organization, program, date_joined, count in groups:
+            self.member(organization_id or organization, program_id or program, date_joined, sign * count)
+
+    def apply(self):
+        # A program's students are counted in its college too.
+        programs = [pk for model, pk in self.counters if model is Program]
+        colleges = dict(Program.objects.filter(pk__in=programs).values_list('pk', 'college_id'))
+        for pk in programs:
+            if colleges.get(pk):
+                self.counters[College, colleges[pk]] += self.counters[Program, pk]
+        for model in COUNTERS:
+            field = COUNTERS[model][0]
+            _add_by_pk(model, {pk: {field: delta} for (counted, pk), delta in self.counters.items()
+                               if counted is model and delta})
+
+        for model, key_fields in ROLLUP_KEYS.items():
+            rows = {}
+            for (changed, key, field), delta in self.rollups.items():
+                if changed is model and delta:
+                    rows.setdefault(key, {})[field] = delta
+            if rows:
+                _bump_many(model, key_fields, rows)
+
+
+# Statement parameters per batch, within SQLite's oldest default limit of 999.
+BATCH_PARAMS = 900
+
+
+def _add_by_pk(model, deltas):
+    """Add ``{pk: {field: delta}}`` to many rows, one UPDATE per batch."""
+    fields = sorted({field for values in deltas.values() for field in values})
+    pks = sorted(deltas)
+    column = connection.ops.quote_name(model._meta.pk.column)
+    size = max(1, BATCH_PARAMS // (2 * len(fields) + 1)) if fields else 1
+    for start in range(0, len(pks), size):
+        batch = pks[start:start + size]
+        # Case(When(pk=...)) would build and compile a lookup per row.
+        case = f"CASE {column}{' WHEN %s THEN %s' * len(batch)} ELSE 0 END"
+        updates = {
+            field: F(field) + RawSQL(case, [value for pk in batch for value in (pk, deltas[pk].get(field, 0))],
+                                     output_field=model._meta.get_field(field))
+            for field in fields
+        }
+        model.objects.filter(pk__in=batch).update(**updates)
+
+
+def _bump_many(model, key_fields, rows):
+    """``_bump`` for ``{key as (field, value) pairs: {field: delta}}``, in batches.
+
+    The rows that exist are found by key and updated with one statement
+    per batch each; the missing ones are created in bulk, for positive
+    deltas only, as in ``_bump``.
+    """
+    rows = {tuple(dict(key)[field] for field in key_fields): deltas for key, deltas in rows.items()}
+    fields = [model._meta.get_field(field) for field in key_fields]
+    quote = connection.ops.quote_name
+    # SQLite looks each term of the OR up in the unique index on the key.
+    # Q objects would build and compile a lookup per key field and row.
+    term = f"({' AND '.join(f'{quote(field.column)} = %s' for field in fields)})"
+    keys = list(rows)
+    existing = {}
+    size = BATCH_PARAMS // len(fields)
+    for start in range(0, len(keys), size):
+        batch = keys[start:start + size]
+        params = [field.get_db_prep_value(value, connection) for key in batch for field, value in zip(fields, key)]
+        matching = RawSQL(f"SELECT {quote(model._meta.pk.column)} FROM {quote(model._meta.db_table)} "
+                          f"WHERE {' OR '.join([term] * len(batch))}", params)
+        for *key, pk in model.objects.filter(pk__in=matching).values_list(*key_fields, 'pk'):
+            existing[tuple(key)] = pk
+    updates, missing = {}, {}
+    for key, deltas in rows.items():
+        if key in existing:
+            updates[existing[key]] = deltas
+        elif all(delta > 0 for delta in deltas.values()):
+            missing[key] = deltas
+    _add_by_pk(model, updates)
+    if not missing:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.bulk_create([model(**dict(zip(key_fields, key)), **deltas)
+                                       for key, deltas in missing.items()])
+    except IntegrityError:
+        # Another writer created some of them meanwhile.
+        for key, deltas in missing.items():
+            _bump(model, dict(zip(key_fields, key)), **deltas)
+
+
+def live_counters(model):
+    """``{pk: count}`` of the rows the model's counter column counts."""
+    field, source, lookup = COUNTERS[model]
+    counted = dict(source.objects.values(lookup).annotate(count=Count('id')).order_by()
+                   .values_list(lookup, 'count'))
+    return {pk: counted.get(pk, 0) for pk in model.objects.values_list('pk', flat=True)}
+
+
+def counter_drift():
+    """Return ``(model, pk, stored, live)`` for every counter that is off."""
+    drift = []
+    for model, (field, _, _) in COUNTERS.items():
+        live = live_counters(model)
+        for pk, stored in model.objects.values_list('pk', field):
+            if stored != live.get(pk, 0):
+                drift.append((model, pk, stored, live.get(pk, 0)))
+    return drift
+
+
+@transaction.atomic
+def reconcile_counters(drift=None):
+    """Recount the drifted counters with one UPDATE per model; returns the drift fixed."""
+    drift = counter_drift() if drift is None else drift
+    for model, (field, source, lookup) in COUNTERS.items():
+        pks = [pk for drifted, pk, _, _ in drift if drifted is model]
+        if not pks:
+            continue
+        count = Subquery(
+            source.objects.filter(**{lookup: OuterRef('pk')}).order_by().values(lookup)
+                          .annotate(count=Count('id')).values('count')
+        )
+        for start in range(0, len(pks), 500):
+            model.objects.filter(pk__in=pks[start:start + 500]).update(**{field: Coalesce(count, 0)})
+    return drift
+
+
+def live_rollups():
+    """Compute every rollup table from the base tables.
+
+    Returns a dict mapping each rollup model to ``{key: {field: value}}``.
+    """
+    per_org = {pk: {'date_joined_total': 0}
+               for pk in Organization.objects.values_list('id', flat=True)}
+    per_org_program = {}
+    member_series, student_series = {}, {}
+    joined = OrgMember.objects.values('organization', 'student__program', 'date_joined')\
+                              .annotate(count=Count('id'))\
+                              .order_by()
+    for item in joined:
+        stats = per_org[item['organization']]
+        stats['date_joined_total'] += item['date_joined'].toordinal() * item['count']
+        key = (item['organization'], item['student__program'])
+        per_org_program[key] = per_org_program.get(key, 0) + item['count']
+        for period, start in buckets_of(item['date_joined']):
+            key = (period, start, item['organization'], item['student__program'])
+            member_series[key] = member_series.get(key, 0) + item['count']
+
+    created = Student.objects.annotate(day=TruncDate('created_at'))\
+                             .values('program', 'day')\
+                             .annotate(count=Count('id'))\
+                             .order_by()
+    for item in created:
+        for period, start in buckets_of(item['day']):
+            key = (period, start, item['program'])
+            student_series[key] = student_series.get(key, 0) + item['count']
+
+    return {
+        OrganizationRollup: per_org,
+        OrganizationProgramRollup: {key: {'member_count': count} for key, count in per_org_program.items()},
+        MembershipSeries: {key: {'count': count} for key, count in member_series.items()},
+        StudentSeries: {key: {'count': count} for key, count in student_series.items()},
+    }
+
+
+ROLLUP_KEYS = {
+    OrganizationRollup: ('organization_id',),
+    OrganizationProgramRollup: ('organization_id', 'program_id'),
+    MembershipSeries: ('period', 'start', 'organization_id', 'program_id'),
+    StudentSeries: ('period', 'start', 'program_id'),
+}
+
+
+def stored_rollups():
+    """Read every rollup table into the same shape as ``live_rollups``."""
+    stored = {}
+    for model, key_fields in ROLLUP_KEYS.items():
+        value_fields = [f.attname for f in model._meta.concrete_fields
+                        if f.attname not in key_fields and not f.primary_key]
+        rows = {}
+        for row in model.objects.values(*key_fields, *value_fields):
+            key = tuple(row[field] for field in key_fields)
+            rows[key if len(key) > 1 else key[0]] = {field: row[field] for field in value_fields}
+        stored[model] = rows
+    return stored
+
+
+def _is_zero(values):
+    return not any(values.values())
+
+
+def compare_rollups():
+    """Return a list of ``(model, key, stored, live)`` mismatches.
+
+    Covers the counter columns as well as the rollup tables. Rows whose
+    counts are all zero are treated the same as missing rows.
+    """
+    live, stored = live_rollups(), stored_rollups()
+    mismatches = []
+    for model in ROLLUP_KEYS:
+        for key in live[model].keys() | stored[model].keys():
+            live_values = live[model].get(key)
+            stored_values = stored[model].get(key)
+            if live_values == stored_values:
+                continue
+            if (live_values is None or _is_zero(live_values)) and \
+                    (stored_values is None or _is_zero(stored_values)):
+                continue
+            mismatches.append((model, key, stored_values, live_values))
+    for model, pk, stored, live in counter_drift():
+        field = COUNTERS[model][0]
+        mismatches.append((model, pk, {field: stored}, {field: live}))
+    return mismatches
+
+
+@transaction.atomic
+def rebuild_rollups():
+    """Recount the counter columns and refill every rollup table."""
+    reconcile_counters()
+    live = live_rollups()
+    for model, key_fields in ROLLUP_KEYS.items():
+        model.objects.all().delete()
+        rows = []
+        for key, values in live[model].items():
+            key = key if isinstance(key, tuple) else (key,)
+            rows.append(model(**dict(zip(key_fields, key)), **values))
+        model.objects.bulk_create(rows, batch_size=1000)
+    return live
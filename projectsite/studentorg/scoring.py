@@ -0,0 +1,103 @@
+"""Organization scores for the radar and bubble charts, computed with NumPy.
+
+The scores are derived from a membership fact matrix: one row per
+(organization, college, program) with members, read from
+``OrganizationProgramRollup`` in a single query. Per-organization totals
+come from the counter column and ``OrganizationRollup``; the retention
+and growth windows move with the date, so they are counted from the
+memberships in one grouped query. Every score of every organization is
+then computed at once with array operations.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from studentorg.models import College, Organization, OrganizationProgramRollup, OrgMember, Program
+
+# Colors picked by organization id, so every worker renders (and caches)
+# the same color for the same organization, whichever others have members.
+PALETTE = [
+    (54, 162, 235), (255, 99, 132), (75, 192, 192), (255, 159, 64), (153, 102, 255),
+    (255, 205, 86), (201, 203, 207), (0, 128, 128), (220, 20, 60), (46, 139, 87),
+    (106, 90, 205), (210, 105, 30),
+]
+
+
+def palette_color(pk):
+    """The ``"r, g, b"`` string of organization ``pk``'s color, for rgb()/rgba()."""
+    return ', '.join(str(channel) for channel in PALETTE[pk % len(PALETTE)])
+
+
+def _matrix(rows, columns):
+    """An int64 array of shape ``(len(rows), columns)``."""
+    return np.array(rows, dtype=np.int64).reshape(-1, columns)
+
+
+def _per_organization(ids, keys, values):
+    """Sum ``values`` into the slots of the sorted ``ids`` named by ``keys``.
+
+    Keys that are not in ``ids`` (organizations without members) are dropped.
+    """
+    totals = np.zeros(len(ids))
+    if not len(ids) or not len(keys):
+        return totals
+    position = np.minimum(np.searchsorted(ids, keys), len(ids) - 1)
+    known = ids[position] == keys
+    np.add.at(totals, position[known], values[known])
+    return totals
+
+
+def _distinct_per_organization(ids, keys, values):
+    """Number of distinct ``values`` per organization."""
+    pairs = np.unique(np.column_stack([keys, values]), axis=0)
+    return _per_organization(ids, pairs[:, 0], np.ones(len(pairs)))
+
+
+def organization_scores(today=None):
+    """Scores of every organization with members, in id order.
+
+    Returns a list of ``(id, name, college_id)`` and a dict of arrays
+    aligned with it: ``members``, ``member_score``, ``college_score``,
+    ``program_score``, ``retention_score``, ``growth_score`` (all 0-100),
+    ``avg_days``, the average age of the memberships in days, and
+    ``college_students``, the size of the organization's college.
+    """
+    today = today or timezone.now().date()
+    six_months_ago = today - timedelta(days=180)
+    three_months_ago = today - timedelta(days=90)
+
+    organizations = list(Organization.objects.filter(member_count__gt=0)
+                                             .order_by('id')
+                                             .values_list('id', 'name', 'college_id', 'member_count',
+                                                          'rollup__date_joined_total', 'college__student_count'))
+    ids, members, date_joined_total, college_students = _matrix(
+        [(pk, count, total or 0, students or 0) for pk, _, _, count, total, students in organizations], 4).T
+
+    facts = _matrix(list(OrganizationProgramRollup.objects.filter(member_count__gt=0)
+                                                          .values_list('organization', 'program__college',
+                                                                       'program')), 3)
+    windows = _matrix(list(OrgMember.objects.values('organization').annotate(
+        retained=Count('id', filter=Q(date_joined__lte=six_months_ago)),
+        new=Count('id', filter=Q(date_joined__gte=three_months_ago)),
+    ).order_by().values_list('organization', 'retained', 'new')), 3)
+
+    total_colleges = College.objects.count()
+    total_programs = Program.objects.count()
+    colleges = _distinct_per_organization(ids, facts[:, 0], facts[:, 1])
+    programs = _distinct_per_organization(ids, facts[:, 0], facts[:, 2])
+    retained = _per_organization(ids, windows[:, 0], windows[:, 1])
+    new = _per_organization(ids, windows[:, 0], windows[:, 2])
+
+    scores = {
+        'members': members,
+        'member_score': members / members.max() * 100 if len(ids) else np.zeros(0),
+        'college_score': colleges / total_colleges * 100 if total_colleges else np.zeros(len(ids)),
+        'program_score': programs / total_programs * 100 if total_programs else np.zeros(len(ids)),
+        'retention_score': retained / members * 100,
+        'growth_score': new / members * 100,
+        'avg_days': (members * today.toordinal() - date_joined_total) / members,
+        'college_students': college_students,
+    }
+    return [(pk, name, college_id) for pk, name, college_id, *_ in organizations], scores
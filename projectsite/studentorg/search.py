@@ -0,0 +1,191 @@
+"""Full-text search for the list views.
+
+On SQLite builds with FTS5, students, organizations and memberships are
+indexed in FTS5 tables that triggers keep in sync with every INSERT,
+UPDATE and DELETE, including bulk writes that bypass model signals. Other
+backends fall back to the ``icontains`` filters the list views always
+used.
+"""
+import re
+
+from django.db import OperationalError, connections
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+
+from studentorg.models import Organization, OrgMember, Student
+
+
+SEARCH_INDEXES = {
+    Student: {
+        'table': 'studentorg_student_fts',
+        'fallback': ('student_id', 'firstname', 'lastname'),
+    },
+    Organization: {
+        'table': 'studentorg_organization_fts',
+        'fallback': ('name', 'description'),
+    },
+    OrgMember: {
+        'table': 'studentorg_orgmember_fts',
+        'fallback': ('date_joined', 'student__firstname'),
+    },
+}
+
+# Students and organizations are indexed as external-content tables over
+# their own rows. Memberships are searched by their student's name, so
+# their index stores its own copy of it. The UPDATE triggers only fire for
+# the indexed columns: the counter columns change on every membership write.
+INDEX_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS studentorg_student_fts USING fts5(
+        student_id, firstname, lastname,
+        content='studentorg_student', content_rowid='id', tokenize='unicode61')""",
+    """CREATE TRIGGER IF NOT EXISTS studentorg_student_fts_ai AFTER INSERT ON studentorg_student BEGIN
+        INSERT INTO studentorg_student_fts(rowid, student_id, firstname, lastname)
+        VALUES (new.id, new.student_id, new.firstname, new.lastname);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS studentorg_student_fts_ad AFTER DELETE ON studentorg_student BEGIN
+        INSERT INTO studentorg_student_fts(studentorg_student_fts, rowid, student_id, firstname, lastname)
+        VALUES ('delete', old.id, old.student_id, old.firstname, old.lastname);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS studentorg_student_fts_au
+    AFTER UPDATE OF student_id, firstname, lastname ON studentorg_student BEGIN
+        INSERT INTO studentorg_student_fts(studentorg_student_fts, rowid, student_id, firstname, lastname)
+        VALUES ('delete', old.id, old.student_id, old.firstname, old.lastname);
+        INSERT INTO studentorg_student_fts(rowid, student_id, firstname, lastname)
+        VALUES (new.id, new.student_id, new.firstname, new.lastname);
+    END""",
+
+    """CREATE VIRTUAL TABLE IF NOT EXISTS studentorg_organization_fts USING fts5(
+        name, description,
+        content='studentorg_organization', content_rowid='id', tokenize='unicode61')""",
+    """CREATE TRIGGER IF NOT EXISTS studentorg_organization_fts_ai AFTER INSERT ON studentorg_organization BEGIN
+        INSERT INTO studentorg_organization_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS studentorg_organization_fts_ad AFTER DELETE ON studentorg_organization BEGIN
+        INSERT INTO studentorg_organization_fts(studentorg_organization_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS studentorg_organization_fts_au
+    AFTER UPDATE OF name, description ON studentorg_organization BEGIN
+        INSERT INTO studentorg_organization_fts(studentorg_organization_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO studentorg_organization_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+
+    """CREATE VIRTUAL TABLE IF NOT EXISTS studentorg_orgmember_fts USING fts5(
+        date_joined, firstname, tokenize='unicode61')""",
+    """CREATE TRIGGER IF NOT EXISTS studentorg_orgmember_fts_ai AFTER INSERT ON studentorg_orgmember BEGIN
+        INSERT INTO studentorg_orgmember_fts(rowid, date_joined, firstname)
+        SELECT new.id, new.date_joined, firstname FROM studentorg_student WHERE id = new.student_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS studentorg_orgmember_fts_ad AFTER DELETE ON studentorg_orgmember BEGIN
+        DELETE FROM studentorg_orgmember_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS studentorg_orgmember_fts_au
+    AFTER UPDATE OF date_joined, student_id ON studentorg_orgmember BEGIN
+        DELETE FROM studentorg_orgmember_fts WHERE rowid = old.id;
+        INSERT INTO studentorg_orgmember_fts(rowid, date_joined, firstname)
+        SELECT new.id, new.date_joined, firstname FROM studentorg_student WHERE id = new.student_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS studentorg_orgmember_fts_student_au
+    AFTER UPDATE OF firstname ON studentorg_student BEGIN
+        UPDATE studentorg_orgmember_fts SET firstname = new.firstname
+        WHERE rowid IN (SELECT id FROM studentorg_orgmember WHERE student_id = new.id);
+    END""",
+]
+
+INDEX_POPULATE = {
+    'studentorg_student_fts': "INSERT INTO studentorg_student_fts(studentorg_student_fts) VALUES ('rebuild')",
+    'studentorg_organization_fts':
+        "INSERT INTO studentorg_organization_fts(studentorg_organization_fts) VALUES ('rebuild')",
+    'studentorg_orgmember_fts': """INSERT INTO studentorg_orgmember_fts(rowid, date_joined, firstname)
+        SELECT m.id, m.date_joined, s.firstname
+        FROM studentorg_orgmember m JOIN studentorg_student s ON s.id = m.student_id""",
+}
+
+_TRIGGER_NAME = re.compile(r'CREATE TRIGGER IF NOT EXISTS (\w+)')
+
+_available = {}
+
+
+def install_search_index(connection):
+    """Create the FTS5 tables and triggers if they are missing.
+
+    Runs after every migrate, which also restores triggers dropped when a
+    migration rebuilds one of the indexed tables, and replaces triggers
+    whose definition has changed since they were created.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        existing = set(connection.introspection.table_names(cursor))
+        cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'")
+        triggers = dict(cursor.fetchall())
+        try:
+            for statement in INDEX_DDL:
+                trigger = _TRIGGER_NAME.match(statement)
+                # SQLite keeps the statement without its IF NOT EXISTS.
+                if trigger and trigger[1] in triggers and \
+                        triggers[trigger[1]] != statement.replace(' IF NOT EXISTS', '', 1):
+                    cursor.execute(f'DROP TRIGGER {trigger[1]}')
+                cursor.execute(statement)
+        except OperationalError:
+            # SQLite was built without FTS5; searches use the fallback.
+            return
+        for table, statement in INDEX_POPULATE.items():
+            if table not in existing:
+                cursor.execute(statement)
+    _available.pop(connection.alias, None)
+
+
+def search_available(model, using='default'):
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or model not in SEARCH_INDEXES:
+        return False
+    if using not in _available:
+        _available[using] = set(connection.introspection.table_names())
+    return SEARCH_INDEXES[model]['table'] in _available[using]
+
+
+def match_expression(query):
+    """Turn user input into an FTS5 prefix query.
+
+    Each whitespace-separated word becomes a prefix phrase of its tokens,
+    so "2024-05" matches "2024-05-17" and "jo smi" matches "John Smith".
+    """
+    phrases = []
+    for word in query.split():
+        tokens = re.findall(r'\w+', word)
+        if tokens:
+            phrases.append('"%s"*' % ' '.join(tokens))
+    return ' AND '.join(phrases)
+
+
+def _fallback(queryset, query):
+    condition = Q()
+    for field in SEARCH_INDEXES[queryset.model]['fallback']:
+        condition |= Q(**{f'{field}__icontains': query})
+    return queryset.filter(condition)
+
+
+def search(queryset, query, ranked=False):
+    """Filter ``queryset`` to the rows matching ``query``.
+
+    With ``ranked=True`` the results are annotated with FTS5's bm25 rank as
+    ``search_rank`` (lower is better) and ordered by it, best match first;
+    the fallback keeps the queryset's ordering and has no ``search_rank``.
+    """
+    query = query.strip()
+    expression = match_expression(query)
+    if not expression or not search_available(queryset.model, queryset.db):
+        return _fallback(queryset, query)
+
+    table = SEARCH_INDEXES[queryset.model]['table']
+    if not ranked:
+        return queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [expression]))
+    # The rank only exists in the scan that runs the MATCH, so the index is
+    # joined (``search_index``, models.SearchIndex); a correlated subquery
+    # would rerun the MATCH for every row.
+    return queryset.filter(search_index__document__match=expression)\
+                   .annotate(search_rank=F('search_index__rank')).order_by('search_rank', 'pk')
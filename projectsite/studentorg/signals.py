@@ -0,0 +1,129 @@
+from functools import partial
+
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from studentorg import dashboard, rollups, search
+from studentorg.models import Organization, OrgMember, Program, Student
+
+
+# The pre_save handlers remember the stored values of the fields the
+# rollups depend on, so post_save can tell what moved. Rows loaded from
+# fixtures (raw saves) come with their counters and rollups already.
+
+@receiver(pre_save, sender=Student)
+def remember_student(sender, instance, **kwargs):
+    if kwargs['raw']:
+        return
+    instance._stored_program_id = None
+    if instance.pk:
+        instance._stored_program_id = Student.objects.filter(pk=instance.pk)\
+                                                     .values_list('program_id', flat=True).first()
+
+
+@receiver(post_save, sender=Student)
+def student_saved(sender, instance, created, **kwargs):
+    if kwargs['raw']:
+        return
+    old_program_id = getattr(instance, '_stored_program_id', None)
+    deltas = rollups.Deltas()
+    if created or old_program_id is None:
+        deltas.student(instance.program_id, instance.created_at)
+    elif old_program_id != instance.program_id:
+        deltas.move_student(instance.pk, instance.created_at, old_program_id, instance.program_id)
+    deltas.apply()
+
+
+@receiver(post_delete, sender=Student)
+def student_deleted(sender, instance, **kwargs):
+    deltas = rollups.Deltas()
+    deltas.student(instance.program_id, instance.created_at, -1)
+    deltas.apply()
+
+
+def _date_joined(member):
+    # Whatever was assigned, e.g. a string, until the row is read back.
+    return OrgMember._meta.get_field('date_joined').to_python(member.date_joined)
+
+
+@receiver(pre_save, sender=OrgMember)
+def remember_member(sender, instance, **kwargs):
+    if kwargs['raw']:
+        return
+    instance._stored_member = None
+    if instance.pk:
+        instance._stored_member = OrgMember.objects.filter(pk=instance.pk)\
+                                                   .values('organization_id', 'student__program', 'date_joined')\
+                                                   .first()
+
+
+@receiver(post_save, sender=OrgMember)
+def member_saved(sender, instance, created, **kwargs):
+    if kwargs['raw']:
+        return
+    stored = getattr(instance, '_stored_member', None)
+    program_id = Student.objects.filter(pk=instance.student_id).values_list('program_id', flat=True).first()
+    date_joined = _date_joined(instance)
+    if stored and (stored['organization_id'], stored['student__program'], stored['date_joined']) == \
+            (instance.organization_id, program_id, date_joined):
+        return
+    deltas = rollups.Deltas()
+    if stored:
+        deltas.member(stored['organization_id'], stored['student__program'], stored['date_joined'], -1)
+    deltas.member(instance.organization_id, program_id, date_joined)
+    # One statement per table for both rows, however many buckets they touch.
+    deltas.apply()
+
+
+@receiver(post_delete, sender=OrgMember)
+def member_deleted(sender, instance, **kwargs):
+    # Cascaded deletes remove memberships before their student, so the
+    # program is still there to look up.
+    program_id = Student.objects.filter(pk=instance.student_id).values_list('program_id', flat=True).first()
+    deltas = rollups.Deltas()
+    deltas.member(instance.organization_id, program_id, _date_joined(instance), -1)
+    deltas.apply()
+
+
+@receiver(pre_save, sender=Program)
+def remember_program(sender, instance, **kwargs):
+    if kwargs['raw']:
+        return
+    instance._stored_college_id = None
+    if instance.pk:
+        instance._stored_college_id = Program.objects.filter(pk=instance.pk)\
+                                                     .values_list('college_id', flat=True).first()
+
+
+@receiver(post_save, sender=Program)
+def program_saved(sender, instance, created, **kwargs):
+    if created or kwargs['raw']:
+        return
+    old_college_id = getattr(instance, '_stored_college_id', None)
+    if old_college_id != instance.college_id:
+        deltas = rollups.Deltas()
+        deltas.move_program(instance.pk, old_college_id, instance.college_id)
+        deltas.apply()
+
+
+@receiver(post_save, sender=Organization)
+def organization_saved(sender, instance, created, **kwargs):
+    if kwargs['raw']:
+        return
+    if created:
+        rollups.OrganizationRollup.objects.get_or_create(organization=instance)
+
+
+def invalidate_dashboard(sender, **kwargs):
+    # Wait for the commit so a recompute never caches uncommitted data.
+    transaction.on_commit(partial(dashboard.invalidate_charts, dashboard.CHART_DEPENDENCIES[sender]))
+
+
+for model in dashboard.CHART_DEPENDENCIES:
+    post_save.connect(invalidate_dashboard, sender=model, dispatch_uid=f'dashboard-{model.__name__}-save')
+    post_delete.connect(invalidate_dashboard, sender=model, dispatch_uid=f'dashboard-{model.__name__}-delete')
+
+
+def install_search_index(sender, using, **kwargs):
+    search.install_search_index(connections[using])
@@ -0,0 +1,68 @@
+"""Fragment cache for the rows of the list pages.
+
+``{% cacherow 'org_row' object %}...{% endcacherow %}`` caches the rendered
+row of ``object`` for ``TEMPLATE_ROW_CACHE_TIMEOUT`` seconds (0 turns it
+off). The key carries the row's version, so an edit renders it afresh
+instead of invalidating anything: the object's ``updated_at``, its
+counter columns (``studentorg.rollups`` moves those without touching
+``updated_at``) and the ``updated_at`` of every related object loaded
+with it, since rows print those too. Related objects that were not
+loaded with ``select_related()`` are left out of the key, so a row that
+shows one must be listed with it.
+"""
+import hashlib
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import translation
+
+register = template.Library()
+
+
+def row_version(obj):
+    """What a row rendered from ``obj`` depends on."""
+    version = [obj.updated_at]
+    version += [getattr(obj, name) for name in getattr(obj, 'counter_fields', ())]
+    for field in obj._meta.concrete_fields:
+        if field.is_relation and field.is_cached(obj):
+            related = field.get_cached_value(obj)
+            version.append(related.updated_at if related is not None else None)
+    return version
+
+
+def row_cache_key(fragment_name, obj):
+    version = hashlib.md5(repr((translation.get_language(), row_version(obj))).encode()).hexdigest()
+    return f'row:{fragment_name}:{obj._meta.label_lower}:{obj.pk}:{version}'
+
+
+class CacheRowNode(template.Node):
+    def __init__(self, nodelist, fragment_name, obj):
+        self.nodelist = nodelist
+        self.fragment_name = fragment_name
+        self.obj = obj
+
+    def render(self, context):
+        timeout = getattr(settings, 'TEMPLATE_ROW_CACHE_TIMEOUT', 0)
+        if not timeout:
+            return self.nodelist.render(context)
+        key = row_cache_key(self.fragment_name.resolve(context), self.obj.resolve(context))
+        row = cache.get(key)
+        if row is None:
+            row = self.nodelist.render(context)
+            cache.set(key, row, timeout)
+        return row
+
+
+@register.tag
+def cacherow(parser, token):
+    """Cache the enclosed row of an object::
+
+        {% cacherow 'org_row' object %}<tr>...</tr>{% endcacherow %}
+    """
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a fragment name and an object.")
+    nodelist = parser.parse(('endcacherow',))
+    parser.delete_first_token()
+    return CacheRowNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]))
@@ -1,3 +1,1204 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import pstats
+import threading
+from concurrent.futures import Executor, Future
+from datetime import date, datetime, timedelta
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core import serializers
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.db.models import F, QuerySet
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from studentorg import assets, bulk, dashboard, dbtuning, deletion, jobs, metrics, views
+from studentorg.management.commands import index_advisor
+from studentorg.models import (
+    College, DeletionJob, Job, MembershipSeries, Organization, OrganizationProgramRollup, OrganizationRollup,
+    OrgMember, Program, Student, StudentSeries,
+)
+from studentorg.pagination import encode_cursor
+from studentorg.profiling import ProfilerMiddleware
+from studentorg.querybudget import QueryBudgetExceeded, query_budget
+from studentorg.rollups import compare_rollups, counter_drift, reconcile_counters
+from studentorg.scoring import organization_scores, palette_color
+from studentorg.search import match_expression, search, search_available
+from studentorg.timeseries import series
+
+
+def aware(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+# Tasks for the job queue tests; ``ran`` records what they did.
+ran = []
+
+
+@jobs.task
+def record(value):
+    ran.append(value)
+
+
+@jobs.task(max_attempts=2)
+def fail():
+    raise ValueError('Broken')
+
+
+@jobs.task
+def lose_lease():
+    # Another worker takes the job over, as it would once the lease ran out.
+    Job.objects.filter(status=Job.RUNNING).update(locked_by='other', attempts=F('attempts') + 1)
+
+
+@jobs.task
+def keep_lease():
+    Job.objects.filter(status=Job.RUNNING).update(locked_until=timezone.now())
+    jobs.heartbeat()
+    ran.append(Job.objects.get(status=Job.RUNNING).locked_until)
+
+
+class StudentOrgTestCase(TestCase):
+    """Two colleges with a program each, two organizations and a few members."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.engineering = College.objects.create(college_name='Engineering')
+        cls.arts = College.objects.create(college_name='Arts')
+        cls.computing = Program.objects.create(prog_name='Computing', college=cls.engineering)
+        cls.music = Program.objects.create(prog_name='Music', college=cls.arts)
+        cls.chess = Organization.objects.create(name='Chess Club', college=cls.engineering, description='Chess')
+        cls.choir = Organization.objects.create(name='Choir', college=cls.arts, description='Singing')
+        cls.students = [
+            Student.objects.create(student_id=f'2024-{n:04}', lastname=f'Last{n}', firstname=f'First{n}',
+                                   program=cls.computing if n % 2 else cls.music,
+                                   created_at=aware(2024, 1 + n % 3, 1 + n))
+            for n in range(6)
+        ]
+        for n, student in enumerate(cls.students):
+            OrgMember.objects.create(student=student, organization=cls.chess, date_joined=date(2024, 1 + n % 4, 10))
+            if n % 2:
+                OrgMember.objects.create(student=student, organization=cls.choir, date_joined=date(2023, 12, 31))
+
+    def assertConsistent(self):
+        self.assertEqual(counter_drift(), [])
+        self.assertEqual(compare_rollups(), [])
+
+
+class RollupSignalTests(StudentOrgTestCase):
+    def test_initial_data(self):
+        self.assertConsistent()
+        rollup = OrganizationRollup.objects.get(organization=self.choir)
+        self.assertEqual(rollup.date_joined_total, 3 * date(2023, 12, 31).toordinal())
+        self.assertEqual(OrganizationProgramRollup.objects.get(organization=self.choir, program=self.computing)
+                         .member_count, 3)
+
+    def test_edit_membership(self):
+        member = OrgMember.objects.filter(organization=self.chess).first()
+        member.date_joined = date(2022, 6, 1)
+        member.save()
+        self.assertConsistent()
+        member.organization = self.choir
+        member.save()
+        self.assertConsistent()
+
+    def test_delete_membership(self):
+        OrgMember.objects.filter(organization=self.choir).first().delete()
+        self.assertConsistent()
+
+    def test_create_and_delete_student(self):
+        student = Student.objects.create(student_id='2024-0100', lastname='New', firstname='Student',
+                                         program=self.music)
+        OrgMember.objects.create(student=student, organization=self.choir, date_joined=date(2024, 5, 1))
+        self.assertConsistent()
+        student.delete()
+        self.assertConsistent()
+
+    def test_change_student_program(self):
+        student = self.students[1]
+        student.program = self.music
+        student.save()
+        self.assertConsistent()
+
+    def test_move_program_to_another_college(self):
+        self.computing.college = self.arts
+        self.computing.save()
+        self.assertConsistent()
+
+    def test_string_date_joined(self):
+        member = OrgMember.objects.create(student=self.students[0], organization=self.choir, date_joined='2024-02-29')
+        self.assertConsistent()
+        member.date_joined = '2024-03-01'
+        member.save()
+        self.assertConsistent()
+
+    def test_fixture_load(self):
+        # Fixtures carry their counters and rollup rows, so loading one must not count its rows again.
+        models = [College, Program, Organization, Student, OrgMember, OrganizationRollup,
+                  OrganizationProgramRollup, MembershipSeries, StudentSeries]
+        data = serializers.serialize('json', [obj for model in models for obj in model.objects.all()])
+        College.objects.all().delete()
+        self.assertFalse(OrganizationRollup.objects.exists())
+        for obj in serializers.deserialize('json', data):
+            obj.save()
+        self.assertConsistent()
+
+
+class CounterTests(StudentOrgTestCase):
+    def test_counts(self):
+        self.engineering.refresh_from_db()
+        self.computing.refresh_from_db()
+        self.chess.refresh_from_db()
+        self.choir.refresh_from_db()
+        self.assertEqual([self.engineering.student_count, self.computing.student_count], [3, 3])
+        self.assertEqual([self.chess.member_count, self.choir.member_count], [6, 3])
+
+    def test_stale_instance_keeps_counter(self):
+        chess = Organization.objects.get(pk=self.chess.pk)
+        OrgMember.objects.create(student=self.students[0], organization=self.chess, date_joined=date(2024, 6, 1))
+        chess.name = 'Chess and Go Club'
+        chess.save()
+        chess.refresh_from_db()
+        self.assertEqual(chess.member_count, 7)
+        self.assertConsistent()
+
+    def test_program_move_moves_college_count(self):
+        self.computing.college = self.arts
+        self.computing.save()
+        self.assertEqual(list(College.objects.order_by('pk').values_list('student_count', flat=True)), [0, 6])
+        self.assertConsistent()
+
+    def test_reconcile_counters(self):
+        Organization.objects.update(member_count=0)
+        Program.objects.filter(pk=self.music.pk).update(student_count=99)
+        drift = counter_drift()
+        self.assertEqual(sorted((model.__name__, pk) for model, pk, _, _ in drift),
+                         sorted([('Organization', self.chess.pk), ('Organization', self.choir.pk),
+                                 ('Program', self.music.pk)]))
+        self.assertEqual(reconcile_counters(), drift)
+        self.assertConsistent()
+
+
+class SeriesTests(StudentOrgTestCase):
+    def test_month_series(self):
+        self.assertEqual(series(MembershipSeries, organization=self.chess), [
+            (date(2024, 1, 1), 2), (date(2024, 2, 1), 2), (date(2024, 3, 1), 1), (date(2024, 4, 1), 1),
+        ])
+        self.assertEqual(series(StudentSeries, program=self.computing), [
+            (date(2024, 1, 1), 1), (date(2024, 2, 1), 1), (date(2024, 3, 1), 1),
+        ])
+
+    def test_day_and_year_series(self):
+        self.assertEqual(series(MembershipSeries, period='day', organization=self.choir), [(date(2023, 12, 31), 3)])
+        self.assertEqual(series(MembershipSeries, period='year'), [(date(2023, 1, 1), 3), (date(2024, 1, 1), 6)])
+
+    def test_ranges_match_base_table(self):
+        OrgMember.objects.create(student=self.students[0], organization=self.choir, date_joined=date(2024, 2, 29))
+        OrgMember.objects.create(student=self.students[2], organization=self.choir, date_joined=date(2024, 3, 1))
+        ranges = [
+            (None, None), (date(2024, 1, 11), date(2024, 3, 10)), (date(2024, 1, 1), date(2024, 2, 29)),
+            (date(2023, 12, 31), date(2024, 1, 10)), (date(2024, 2, 29), date(2024, 3, 1)),
+            (date(2024, 1, 10), None), (None, date(2024, 1, 9)),
+        ]
+        for start, end in ranges:
+            with self.subTest(start=start, end=end):
+                members = OrgMember.objects.all()
+                if start:
+                    members = members.filter(date_joined__gte=start)
+                if end:
+                    members = members.filter(date_joined__lte=end)
+                expected = {}
+                for joined in members.values_list('date_joined', flat=True):
+                    expected[joined.replace(day=1)] = expected.get(joined.replace(day=1), 0) + 1
+                self.assertEqual(series(MembershipSeries, start, end), sorted(expected.items()))
+
+    def test_edit_moves_bucket(self):
+        member = OrgMember.objects.get(organization=self.chess, student=self.students[1])
+        member.date_joined = date(2024, 4, 30)
+        member.save()
+        self.assertEqual(series(MembershipSeries, organization=self.chess), [
+            (date(2024, 1, 1), 2), (date(2024, 2, 1), 1), (date(2024, 3, 1), 1), (date(2024, 4, 1), 2),
+        ])
+        self.assertConsistent()
+
+    def test_edit_view_query_shapes(self):
+        member = OrgMember.objects.get(organization=self.chess, student=self.students[3])
+        data = {'student': member.student_id, 'organization': self.choir.pk, 'date_joined': '2022-09-15'}
+        with query_budget():
+            response = self.client.post(reverse('orgmember-update', args=[member.pk]), data)
+        self.assertRedirects(response, reverse('orgmember-list'), fetch_redirect_response=False)
+        self.assertConsistent()
+
+
+class BulkActionTests(StudentOrgTestCase):
+    def test_delete_students(self):
+        self.assertEqual(bulk.delete_students(Student.objects.filter(program=self.computing)),
+                         {'students': 3, 'memberships': 6})
+        self.assertConsistent()
+
+    def test_reassign_program(self):
+        # Students already in the program are left alone.
+        self.assertEqual(bulk.reassign_program(Student.objects.all(), self.computing), {'students': 3})
+        self.assertFalse(Student.objects.filter(program=self.music).exists())
+        self.assertConsistent()
+
+    def test_delete_members(self):
+        self.assertEqual(bulk.delete_members(OrgMember.objects.filter(date_joined__lt=date(2024, 2, 1))),
+                         {'memberships': 5})
+        self.assertConsistent()
+
+    def test_move_members(self):
+        self.assertEqual(bulk.move_members(OrgMember.objects.all(), self.choir), {'memberships': 6})
+        self.assertEqual(OrgMember.objects.filter(organization=self.choir).count(), 9)
+        self.assertConsistent()
+
+    def test_merge_and_delete_organizations(self):
+        robotics = Organization.objects.create(name='Robotics', college=self.engineering, description='Robots')
+        OrgMember.objects.create(student=self.students[0], organization=robotics, date_joined=date(2024, 7, 1))
+        self.assertEqual(bulk.merge_organizations(Organization.objects.exclude(pk=robotics.pk), robotics),
+                         {'memberships': 9})
+        self.assertConsistent()
+        self.assertEqual(bulk.delete_organizations(Organization.objects.filter(pk=robotics.pk)),
+                         {'organizations': 1, 'memberships': 10})
+        self.assertConsistent()
+
+    def test_statements_do_not_grow_with_rows(self):
+        for n in range(100, 150):
+            student = Student.objects.create(student_id=f'2024-{n:04}', lastname=f'Last{n}', firstname=f'First{n}',
+                                             program=self.music, created_at=aware(2023, 1 + n % 12, 1 + n % 28))
+            OrgMember.objects.create(student=student, organization=self.chess, date_joined=date(2022, 1 + n % 12, 1))
+        with query_budget(20):
+            bulk.reassign_program(Student.objects.all(), self.computing)
+        with query_budget(20):
+            bulk.delete_students(Student.objects.all())
+        self.assertConsistent()
+
+    def test_select_all_matching_search(self):
+        self.client.force_login(User.objects.create_user('staff'))
+        data = {'operation': 'reassign', 'select_all': 'on', 'q': 'Last3', 'target': self.music.pk}
+        response = self.client.post(reverse('student-bulk'), data)
+        self.assertRedirects(response, reverse('student-list') + '?q=Last3', fetch_redirect_response=False)
+        self.assertEqual(Student.objects.get(lastname='Last3').program, self.music)
+        self.assertEqual(Student.objects.filter(program=self.computing).count(), 2)
+        self.assertConsistent()
+
+
+class DeletionTests(StudentOrgTestCase):
+    def assertDeleted(self, job):
+        self.assertEqual(job.status, DeletionJob.DONE)
+        self.assertEqual(job.deleted, job.total)
+        self.assertFalse(College.objects.filter(pk=self.engineering.pk).exists())
+        self.assertFalse(Student.objects.filter(program=self.computing).exists())
+        self.assertConsistent()
+
+    def interrupted_after(self, batches):
+        """Make ``bulk.delete_rows`` fail once it has deleted ``batches`` batches."""
+        delete_rows = bulk.delete_rows
+        calls = []
+
+        def interrupted(queryset):
+            calls.append(queryset)
+            if len(calls) > batches:
+                raise RuntimeError('Interrupted')
+            return delete_rows(queryset)
+
+        return mock.patch('studentorg.bulk.delete_rows', interrupted)
+
+    def test_small_delete_runs_inline(self):
+        job = deletion.start_deletion(self.engineering)
+        self.assertDeleted(job)
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(DELETION_INLINE_LIMIT=15)
+    def test_totals_count_only_cascade_models(self):
+        # One college, program and organization, three students and nine memberships.
+        job = deletion.start_deletion(self.engineering)
+        self.assertEqual(job.total, {'studentorg.college': 1, 'studentorg.program': 1, 'studentorg.organization': 1,
+                                     'studentorg.student': 3, 'studentorg.orgmember': 9})
+        self.assertDeleted(job)
+        self.assertFalse(StudentSeries.objects.filter(program=self.computing).exists())
+        self.assertFalse(OrganizationRollup.objects.filter(organization=self.chess).exists())
+
+    @override_settings(DELETION_INLINE_LIMIT=0)
+    def test_percent_of_finished_job(self):
+        job = deletion.start_deletion(self.engineering)
+        OrgMember.objects.filter(student__program=self.computing).delete()
+        job = deletion.run_job(job.pk)
+        self.assertLess(sum(job.deleted.values()), sum(job.total.values()))
+        self.assertEqual(job.percent, 100)
+
+    def test_delete_view(self):
+        self.client.force_login(User.objects.create_user('staff'))
+        response = self.client.post(reverse('college-delete', args=[self.engineering.pk]))
+        self.assertRedirects(response, reverse('college-list'), fetch_redirect_response=False)
+        self.assertDeleted(DeletionJob.objects.get())
+
+    @override_settings(DELETION_INLINE_LIMIT=0)
+    def test_large_delete_is_queued(self):
+        job = deletion.start_deletion(self.engineering)
+        self.assertEqual(job.status, DeletionJob.PENDING)
+        self.assertEqual(deletion.start_deletion(self.engineering), job)
+        queued = Job.objects.get()
+        self.assertEqual((queued.task, queued.kwargs), (deletion.run_deletion.task_name, {'job_id': job.pk}))
+        self.assertEqual(jobs.claim('worker', 5), [queued.pk])
+        jobs.execute(queued.pk)
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+        self.assertDeleted(DeletionJob.objects.get())
+
+    @override_settings(DELETION_INLINE_LIMIT=0, DELETION_BATCH_SIZE=2)
+    def test_resume_after_interruption(self):
+        job = deletion.start_deletion(self.engineering)
+        with self.interrupted_after(2), self.assertLogs('studentorg.deletion', 'ERROR'):
+            job = deletion.run_job(job.pk)
+        self.assertEqual((job.status, job.error), (DeletionJob.FAILED, 'RuntimeError: Interrupted'))
+        self.assertEqual(sum(job.deleted.values()), 4)
+        self.assertTrue(College.objects.filter(pk=self.engineering.pk).exists())
+        self.assertConsistent()
+
+        # Each batch committed with the job's progress, so it carries on from there.
+        self.assertEqual(deletion.resume(), [])
+        [job] = deletion.resume(failed=True)
+        self.assertDeleted(job)
+
+    @override_settings(DELETION_BATCH_SIZE=2)
+    def test_resume_interrupted_inline_delete(self):
+        with self.interrupted_after(2), self.assertLogs('studentorg.deletion', 'ERROR'):
+            job = deletion.start_deletion(self.engineering)
+        self.assertEqual(job.status, DeletionJob.FAILED)
+        # Inline jobs save their progress at the end, failed or not.
+        self.assertEqual(DeletionJob.objects.get().deleted, {'studentorg.orgmember': 4})
+        self.assertConsistent()
+        self.assertDeleted(deletion.start_deletion(self.engineering))
+
+    def test_abandoned_job_resumes(self):
+        with override_settings(DELETION_INLINE_LIMIT=0):
+            job = deletion.start_deletion(self.engineering)
+        DeletionJob.objects.filter(pk=job.pk).update(status=DeletionJob.RUNNING, updated_at=timezone.now())
+        # Someone else is running it.
+        self.assertEqual(deletion.run_job(job.pk).status, DeletionJob.RUNNING)
+        self.assertEqual(deletion.resume(), [])
+        self.assertTrue(College.objects.filter(pk=self.engineering.pk).exists())
+
+        stale = timezone.now() - timedelta(seconds=settings.DELETION_JOB_TIMEOUT + 1)
+        DeletionJob.objects.filter(pk=job.pk).update(updated_at=stale)
+        [job] = deletion.resume()
+        self.assertDeleted(job)
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        ran.clear()
+
+    def expire(self, job):
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+    def test_enqueue(self):
+        with self.assertRaises(TypeError):
+            jobs.enqueue(print)
+        job = jobs.enqueue(record, value=1, unique=True)
+        self.assertEqual(jobs.enqueue(record, value=1, unique=True), job)
+        self.assertNotEqual(jobs.enqueue(record, value=2, unique=True), job)
+        self.assertNotEqual(jobs.enqueue(record, value=1), job)
+
+    def test_claim_order(self):
+        low = jobs.enqueue(record, value='low')
+        jobs.enqueue(record, value='later', priority=5, delay=60)
+        high = jobs.enqueue(record, value='high', priority=5)
+        self.assertEqual(jobs.claim('worker', 5), [high.pk, low.pk])
+
+    def test_double_claim(self):
+        queued = {jobs.enqueue(record, value=n).pk for n in range(3)}
+        first = jobs.claim('first', 2)
+        second = jobs.claim('second', 2)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(set(first) | set(second), queued)
+        self.assertFalse(set(first) & set(second))
+        self.assertEqual(jobs.claim('third', 2), [])
+        self.assertEqual(Job.objects.filter(locked_by='first', attempts=1).count(), 2)
+
+    def test_racing_claims(self):
+        queued = [jobs.enqueue(record, value=n).pk for n in range(2)]
+        update = QuerySet.update
+        second = []
+
+        def racing_update(queryset, **kwargs):
+            # A second worker claims everything between the first one's read and its UPDATE.
+            if kwargs.get('locked_by') == 'first' and not second:
+                second.extend(jobs.claim('second', 5))
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', racing_update):
+            self.assertEqual(jobs.claim('first', 5), [])
+        self.assertEqual(second, queued)
+        self.assertEqual(Job.objects.filter(locked_by='second', attempts=1).count(), 2)
+
+    def test_expired_lease_is_claimed_again(self):
+        job = jobs.enqueue(record, value=1)
+        jobs.claim('first', 1)
+        self.assertEqual(jobs.claim('second', 1), [])
+        self.expire(job)
+        self.assertEqual(jobs.claim('second', 1), [job.pk])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by, job.attempts), (Job.RUNNING, 'second', 2))
+        jobs.execute(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(ran, [1])
+
+    def test_expired_last_attempt_fails(self):
+        job = jobs.enqueue(record, value=1)
+        Job.objects.filter(pk=job.pk).update(max_attempts=1)
+        jobs.claim('first', 1)
+        self.expire(job)
+        self.assertEqual(jobs.claim('second', 1), [])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (Job.FAILED, 'Timed out: the lease ran out.'))
+
+    def test_outcome_needs_the_lease(self):
+        job = jobs.enqueue(lose_lease)
+        jobs.claim('first', 1)
+        jobs.execute(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), (Job.RUNNING, 'other'))
+
+    def test_heartbeat(self):
+        job = jobs.enqueue(keep_lease)
+        jobs.claim('worker', 1)
+        jobs.execute(job.pk)
+        self.assertGreater(ran[0], timezone.now() + timedelta(seconds=job.timeout - 60))
+
+    @override_settings(JOBS_RETRY_DELAY=0)
+    def test_retry_then_fail(self):
+        job = jobs.enqueue(fail)
+        with self.assertLogs('studentorg.jobs', 'WARNING'):
+            jobs.execute(*jobs.claim('worker', 1))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.error), (Job.QUEUED, 1, 'ValueError: Broken'))
+        with self.assertLogs('studentorg.jobs', 'ERROR'):
+            jobs.execute(*jobs.claim('worker', 1))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertEqual(jobs.claim('worker', 1), [])
+
+
+class InlineExecutor(Executor):
+    """Runs each job as it is submitted; threads would not share the in-memory test database."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
+class InlineWorker(jobs.Worker):
+    def executor(self):
+        return InlineExecutor()
+
+
+class WorkerTests(StudentOrgTestCase):
+    @override_settings(DELETION_INLINE_LIMIT=0, DELETION_BATCH_SIZE=2)
+    def test_burst(self):
+        ran.clear()
+        job = deletion.start_deletion(self.engineering)
+        for n in range(5):
+            jobs.enqueue(record, value=n)
+        worker = InlineWorker(concurrency=2, poll_interval=0.01, burst=True)
+        with mock.patch('signal.signal'):
+            worker.run()
+        self.assertEqual(worker.completed, 6)
+        self.assertEqual(sorted(ran), list(range(5)))
+        self.assertFalse(Job.objects.exclude(status=Job.DONE).exists())
+        job.refresh_from_db()
+        self.assertEqual(job.status, DeletionJob.DONE)
+        self.assertConsistent()
+
+
+class IndexAdvisorTests(StudentOrgTestCase):
+    def test_report(self):
+        out = StringIO()
+        call_command('index_advisor', min_rows=0, only='student', stdout=out)
+        self.assertRegex(out.getvalue(), r'Captured \d+ queries')
+        self.assertRegex(out.getvalue(), r'full scans found|No full scans')
+
+    def test_write_scenarios_leave_no_trace(self):
+        queries = index_advisor.Command().capture('student')
+        labels = {label for labels in queries.values() for label in labels}
+        self.assertLessEqual({'student-add POST', 'student-update POST', 'student-delete POST'}, labels)
+        self.assertEqual(Student.objects.count(), 6)
+        self.assertFalse(User.objects.exists())
+        self.assertConsistent()
+
+    def test_skips_names_that_are_not_tables(self):
+        queries = {('WITH key (id) AS (VALUES (1), (2)) SELECT key.id FROM key JOIN studentorg_student student '
+                    'ON student.id = key.id', ()): ['cte']}
+        out = StringIO()
+        with mock.patch.object(index_advisor.Command, 'capture', return_value=queries):
+            call_command('index_advisor', min_rows=0, stdout=out)
+        self.assertIn('No full scans of large tables.', out.getvalue())
+
+
+class ImportRosterTests(StudentOrgTestCase):
+    def setUp(self):
+        self.directory = Path(self.enterContext(TemporaryDirectory()))
+
+    def write_csv(self, name, header, *rows):
+        path = self.directory / name
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerows([header, *rows])
+        return str(path)
+
+    def test_students_and_memberships(self):
+        students = self.write_csv('students.csv', ['student_id', 'lastname', 'firstname', 'program'],
+                                  ['2024-0100', 'Reyes', 'Ana', 'Computing'], ['2024-0101', 'Cruz', 'Ben', 'music'])
+        members = self.write_csv('members.csv', ['student_id', 'organization', 'date_joined'],
+                                 ['2024-0100', 'Chess Club', '2024-02-01'], ['2024-0101', 'choir', '2023-11-30'])
+        call_command('import_roster', 'students', students, stdout=StringIO())
+        call_command('import_roster', 'memberships', members, batch_size=1, stdout=StringIO())
+        self.assertEqual(Student.objects.count(), 8)
+        self.assertEqual(OrgMember.objects.filter(student__student_id__in=['2024-0100', '2024-0101']).count(), 2)
+        self.assertConsistent()
+
+    def test_upsert(self):
+        path = self.write_csv('students.csv', ['student_id', 'lastname', 'firstname', 'program'],
+                              ['2024-0001', 'Moved', 'First1', 'Music'], ['2024-0002', 'Stays', 'First2', 'Music'],
+                              ['2024-0100', 'Reyes', 'Ana', 'Computing'])
+        call_command('import_roster', 'students', path, upsert=True, stdout=StringIO())
+        self.assertEqual(Student.objects.count(), 7)
+        moved = Student.objects.get(student_id='2024-0001')
+        self.assertEqual((moved.lastname, moved.program), ('Moved', self.music))
+        self.assertEqual(Student.objects.get(student_id='2024-0002').lastname, 'Stays')
+        # The moved student's memberships now count towards their new program.
+        self.assertEqual(OrganizationProgramRollup.objects.get(organization=self.choir, program=self.computing)
+                         .member_count, 2)
+        self.assertConsistent()
+
+    def test_rejected_rows(self):
+        path = self.write_csv('students.csv', ['student_id', 'lastname', 'firstname', 'program'],
+                              ['2024-0100', 'Reyes', 'Ana', 'Nursing'], ['2024-0101', '', 'Ben', 'Music'],
+                              ['2024-0102', 'Cruz', 'Cy', 'Music'])
+        rejects = self.directory / 'rejects.csv'
+        call_command('import_roster', 'students', path, rejects=str(rejects), stdout=StringIO())
+        with open(rejects, newline='', encoding='utf-8') as f:
+            self.assertEqual([row[:2] for row in csv.reader(f)], [
+                ['line', 'reason'], ['2', "Unknown program 'Nursing'"], ['3', 'Missing lastname'],
+            ])
+        self.assertEqual(list(Student.objects.filter(student_id__gte='2024-0100').values_list('student_id', flat=True)),
+                         ['2024-0102'])
+        self.assertConsistent()
+
+    def test_background(self):
+        path = self.write_csv('students.csv', ['student_id', 'lastname', 'firstname', 'program'],
+                              ['2024-0100', 'Reyes', 'Ana', 'Computing'])
+        call_command('import_roster', 'students', path, background=True, stdout=StringIO())
+        self.assertFalse(Student.objects.filter(student_id='2024-0100').exists())
+        job = Job.objects.get()
+        self.assertEqual((job.task, job.kwargs['args']), (jobs.run_command.task_name, ['students', path]))
+        with mock.patch('sys.stdout', StringIO()):
+            jobs.execute(*jobs.claim('worker', 1))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertTrue(Student.objects.filter(student_id='2024-0100').exists())
+        self.assertConsistent()
+
+
+class MetricsTests(StudentOrgTestCase):
+    def setUp(self):
+        directory = self.enterContext(TemporaryDirectory())
+        self.enterContext(override_settings(METRICS_DIRECTORY=directory, METRICS_TOKEN=''))
+        self.store = metrics.MetricsStore(directory, flush_interval=60)
+        self.enterContext(mock.patch.object(metrics, '_store', self.store))
+
+    def test_needs_staff_without_token(self):
+        # The test client sends REMOTE_ADDR 127.0.0.1, which is no authorization either.
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.client.force_login(User.objects.create_user('user'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE psusphere_http_requests_total counter', response.content)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_bearer_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    def test_streamed_body_is_measured(self):
+        self.client.force_login(User.objects.create_user('user'))
+        response = self.client.get(reverse('student-export'))
+        queries = ('psusphere_db_queries_total', (('view', 'student-export'),))
+        self.assertNotIn(queries, self.store.counters)
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 7)
+        # The rows are read while the body is sent.
+        self.assertGreaterEqual(self.store.counters[queries], 1)
+
+    def test_chart_threads_are_counted(self):
+        def get_chart(name):
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return threading.current_thread().name
+
+        # Whether a pool thread opens a connection, and tunes it, depends on
+        # which thread picks the chart up.
+        self.enterContext(mock.patch.object(dbtuning, 'sqlite_pragmas', dict))
+        with mock.patch('studentorg.dashboard.get_chart', get_chart), metrics.QueryCounter() as counter:
+            charts = async_to_sync(dashboard.get_charts_async)(['college', 'org'])
+        self.assertTrue(all(name.startswith('dashboard-chart') for name in charts.values()))
+        self.assertEqual(counter.count, 2)
+
+
+class QueryBudgetTests(StudentOrgTestCase):
+    def setUp(self):
+        # Rendered rows and charts cached by an earlier test would hide their queries.
+        cache.clear()
+        self.client.force_login(User.objects.create_user('user'))
+
+    def test_list_pages_within_budget(self):
+        for name, view in [('organization-list', views.Organizationlist), ('orgmember-list', views.OrgMemberlist),
+                           ('student-list', views.StudentList), ('program-list', views.ProgramList),
+                           ('college-list', views.CollegeList)]:
+            with self.subTest(name), query_budget(view.query_budget):
+                self.assertEqual(self.client.get(reverse(name), {'q': 'a'}).status_code, 200)
+                self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+
+    def test_dashboard_within_budget(self):
+        for name in dashboard.CHARTS:
+            with query_budget(views.ChartDataView.query_budget):
+                self.assertEqual(self.client.get(reverse('chart-data', args=[name])).status_code, 200)
+        with query_budget(views.HomePageView.query_budget):
+            self.assertEqual(self.client.get(reverse('home')).status_code, 200)
+        # The chart threads only read the charts computed above from the cache.
+        with query_budget(views.AsyncHomePageView.query_budget):
+            self.assertEqual(self.client.get(reverse('home-async')).status_code, 200)
+
+    def test_middleware_raises_over_budget(self):
+        self.assertTrue(settings.QUERY_INSPECTOR_RAISE)
+        with mock.patch.object(views.StudentList, 'query_budget', 0), self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('student-list'))
+
+
+class SearchTests(StudentOrgTestCase):
+    def found(self, model, query, **kwargs):
+        return list(search(model.objects.order_by('pk'), query, **kwargs).values_list('pk', flat=True))
+
+    def test_match_expression(self):
+        self.assertEqual(match_expression('jo smi'), '"jo"* AND "smi"*')
+        self.assertEqual(match_expression('2024-05'), '"2024 05"*')
+        self.assertEqual(match_expression('"O\'Brien"'), '"O Brien"*')
+        self.assertEqual(match_expression('- ?'), '')
+
+    def test_prefix_match(self):
+        self.assertTrue(search_available(Student))
+        self.assertEqual(self.found(Student, 'las fir'), [student.pk for student in self.students])
+        self.assertEqual(self.found(Student, '2024-0003'), [self.students[3].pk])
+        # Prefixes of words, not substrings.
+        self.assertEqual(self.found(Student, 'ast3'), [])
+
+    def test_triggers_follow_writes(self):
+        student = Student.objects.create(student_id='2025-0001', lastname='Zeller', firstname='Ada', program=self.music)
+        self.assertEqual(self.found(Student, 'zell'), [student.pk])
+        Student.objects.filter(pk=student.pk).update(lastname='Young')
+        self.assertEqual(self.found(Student, 'zell'), [])
+        self.assertEqual(self.found(Student, 'young'), [student.pk])
+        Student.objects.filter(pk=student.pk).delete()
+        self.assertEqual(self.found(Student, 'young'), [])
+
+        self.chess.description = 'Board games'
+        self.chess.save()
+        self.assertEqual(self.found(Organization, 'board'), [self.chess.pk])
+        self.assertEqual(self.found(Organization, 'chess'), [self.chess.pk])  # Still in its name
+
+    def test_memberships_follow_their_student(self):
+        memberships = list(self.students[3].orgmember_set.order_by('pk').values_list('pk', flat=True))
+        Student.objects.filter(pk=self.students[3].pk).update(firstname='Grace')
+        self.assertEqual(self.found(OrgMember, 'grace'), memberships)
+        self.assertEqual(self.found(OrgMember, 'first3'), [])
+
+        member = OrgMember.objects.create(student=self.students[0], organization=self.choir, date_joined=date(2024, 9, 1))
+        self.assertEqual(self.found(OrgMember, '2024-09'), [member.pk])
+        OrgMember.objects.filter(pk=member.pk).update(student=self.students[3])
+        self.assertIn(member.pk, self.found(OrgMember, 'grace'))
+        member.delete()
+        self.assertEqual(self.found(OrgMember, '2024-09'), [])
+
+    def test_ranked(self):
+        Student.objects.create(student_id='2025-0002', lastname='Last', firstname='Last', program=self.music)
+        results = search(Student.objects.all(), 'last', ranked=True)
+        ranks = [student.search_rank for student in results]
+        self.assertEqual(ranks, sorted(ranks))
+        # bm25 ranks the student named Last Last first.
+        self.assertEqual(results[0].student_id, '2025-0002')
+        self.assertEqual(len(ranks), 7)
+
+    def test_icontains_fallback(self):
+        with mock.patch('studentorg.search.search_available', return_value=False):
+            self.assertEqual(self.found(Student, 'ast3'), [self.students[3].pk])
+            self.assertFalse(hasattr(search(Student.objects.all(), 'ast3', ranked=True)[0], 'search_rank'))
+        # Input without words cannot be an FTS5 query.
+        self.assertEqual(self.found(Student, '-'), [student.pk for student in self.students])
+
+
+class PaginationTests(StudentOrgTestCase):
+    def walk(self, name, **params):
+        """The pks of every page, following next links and then previous links back."""
+        url = reverse(name)
+        page = self.client.get(url, {'page_size': 2, **params}).context['page_obj']
+        forward = [obj.pk for obj in page]
+        while page.has_next():
+            page = self.client.get(f'{url}?{page.next_query}').context['page_obj']
+            forward += [obj.pk for obj in page]
+        backward = [obj.pk for obj in page]
+        while page.has_previous():
+            page = self.client.get(f'{url}?{page.previous_query}').context['page_obj']
+            backward[:0] = [obj.pk for obj in page]
+        return forward, backward
+
+    def assertPages(self, name, expected, **params):
+        expected = list(expected.values_list('pk', flat=True))
+        self.assertEqual(self.walk(name, **params), (expected, expected))
+
+    def test_default_ordering(self):
+        self.assertPages('student-list', Student.objects.order_by('created_at', 'id'))
+        self.assertPages('orgmember-list', OrgMember.objects.order_by('created_at', 'id'))
+
+    def test_ties_on_the_sort_key(self):
+        created_at = aware(2024, 6, 1)
+        for n in range(5):
+            Student.objects.create(student_id=f'2024-{n + 10:04}', lastname='Tie', firstname=f'Tie{n}',
+                                   program=self.music, created_at=created_at)
+        self.assertPages('student-list', Student.objects.order_by('created_at', 'id'), page_size=3)
+
+    def test_sort_options(self):
+        for n in range(3):
+            Organization.objects.create(name=f'Club {n}', college=self.arts)
+        # Both programs and both colleges have three students.
+        self.assertPages('program-list', Program.objects.order_by('-student_count', '-id'), sort='students')
+        self.assertPages('college-list', College.objects.order_by('-student_count', '-id'), sort='students')
+        self.assertPages('organization-list', Organization.objects.order_by('-member_count', '-id'), sort='members')
+
+    def test_ranked_search(self):
+        Student.objects.create(student_id='2025-0001', lastname='Last', firstname='Last', program=self.music)
+        expected = search(Student.objects.all(), 'last', ranked=True)
+        self.assertEqual(len({student.search_rank for student in expected}), 2)
+        self.assertPages('student-list', expected, q='last')
+        self.assertPages('student-list', search(Student.objects.all(), 'first', ranked=True), q='first', page_size=4)
+
+    def test_invalid_cursor(self):
+        url = reverse('student-list')
+        for cursor in ['not a cursor', encode_cursor([1], 'next'), encode_cursor(['2024-01-01T00:00:00', 1], 'up'),
+                       encode_cursor(['not a date', 1], 'next'), encode_cursor(['2024-01-01T00:00:00', 'x'], 'prev'),
+                       encode_cursor({'id': 1}, 'next')]:
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get(url, {'cursor': cursor}).status_code, 404)
+        # A cursor that was valid for one sort is not one for another.
+        page = self.client.get(reverse('organization-list'), {'page_size': 1}).context['page_obj']
+        self.assertEqual(self.client.get(reverse('organization-list'),
+                                         {'cursor': page.next_cursor, 'sort': 'members'}).status_code, 404)
+
+
+class ChartETagTests(StudentOrgTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user('user'))
+
+    def get(self, name, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(reverse('chart-data', args=[name]), **headers)
+
+    def test_not_modified(self):
+        response = self.get('org')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        response = self.get('org', response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_write_changes_etag(self):
+        org, yearly = self.get('org'), self.get('yearly')
+        with self.captureOnCommitCallbacks(execute=True):
+            OrgMember.objects.create(student=self.students[0], organization=self.choir, date_joined=date(2024, 5, 1))
+        response = self.get('org', org['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], org['ETag'])
+        self.assertNotEqual(response.content, org.content)
+        # The yearly chart does not read memberships.
+        self.assertEqual(self.get('yearly', yearly['ETag']).status_code, 304)
+
+        # Deleting an older membership leaves the latest updated_at as it was.
+        org = response
+        with self.captureOnCommitCallbacks(execute=True):
+            OrgMember.objects.filter(organization=self.chess, student=self.students[0]).delete()
+        response = self.get('org', org['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], org['ETag'])
+
+
+class ExportTests(StudentOrgTestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('user'))
+
+    def export(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv(self):
+        # Rows are fetched in chunks from a single query, after the session and the user.
+        with mock.patch.object(views.OrgMemberExport, 'chunk_size', 2), query_budget(3):
+            response, body = self.export('orgmember-export')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="orgmembers.csv"')
+        rows = list(csv.reader(StringIO(body)))
+        self.assertEqual(rows[0], ['id', 'student_id', 'lastname', 'firstname', 'program', 'organization',
+                                   'organization_college', 'date_joined'])
+        self.assertEqual([int(row[0]) for row in rows[1:]],
+                         list(OrgMember.objects.order_by('created_at', 'id').values_list('pk', flat=True)))
+        member = OrgMember.objects.get(student=self.students[3], organization=self.choir)
+        self.assertIn([str(member.pk), '2024-0003', 'Last3', 'First3', 'Computing', 'Choir', 'Arts', '2023-12-31'],
+                      rows)
+
+    def test_ndjson_honors_search(self):
+        response, body = self.export('student-export', format='ndjson', q='first3')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([json.loads(line) for line in body.splitlines()], [{
+            'id': self.students[3].pk, 'student_id': '2024-0003', 'lastname': 'Last3', 'firstname': 'First3',
+            'middlename': None, 'program': 'Computing', 'college': 'Engineering',
+        }])
+
+    def test_unsupported_format(self):
+        self.assertEqual(self.client.get(reverse('college-export'), {'format': 'xml'}).status_code, 400)
+
+
+class AsyncDashboardTests(StudentOrgTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user('user'))
+
+    def test_page_embeds_the_charts(self):
+        # Computed here first: threads cannot read the in-memory test database.
+        expected = {name: dashboard.get_chart(name) for name in views.AsyncHomePageView.charts}
+        response = self.client.get(reverse('home-async'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['charts'], expected)
+        self.assertContains(response, '<script id="chart-data" type="application/json">')
+        self.assertNotContains(self.client.get(reverse('home')), 'id="chart-data"')
+
+    def test_charts_are_computed_concurrently(self):
+        names = ['college', 'org', 'timeline']
+        # Only released once every chart is being computed at the same time.
+        barrier = threading.Barrier(len(names), timeout=5)
+
+        def get_chart(name):
+            barrier.wait()
+            return f'{name} in {threading.current_thread().name}'
+
+        with mock.patch('studentorg.dashboard.get_chart', get_chart):
+            charts = async_to_sync(dashboard.get_charts_async)(names)
+        self.assertEqual(list(charts), names)
+        self.assertEqual(len({chart.split(' in ')[1] for chart in charts.values()}), len(names))
+
+
+class AutocompleteTests(StudentOrgTestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('user'))
+
+    def lookup(self, name, **params):
+        return self.client.get(reverse(name), params).json()
+
+    def test_pages(self):
+        with mock.patch.object(views.StudentLookup, 'paginate_by', 4):
+            first, second = self.lookup('student-lookup'), self.lookup('student-lookup', page=2)
+            # A page number that is not one starts over.
+            self.assertEqual(self.lookup('student-lookup', page='x'), first)
+        self.assertEqual(first['pagination'], {'more': True})
+        self.assertEqual(second['pagination'], {'more': False})
+        self.assertEqual([result['id'] for result in first['results'] + second['results']],
+                         [student.pk for student in self.students])
+        self.assertEqual(first['results'][0], {'id': self.students[0].pk, 'text': 'Last0, First0'})
+
+    def test_search(self):
+        self.assertEqual(self.lookup('student-lookup', q='first3')['results'],
+                         [{'id': self.students[3].pk, 'text': 'Last3, First3'}])
+        self.assertEqual([result['id'] for result in self.lookup('organization-lookup', q='sing')['results']],
+                         [self.choir.pk])
+        # Programs have no search index; their names are matched anywhere.
+        self.assertEqual([result['id'] for result in self.lookup('program-lookup', q='USIC')['results']],
+                         [self.music.pk])
+
+    def test_widget_lists_only_the_selected_row(self):
+        member = OrgMember.objects.get(student=self.students[3], organization=self.choir)
+        html = self.client.get(reverse('orgmember-update', args=[member.pk])).content.decode()
+        self.assertIn(f'data-autocomplete-url="{reverse("student-lookup")}"', html)
+        self.assertIn(f'<option value="{self.students[3].pk}" selected>Last3, First3</option>', html)
+        self.assertNotIn('Last2, First2', html)
+
+
+class ScoringTests(StudentOrgTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # A member from another college, an organization without a college and one without members.
+        history = Program.objects.create(prog_name='History', college=cls.arts)
+        student = Student.objects.create(student_id='2024-0100', lastname='Last100', firstname='First100',
+                                         program=history)
+        OrgMember.objects.create(student=student, organization=cls.chess, date_joined=date(2023, 6, 1))
+        hikers = Organization.objects.create(name='Hikers', description='Hiking')
+        OrgMember.objects.create(student=cls.students[0], organization=hikers, date_joined=date(2024, 5, 20))
+        Organization.objects.create(name='Empty', college=cls.arts, description='Nobody')
+
+    def expected_scores(self, today):
+        """The scores the way the charts computed them, one organization at a time from its memberships."""
+        organizations = [organization for organization in Organization.objects.order_by('id')
+                         if organization.orgmember_set.exists()]
+        largest = max(organization.orgmember_set.count() for organization in organizations)
+        expected = []
+        for organization in organizations:
+            members = list(organization.orgmember_set.select_related('student__program'))
+            expected.append([
+                len(members),
+                len(members) / largest * 100,
+                len({member.student.program.college_id for member in members}) / College.objects.count() * 100,
+                len({member.student.program_id for member in members}) / Program.objects.count() * 100,
+                sum(member.date_joined <= today - timedelta(days=180) for member in members) / len(members) * 100,
+                sum(member.date_joined >= today - timedelta(days=90) for member in members) / len(members) * 100,
+                sum((today - member.date_joined).days for member in members) / len(members),
+                Student.objects.filter(program__college=organization.college_id).count()
+                if organization.college_id else 0,
+            ])
+        return [(organization.pk, organization.name, organization.college_id) for organization in organizations], \
+            expected
+
+    def test_matches_the_per_organization_loop(self):
+        for today in [date(2024, 6, 1), date(2025, 1, 1)]:
+            with self.subTest(today=today):
+                organizations, scores = organization_scores(today)
+                expected_organizations, expected = self.expected_scores(today)
+                self.assertEqual(organizations, expected_organizations)
+                columns = ['members', 'member_score', 'college_score', 'program_score', 'retention_score',
+                           'growth_score', 'avg_days', 'college_students']
+                np.testing.assert_allclose(np.column_stack([scores[column] for column in columns]), expected)
+
+    def test_no_members(self):
+        OrgMember.objects.all().delete()
+        organizations, scores = organization_scores(date(2024, 6, 1))
+        self.assertEqual(organizations, [])
+        self.assertTrue(all(len(values) == 0 for values in scores.values()))
+
+
+class StaticAssetTests(SimpleTestCase):
+    def setUp(self):
+        self.root = Path(self.enterContext(TemporaryDirectory()))
+        (self.root / 'js').mkdir()
+        self.script = b'function hello() { return "hello"; }\n' * 50
+        for name in ['js/app.js', 'js/app.0123456789ab.js']:
+            (self.root / name).write_bytes(self.script)
+            assets.compress_file(str(self.root / name))
+        (self.root / 'js' / 'tiny.js').write_bytes(b'var x;\n')
+        self.enterContext(override_settings(DEBUG=False, STATIC_ROOT=self.root, STATIC_URL='/static/'))
+        self.enterContext(mock.patch.object(staticfiles_storage, 'hashed_files', {'js/app.js': 'js/app.0123456789ab.js'}))
+        self.handler = assets.StaticAssetHandler(lambda environ, start_response: [b'from django'])
+
+    def get(self, path, **headers):
+        started = {}
+
+        def start_response(status, headers):
+            started.update(headers, status=status)
+
+        environ = {'REQUEST_METHOD': 'GET', 'SCRIPT_NAME': '', 'PATH_INFO': path, **headers}
+        body = b''.join(self.handler(environ, start_response))
+        return started, body
+
+    def test_negotiates_encoding(self):
+        cases = [('gzip, deflate', 'gzip'), ('br;q=0, gzip', 'gzip'), ('gzip;q=0', None), ('', None),
+                 ('identity', None)]
+        if assets.brotli:
+            cases += [('gzip, deflate, br', 'br'), ('*', 'br')]
+        for accept_encoding, encoding in cases:
+            with self.subTest(accept_encoding):
+                headers, body = self.get('/static/js/app.js', HTTP_ACCEPT_ENCODING=accept_encoding)
+                self.assertEqual(headers['status'], '200 OK')
+                self.assertEqual(headers.get('Content-Encoding'), encoding)
+                self.assertEqual(headers['Vary'], 'Accept-Encoding')
+                self.assertEqual(headers['Content-Type'], 'text/javascript')
+                self.assertEqual(int(headers['Content-Length']), len(body))
+                decode = {'gzip': gzip.decompress, 'br': getattr(assets.brotli, 'decompress', None)}
+                self.assertEqual(decode[encoding](body) if encoding else body, self.script)
+
+    def test_revalidation(self):
+        headers, _ = self.get('/static/js/app.js', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(headers['Cache-Control'], 'public, no-cache')
+        self.assertEqual(self.get('/static/js/app.js', HTTP_ACCEPT_ENCODING='gzip',
+                                  HTTP_IF_NONE_MATCH=headers['ETag'])[0]['status'], '304 Not Modified')
+        # Each encoding is a different representation.
+        self.assertEqual(self.get('/static/js/app.js', HTTP_IF_NONE_MATCH=headers['ETag'])[0]['status'], '200 OK')
+        hashed, _ = self.get('/static/js/app.0123456789ab.js')
+        self.assertEqual(hashed['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    def test_small_and_unknown_files(self):
+        self.assertEqual(assets.compress_file(str(self.root / 'js' / 'tiny.js')), [])
+        headers, body = self.get('/static/js/tiny.js', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual((headers.get('Content-Encoding'), headers.get('Vary'), body), (None, None, b'var x;\n'))
+        # Variants are not served on their own, and anything else goes to Django.
+        self.assertEqual(self.get('/static/js/app.js.gz')[1], b'from django')
+        self.assertEqual(self.get('/static/js/missing.js')[1], b'from django')
+
+
+class RowCacheTests(StudentOrgTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def page(self, name):
+        return self.client.get(reverse(name), {'page_size': 100}).content.decode()
+
+    def test_related_row_changes(self):
+        self.assertEqual(self.page('orgmember-list').count('Last3, First3'), 2)
+        # Bypasses updated_at, so the cached rows are served.
+        Student.objects.filter(pk=self.students[3].pk).update(lastname='Renamed')
+        self.assertEqual(self.page('orgmember-list').count('Last3, First3'), 2)
+        Student.objects.get(pk=self.students[3].pk).save()
+        page = self.page('orgmember-list')
+        self.assertEqual((page.count('Last3, First3'), page.count('Renamed, First3')), (0, 2))
+
+    def test_counter_changes(self):
+        self.assertRegex(self.page('organization-list'), r'Singing</td>\s*<td>3</td>')
+        updated_at = Organization.objects.get(pk=self.choir.pk).updated_at
+        OrgMember.objects.create(student=self.students[0], organization=self.choir, date_joined=date(2024, 5, 1))
+        self.assertEqual(Organization.objects.get(pk=self.choir.pk).updated_at, updated_at)
+        self.assertRegex(self.page('organization-list'), r'Singing</td>\s*<td>4</td>')
+
+    @override_settings(TEMPLATE_ROW_CACHE_TIMEOUT=0)
+    def test_disabled(self):
+        self.page('orgmember-list')
+        Student.objects.filter(pk=self.students[3].pk).update(lastname='Renamed')
+        self.assertEqual(self.page('orgmember-list').count('Renamed, First3'), 2)
+
+
+class ProfilerTests(StudentOrgTestCase):
+    def setUp(self):
+        self.directory = Path(self.enterContext(TemporaryDirectory()))
+        self.enterContext(override_settings(PROFILER_ENABLED=True, PROFILER_DIRECTORY=self.directory))
+
+    @override_settings(PROFILER_ENABLED=False)
+    def test_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilerMiddleware(lambda request: None)
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        self.assertNotIn('X-Profile-Id', self.client.get(reverse('student-list'), HTTP_X_PROFILE='1'))
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+    def test_staff_only(self):
+        self.assertNotIn('X-Profile-Id', self.client.get(reverse('student-list'), HTTP_X_PROFILE='1'))
+        self.client.force_login(User.objects.create_user('user'))
+        self.assertNotIn('X-Profile-Id', self.client.get(reverse('student-list'), HTTP_X_PROFILE='1'))
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+    def test_writes_profile(self):
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        self.assertNotIn('X-Profile-Id', self.client.get(reverse('student-list')))
+        response = self.client.get(reverse('student-list'), {'_profile': '1', 'q': 'last'})
+        profile_id = response['X-Profile-Id']
+        self.assertEqual(sorted(path.name for path in self.directory.iterdir()),
+                         [f'{profile_id}.folded', f'{profile_id}.json', f'{profile_id}.prof'])
+        summary = json.loads((self.directory / f'{profile_id}.json').read_text())
+        self.assertEqual((summary['method'], summary['path'], summary['status'], summary['user']),
+                         ('GET', '/student_list?_profile=1&q=last', 200, 'staff'))
+        self.assertEqual(summary['sql']['count'], len(summary['sql']['statements']))
+        self.assertTrue(any('studentorg_student_fts' in statement['sql']
+                            for statement in summary['sql']['statements']))
+        self.assertGreater(summary['template_ms'], 0)
+        self.assertTrue(summary['functions_by_cumulative_time'])
+        self.assertTrue(pstats.Stats(str(self.directory / f'{profile_id}.prof')).stats)
+
+        response = self.client.get(reverse('college-list'), HTTP_X_PROFILE='1')
+        self.assertIn('-get-college-list-', response['X-Profile-Id'])
+
+
+class SQLitePragmaTests(SimpleTestCase):
+    # Each test opens a connection of its own, to a scratch database file.
+    databases = {'default'}
+
+    def journal_mode(self):
+        with TemporaryDirectory() as directory:
+            database = DatabaseWrapper({**connection.settings_dict, 'NAME': str(Path(directory) / 'db.sqlite3')})
+            try:
+                with database.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    return cursor.fetchone()[0]
+            finally:
+                database.close()
+
+    def test_wal_only_when_configured(self):
+        with override_settings(SQLITE_WAL=False):
+            self.assertEqual(self.journal_mode(), 'delete')
+        with override_settings(SQLITE_WAL=True):
+            self.assertEqual(self.journal_mode(), 'wal')
+
+
+class DashboardChartTests(StudentOrgTestCase):
+    """The charts against the values the original per-row dashboard computed for the same data."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # A program without students, an organization without members and one without a college.
+        Program.objects.create(prog_name='History', college=cls.arts)
+        Organization.objects.create(name='Empty', college=cls.arts, description='Nobody')
+        hikers = Organization.objects.create(name='Hikers', description='Hiking')
+        OrgMember.objects.create(student=cls.students[2], organization=hikers, date_joined=date(2024, 6, 1))
+        for n in range(24):
+            Student.objects.create(student_id=f'2023-{n:04}', lastname=f'Old{n}', firstname='Timer',
+                                   program=cls.music, created_at=aware(2023, 5, 1))
+
+    def setUp(self):
+        self.enterContext(mock.patch('django.utils.timezone.now', return_value=aware(2024, 8, 1, 12)))
+
+    def test_counts(self):
+        self.assertEqual(dashboard.college_chart(), {'college_labels': ['Arts', 'Engineering'],
+                                                     'college_counts': [27, 3]})
+        self.assertEqual(dashboard.org_chart(), {'org_labels': ['Chess Club', 'Choir', 'Hikers'],
+                                                 'org_counts': [6, 3, 1]})
+        self.assertEqual(dashboard.program_chart(), {'program_labels': ['Computing', 'Music', 'History'],
+                                                     'program_counts': [3, 27, 0]})
+
+    def test_time_series(self):
+        self.assertEqual(dashboard.timeline_chart(), {
+            'timeline_labels': ['December 2023', 'January 2024', 'February 2024', 'March 2024', 'April 2024',
+                                'June 2024'],
+            'timeline_counts': [3, 2, 2, 1, 1, 1],
+        })
+        self.assertEqual(dashboard.yearly_chart(), {
+            'yearly_students': [0, 0, 24, 6],
+            'graduation_rates': [0, 0, 100.0, 100.0],
+            'years': ['2021', '2022', '2023', '2024'],
+        })
+
+    def test_scores(self):
+        self.assertEqual(dashboard.bubble_chart(), {'bubble_data': [
+            {'label': 'Chess Club', 'data': [{'x': 6, 'y': 168.5, 'r': 5, 'org': 'Chess Club'}]},
+            {'label': 'Choir', 'data': [{'x': 3, 'y': 214.0, 'r': 5.4, 'org': 'Choir'}]},
+            {'label': 'Hikers', 'data': [{'x': 1, 'y': 61.0, 'r': 5, 'org': 'Hikers'}]},
+        ]})
+        radar = dashboard.radar_chart()
+        self.assertEqual(radar['radar_labels'], dashboard.RADAR_LABELS)
+        self.assertEqual([(dataset['label'], dataset['data']) for dataset in radar['radar_datasets']], [
+            ('Chess Club', [100.0, 100.0, 66.7, 33.3, 0.0]),
+            ('Choir', [50.0, 50.0, 33.3, 100.0, 0.0]),
+            ('Hikers', [16.7, 50.0, 33.3, 0.0, 100.0]),
+        ])
+        # Colors follow the organization, not its position among the others.
+        self.assertEqual(radar['radar_datasets'][1]['borderColor'], f'rgb({palette_color(self.choir.pk)})')
@@ -0,0 +1,102 @@
+"""Range queries over the membership and student time series.
+
+``MembershipSeries`` and ``StudentSeries`` hold the number of memberships
+(by date joined) and students (by creation date) added per day and per
+month, for each organization and program. ``studentorg.rollups`` adds to
+the buckets of the day a row is written for, so new data lands in the
+newest buckets and older ones only change when history is edited.
+
+A range query reads whole months from the month buckets and the days at
+either end from the day buckets. Its cost depends on the number of
+buckets in the range, not on the number of rows they count.
+"""
+from datetime import date, timedelta
+
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from studentorg.models import SeriesBucket
+
+DAY, MONTH, YEAR = SeriesBucket.DAY, SeriesBucket.MONTH, 'year'
+
+
+def day_of(value):
+    """The date of a date or an aware datetime, in the current time zone."""
+    if hasattr(value, 'hour'):
+        value = timezone.localtime(value).date()
+    return value
+
+
+def buckets_of(value):
+    """``(period, start)`` of the day and the month buckets ``value`` falls in."""
+    day = day_of(value)
+    return [(DAY, day), (MONTH, day.replace(day=1))]
+
+
+def _next_month(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def _cover(start, end):
+    """A filter for the buckets that count exactly the days from ``start`` to ``end``.
+
+    Both ends are inclusive; ``None`` leaves that end open.
+    """
+    # Whole months in [months_from, months_to) come from the month buckets.
+    months_from = start if start is None or start.day == 1 else _next_month(start)
+    if end is None:
+        months_to = None
+    elif (end + timedelta(days=1)).day == 1:
+        months_to = end + timedelta(days=1)
+    else:
+        months_to = end.replace(day=1)
+
+    if months_from is not None and months_to is not None and months_from >= months_to:
+        return Q(period=DAY, start__gte=start, start__lte=end)
+
+    condition = Q(period=MONTH)
+    if months_from is not None:
+        condition &= Q(start__gte=months_from)
+    if months_to is not None:
+        condition &= Q(start__lt=months_to)
+    if start is not None and start < months_from:
+        condition |= Q(period=DAY, start__gte=start, start__lt=months_from)
+    if end is not None and months_to <= end:
+        condition |= Q(period=DAY, start__gte=months_to, start__lte=end)
+    return condition
+
+
+def _fold(day, period):
+    if period == YEAR:
+        return date(day.year, 1, 1)
+    if period == MONTH:
+        return day.replace(day=1)
+    return day
+
+
+def series(model, start=None, end=None, period=MONTH, **filters):
+    """Return ``[(bucket start, count)]`` from ``start`` to ``end``, oldest first.
+
+    ``period`` is ``'day'``, ``'month'`` or ``'year'``; ``filters`` narrow
+    the series, e.g. ``organization=org`` or ``program_id=3``. Buckets
+    with nothing in them are left out.
+    """
+    if period == DAY:
+        condition = Q(period=DAY)
+        if start is not None:
+            condition &= Q(start__gte=start)
+        if end is not None:
+            condition &= Q(start__lte=end)
+    else:
+        condition = _cover(start, end)
+
+    totals = {}
+    buckets = model.objects.filter(condition, **filters)\
+                           .values('start')\
+                           .annotate(total=Sum('count'))\
+                           .order_by('start')\
+                           .values_list('start', 'total')
+    for bucket, total in buckets:
+        key = _fold(bucket, period)
+        totals[key] = totals.get(key, 0) + total
+    return [(bucket, total) for bucket, total in totals.items() if total]
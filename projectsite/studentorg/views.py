@@ -1,24 +1,31 @@
-from django.shortcuts import render
+from django.shortcuts import redirect, render
 from django.views.generic.list import ListView
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
-from studentorg.models import Organization, OrgMember, Student, Program, College
+from studentorg.models import Organization, OrgMember, Student, Program, College, DeletionJob
 from studentorg.forms import OrganizationForm, OrgMemberForm, StudentForm, ProgramForm, CollegeForm
-from django.urls import reverse_lazy
+from studentorg.forms import OrganizationBulkForm, OrgMemberBulkForm, StudentBulkForm
+from django.urls import reverse, reverse_lazy
 from django.utils.decorators import method_decorator
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, Avg
-import json
 
 from typing import Any
 from django.db.models.query import QuerySet
 from django.db.models import Q
-from django.views.generic import TemplateView
-from django.db.models.functions import TruncMonth
-from django.db.models.functions import ExtractYear
-from django.utils import timezone
-from datetime import datetime, timedelta
+from django.views.generic import DetailView, TemplateView, View
 from django.contrib import messages
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.utils.http import quote_etag, urlencode
+from django.conf import settings
 from .models import Boat
+from .dashboard import CHARTS, chart_etag, get_chart_state, get_charts_async
+from .pagination import KeysetPaginationMixin
+from .search import search
+from .exports import StreamingExportMixin
+from .autocomplete import AutocompleteView
+from django.apps import apps
+from . import bulk, deletion, metrics
 
 
 # Create your views here.
@@ -26,207 +33,180 @@ from .models import Boat
 @method_decorator(login_required, name='dispatch')
 class HomePageView(TemplateView):
     template_name = 'home.html'
-    
+    query_budget = 4
+
+
+@method_decorator(login_required, name='dispatch')
+class AsyncHomePageView(TemplateView):
+    """The dashboard with every chart computed up front, concurrently.
+
+    An async view: under ASGI (projectsite.asgi) it runs on the event loop
+    while the charts are computed in the dashboard's thread pool, and the
+    page renders without any follow-up requests for chart data.
+    """
+    template_name = 'home.html'
+    query_budget = 4
+    # The charts home.html draws; the program and yearly charts are only
+    # served as JSON.
+    charts = ('college', 'org', 'timeline', 'bubble', 'radar')
+
+    # Declared async so login_required takes its async code path.
+    async def dispatch(self, request, *args, **kwargs):
+        return await super().dispatch(request, *args, **kwargs)
+
+    async def get(self, request, *args, **kwargs):
+        context = self.get_context_data(**kwargs)
+        context['charts'] = await get_charts_async(self.charts)
+        return self.render_to_response(context)
+
+
+@method_decorator(login_required, name='dispatch')
+class ChartDataView(View):
+    """The data of one dashboard chart as JSON, fetched by home.html.
+
+    Responses carry an ETag, so a browser revisiting the dashboard gets a
+    304 for every chart that has not changed since its last visit.
+    """
+    query_budget = 12
+
+    def get(self, request, name):
+        if name not in CHARTS:
+            raise Http404(f"No chart named '{name}'.")
+        etag = quote_etag(chart_etag(name))
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            data, fresh = get_chart_state(name)
+            response = JsonResponse(data)
+            # A stale value served during a recompute must not be cached
+            # under the ETag of the current data.
+            if fresh:
+                response['ETag'] = etag
+        else:
+            response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class MetricsView(View):
+    """Request and SQL metrics of every worker, for Prometheus to scrape.
+
+    Staff users can always read them; a scraper sends ``METRICS_TOKEN`` as
+    ``Authorization: Bearer <token>``.
+    """
+
+    def get(self, request):
+        if not settings.METRICS_ENABLED:
+            raise Http404('Metrics are disabled.')
+        token = settings.METRICS_TOKEN
+        if not request.user.is_staff:
+            if not token:
+                return HttpResponse('Forbidden', status=403, content_type='text/plain')
+            if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+                return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+        return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class BulkActionsMixin:
+    """Adds the list's bulk action form, which posts to its ``BulkActionView``."""
+    bulk_form_class = None
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['bulk_form'] = self.bulk_form_class(initial={'q': self.request.GET.get('q', '')})
+        return context
+
+
+class BulkActionView(View):
+    """Runs a bulk action posted from a list page and goes back to it with the counts."""
+    form_class = None
+    list_url_name = None
+    actions = {}    # operation -> function of the selection (and the target) in studentorg.bulk
+
+    # Singular and plural of the counts the actions return.
+    nouns = {
+        'students': ('student', 'students'),
+        'memberships': ('membership', 'memberships'),
+        'organizations': ('organization', 'organizations'),
+    }
+
+    def post(self, request):
+        form = self.form_class(request.POST)
+        if form.is_valid():
+            operation = form.cleaned_data['operation']
+            target = form.cleaned_data['target'] if operation in form.target_operations else None
+            action = self.actions[operation]
+            counts = action(form.selection(), target) if target else action(form.selection())
+            messages.success(request, self.report(counts, target))
+        else:
+            for errors in form.errors.values():
+                for error in errors:
+                    messages.error(request, error)
+
+        url = reverse(self.list_url_name)
+        query = request.POST.get('q')
+        return redirect(f'{url}?{urlencode({"q": query})}' if query else url)
+
+    def report(self, counts, target):
+        counted = ' and '.join(f'{count} {self.nouns[name][count != 1]}' for name, count in counts.items())
+        if target is None:
+            return f'Deleted {counted}.'
+        return f"Moved {counted} to '{target}'."
+
+
+class CascadeDeleteMixin:
+    """Deletes the object in batches with a ``DeletionJob`` instead of ``Model.delete()``.
+
+    Small deletes finish within the request; large ones continue in the
+    background while the user is sent to the job's status page.
+    """
+
+    def form_valid(self, form):
+        user = self.request.user if self.request.user.is_authenticated else None
+        job = deletion.start_deletion(self.object, requested_by=user)
+        if not job.finished:
+            return redirect('deletion-job', pk=job.pk)
+        messages.success(self.request,
+                         f"{self.object._meta.verbose_name.capitalize()} '{self.object}' has been deleted successfully!")
+        return redirect(self.get_success_url())
+
+
+@method_decorator(login_required, name='dispatch')
+class DeletionJobView(DetailView):
+    model = DeletionJob
+    template_name = 'deletion_job.html'
+    context_object_name = 'job'
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        
-        # Get the count of students per college through their program
-        college_data = Student.objects.values('program__college__college_name')\
-                                    .annotate(count=Count('id'))
-        
-        # Prepare data for the chart    
-        college_labels = [item['program__college__college_name'] for item in college_data]
-        college_counts = [item['count'] for item in college_data]
-        
-        # New: Organization membership data
-        org_data = OrgMember.objects.values('organization__name')\
-                                   .annotate(member_count=Count('id'))\
-                                   .order_by('-member_count')
-        
-        org_labels = [item['organization__name'] for item in org_data]
-        org_counts = [item['member_count'] for item in org_data]
-
-        # Monthly membership growth
-        monthly_data = OrgMember.objects.annotate(
-            month=TruncMonth('date_joined')
-        ).values('month').annotate(
-            new_members=Count('id')
-        ).order_by('month')
-
-        timeline_labels = [item['month'].strftime('%B %Y') for item in monthly_data]
-        timeline_counts = [item['new_members'] for item in monthly_data]
-        
-        # Get program distribution data
-        programs = Program.objects.all()
-        program_labels = [program.prog_name for program in programs]
-        program_counts = [Student.objects.filter(program=program).count() 
-                         for program in programs]
-
-        # Get yearly data for the past 4 years
-        current_year = timezone.now().year
-        years = list(range(current_year - 3, current_year + 1))
-        
-        # Get total students per year (based on created_at)
-        yearly_students = []
-        graduation_rates = []
-        
-        for year in years:
-            # Count students created in this year
-            student_count = Student.objects.filter(
-                created_at__year=year
-            ).count()
-            yearly_students.append(student_count)
-            
-            # Calculate graduation rate (example: 80-95%)
-            # You might want to adjust this based on your actual graduation tracking
-            total_students = Student.objects.filter(
-                created_at__year=year
-            ).count()
-            
-            # Assuming you have some way to track graduated students
-            # This is a placeholder - adjust according to your model structure
-            graduated_students = Student.objects.filter(
-                created_at__year=year,
-                # Add your graduation criteria here
-                # For example: status='GRADUATED'
-            ).count()
-            
-            # Calculate graduation rate
-            graduation_rate = (
-                (graduated_students / total_students * 100)
-                if total_students > 0 
-                else 0
-            )
-            graduation_rates.append(round(graduation_rate, 1))
-
-        # Prepare bubble chart data
-        organizations = Organization.objects.all()
-        bubble_data = []
-        
-        for org in organizations:
-            members_count = OrgMember.objects.filter(organization=org).count()
-            if members_count > 0:
-                # Get all members' join dates and calculate average days manually
-                member_dates = OrgMember.objects.filter(organization=org).values_list('date_joined', flat=True)
-                today = timezone.now().date()
-                
-                # Calculate average days since joining
-                total_days = sum((today - date_joined).days for date_joined in member_dates)
-                avg_days = total_days / len(member_dates) if member_dates else 0
-                
-                # Count students in the organization's college
-                college_students = Student.objects.filter(
-                    program__college=org.college
-                ).count() if org.college else 0
-                
-                bubble_data.append({
-                    'label': org.name,
-                    'data': [{
-                        'x': members_count,
-                        'y': round(avg_days, 1),  # Round to 1 decimal place
-                        'r': min(max(college_students / 5, 5), 50),  # Scale bubble size between 5 and 50
-                        'org': org.name
-                    }]
-                })
-
-        # Add Radar Chart Data
-        radar_labels = ['Member Count', 'College Diversity', 'Program Diversity', 
-                       'Member Retention', 'Growth Rate']
-        
-        radar_datasets = []
-        
-        # Debug print
-        print("Number of organizations:", organizations.count())
-        
-        for org in organizations:
-            members = OrgMember.objects.filter(organization=org)
-            member_count = members.count()
-            
-            # Debug print
-            print(f"Processing org: {org.name}, member count: {member_count}")
-            
-            if member_count > 0:
-                # Member count score
-                max_members = OrgMember.objects.values('organization')\
-                    .annotate(count=Count('id'))\
-                    .order_by('-count').first()
-                max_member_count = max_members['count'] if max_members else 0
-                member_score = (member_count / max_member_count * 100) if max_member_count > 0 else 0
-                
-                # College diversity score
-                college_count = members.select_related('student__program__college')\
-                    .values('student__program__college')\
-                    .distinct().count()
-                total_colleges = College.objects.count()
-                college_score = (college_count / total_colleges * 100) if total_colleges > 0 else 0
-                
-                # Program diversity score
-                program_count = members.select_related('student__program')\
-                    .values('student__program')\
-                    .distinct().count()
-                total_programs = Program.objects.count()
-                program_score = (program_count / total_programs * 100) if total_programs > 0 else 0
-                
-                # Member retention score
-                six_months_ago = timezone.now().date() - timedelta(days=180)
-                retained_members = members.filter(date_joined__lte=six_months_ago).count()
-                retention_score = (retained_members / member_count * 100) if member_count > 0 else 0
-                
-                # Growth rate
-                three_months_ago = timezone.now().date() - timedelta(days=90)
-                new_members = members.filter(date_joined__gte=three_months_ago).count()
-                growth_score = (new_members / member_count * 100) if member_count > 0 else 0
-                
-                dataset = {
-                    'label': org.name,
-                    'data': [
-                        round(member_score, 1),
-                        round(college_score, 1),
-                        round(program_score, 1),
-                        round(retention_score, 1),
-                        round(growth_score, 1)
-                    ],
-                    'fill': True,
-                    'backgroundColor': f'rgba({hash(org.name) % 255}, {(hash(org.name) >> 8) % 255}, {(hash(org.name) >> 16) % 255}, 0.2)',
-                    'borderColor': f'rgb({hash(org.name) % 255}, {(hash(org.name) >> 8) % 255}, {(hash(org.name) >> 16) % 255})',
-                    'pointBackgroundColor': f'rgb({hash(org.name) % 255}, {(hash(org.name) >> 8) % 255}, {(hash(org.name) >> 16) % 255})',
-                    'pointBorderColor': '#fff',
-                    'pointHoverBackgroundColor': '#fff',
-                    'pointHoverBorderColor': f'rgb({hash(org.name) % 255}, {(hash(org.name) >> 8) % 255}, {(hash(org.name) >> 16) % 255})'
-                }
-                
-                radar_datasets.append(dataset)
-
-        # Update context with real data
-        context.update({
-            'college_labels': json.dumps(college_labels),
-            'college_counts': json.dumps(college_counts),
-            'org_labels': json.dumps(org_labels),
-            'org_counts': json.dumps(org_counts),
-            'timeline_labels': json.dumps(timeline_labels),
-            'timeline_counts': json.dumps(timeline_counts),
-            'program_labels': json.dumps(program_labels),
-            'program_counts': json.dumps(program_counts),
-            'yearly_students': json.dumps(yearly_students),
-            'graduation_rates': json.dumps(graduation_rates),
-            'years': json.dumps([str(year) for year in years]),
-            'bubble_data': json.dumps(bubble_data),
-            'radar_labels': json.dumps(radar_labels),
-            'radar_datasets': json.dumps(radar_datasets),
-        })
+        context['steps'] = [
+            {'name': apps.get_model(label)._meta.verbose_name_plural.capitalize(),
+             'deleted': self.object.deleted.get(label, 0), 'total': total}
+            for label, total in self.object.total.items()
+        ]
         return context
+
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        if self.object.status in (DeletionJob.PENDING, DeletionJob.RUNNING):
+            response['Refresh'] = '2'
+        return response
+
+
 # Organization Views
-class Organizationlist(ListView):
+class Organizationlist(BulkActionsMixin, KeysetPaginationMixin, ListView):
     model = Organization
     content_object_name = 'organization'
     template_name = 'org_list.html'
+    bulk_form_class = OrganizationBulkForm
     paginate_by = 5
+    query_budget = 4
+    sort_options = {'members': ('-member_count', '-id')}
 
     def get_queryset(self, *args, **kwargs):
-        qs = super().get_queryset(*args, **kwargs)
+        qs = super().get_queryset(*args, **kwargs).select_related('college')
         if self.request.GET.get("q"):
             query = self.request.GET.get('q')
-            qs = qs.filter(Q(name__icontains=query) | Q(description__icontains=query))
+            qs = search(qs, query, ranked=True)
         return qs
 
 
@@ -260,7 +240,7 @@ class OrganizationUpdateView(UpdateView):
         return super().form_invalid(form)
 
 
-class OrganizationDeleteView(DeleteView):
+class OrganizationDeleteView(CascadeDeleteMixin, DeleteView):
     model = Organization
     template_name = 'org_del.html'
     success_url = reverse_lazy('organization-list')
@@ -272,17 +252,19 @@ class OrganizationDeleteView(DeleteView):
 
 
 # OrgMember Views
-class OrgMemberlist(ListView):
+class OrgMemberlist(BulkActionsMixin, KeysetPaginationMixin, ListView):
     model = OrgMember
     content_object_name = 'orgmember'
     template_name = 'orgmember_list.html'
+    bulk_form_class = OrgMemberBulkForm
     paginate_by = 5
+    query_budget = 4
 
     def get_queryset(self, *args, **kwargs):
-        qs = super().get_queryset(*args, **kwargs)
+        qs = super().get_queryset(*args, **kwargs).select_related('student', 'organization')
         if self.request.GET.get("q"):
             query = self.request.GET.get('q')
-            qs = qs.filter(Q(date_joined__icontains=query) | Q(student__firstname__icontains=query))
+            qs = search(qs, query, ranked=True)
         return qs
 
 
@@ -328,17 +310,19 @@ class OrgMemberDeleteView(DeleteView):
 
 
 # Student Views
-class StudentList(ListView):
+class StudentList(BulkActionsMixin, KeysetPaginationMixin, ListView):
     model = Student
     content_object_name = 'student'
     template_name = 'student_list.html'
+    bulk_form_class = StudentBulkForm
     paginate_by = 5
+    query_budget = 4
 
     def get_queryset(self, *args, **kwargs):
-        qs = super().get_queryset(*args, **kwargs)
+        qs = super().get_queryset(*args, **kwargs).select_related('program')
         if self.request.GET.get("q"):
             query = self.request.GET.get('q')
-            qs = qs.filter(Q(student_id__icontains=query) | Q(firstname__icontains=query) | Q(lastname__icontains=query))
+            qs = search(qs, query, ranked=True)
         return qs
 
 
@@ -414,7 +398,7 @@ class ProgramUpdateView(UpdateView):
         return super().form_invalid(form)
 
 
-class ProgramDeleteView(DeleteView):
+class ProgramDeleteView(CascadeDeleteMixin, DeleteView):
     model = Program
     template_name = 'program_del.html'
     success_url = reverse_lazy('program-list')
@@ -456,7 +440,7 @@ class CollegeUpdateView(UpdateView):
         return super().form_invalid(form)
 
 
-class CollegeDeleteView(DeleteView):
+class CollegeDeleteView(CascadeDeleteMixin, DeleteView):
     model = College
     template_name = 'college_del.html'
     success_url = reverse_lazy('college-list')
@@ -466,24 +450,28 @@ class CollegeDeleteView(DeleteView):
         messages.success(self.request, f"College '{college.college_name}' has been deleted successfully!")
         return super().delete(request, *args, **kwargs)
 
-class ProgramList(ListView):
+class ProgramList(KeysetPaginationMixin, ListView):
     model = Program
     template_name = 'program_list.html'
     context_object_name = 'programs'
     paginate_by = 5
+    query_budget = 4
+    sort_options = {'students': ('-student_count', '-id')}
 
     def get_queryset(self):
-        qs = super().get_queryset()
+        qs = super().get_queryset().select_related('college')
         if self.request.GET.get("q"):
             query = self.request.GET.get('q')
             qs = qs.filter(prog_name__icontains=query)
         return qs
 
-class CollegeList(ListView):
+class CollegeList(KeysetPaginationMixin, ListView):
     model = College
     template_name = 'college_list.html'
     context_object_name = 'colleges'
     paginate_by = 5
+    query_budget = 4
+    sort_options = {'students': ('-student_count', '-id')}
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -492,6 +480,106 @@ class CollegeList(ListView):
             qs = qs.filter(college_name__icontains=query)
         return qs
 
+
+# Export Views
+@method_decorator(login_required, name='dispatch')
+class OrganizationExport(StreamingExportMixin, Organizationlist):
+    export_name = 'organizations'
+    export_columns = (
+        ('id', 'id'),
+        ('name', 'name'),
+        ('college', 'college__college_name'),
+        ('description', 'description'),
+    )
+
+
+@method_decorator(login_required, name='dispatch')
+class OrgMemberExport(StreamingExportMixin, OrgMemberlist):
+    export_name = 'orgmembers'
+    export_columns = (
+        ('id', 'id'),
+        ('student_id', 'student__student_id'),
+        ('lastname', 'student__lastname'),
+        ('firstname', 'student__firstname'),
+        ('program', 'student__program__prog_name'),
+        ('organization', 'organization__name'),
+        ('organization_college', 'organization__college__college_name'),
+        ('date_joined', 'date_joined'),
+    )
+
+
+@method_decorator(login_required, name='dispatch')
+class StudentExport(StreamingExportMixin, StudentList):
+    export_name = 'students'
+    export_columns = (
+        ('id', 'id'),
+        ('student_id', 'student_id'),
+        ('lastname', 'lastname'),
+        ('firstname', 'firstname'),
+        ('middlename', 'middlename'),
+        ('program', 'program__prog_name'),
+        ('college', 'program__college__college_name'),
+    )
+
+
+@method_decorator(login_required, name='dispatch')
+class ProgramExport(StreamingExportMixin, ProgramList):
+    export_name = 'programs'
+    export_columns = (
+        ('id', 'id'),
+        ('prog_name', 'prog_name'),
+        ('college', 'college__college_name'),
+    )
+
+
+@method_decorator(login_required, name='dispatch')
+class CollegeExport(StreamingExportMixin, CollegeList):
+    export_name = 'colleges'
+    export_columns = (
+        ('id', 'id'),
+        ('college_name', 'college_name'),
+    )
+
+
+# Autocomplete lookups for the forms' foreign-key fields
+@method_decorator(login_required, name='dispatch')
+class StudentLookup(AutocompleteView):
+    model = Student
+
+
+@method_decorator(login_required, name='dispatch')
+class OrganizationLookup(AutocompleteView):
+    model = Organization
+
+
+@method_decorator(login_required, name='dispatch')
+class ProgramLookup(AutocompleteView):
+    model = Program
+    search_fields = ('prog_name',)
+
+
+# Bulk actions on the selected rows of a list
+@method_decorator(login_required, name='dispatch')
+class OrganizationBulkAction(BulkActionView):
+    form_class = OrganizationBulkForm
+    list_url_name = 'organization-list'
+    actions = {'delete': bulk.delete_organizations, 'merge': bulk.merge_organizations}
+
+
+@method_decorator(login_required, name='dispatch')
+class OrgMemberBulkAction(BulkActionView):
+    form_class = OrgMemberBulkForm
+    list_url_name = 'orgmember-list'
+    actions = {'delete': bulk.delete_members, 'move': bulk.move_members}
+
+
+@method_decorator(login_required, name='dispatch')
+class StudentBulkAction(BulkActionView):
+    form_class = StudentBulkForm
+    list_url_name = 'student-list'
+    actions = {'delete': bulk.delete_students, 'reassign': bulk.reassign_program}
+
+
 class BoatCreateView(CreateView):
     model = Boat
     fields = "__all__"